@@ -0,0 +1,244 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Iterator
+
+from starlette.responses import JSONResponse  # type: ignore
+
+from app.configs import settings
+
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+LOGIN_PATH = f"{settings.API_V1_STR}/login/access-token"
+ROUTE_CLASSES = ("auth", "write", "read")
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request cannot be admitted: the wait queue of its route class is full or its deadline passed.
+    """
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionLimiter:
+    """
+    Bounds the number of requests of one route class served at once, with a bounded FIFO wait queue.
+
+    Requests beyond the limit wait in the queue for at most `queue_timeout` seconds, and are rejected
+    immediately when the queue is full, so an overloaded class sheds load instead of piling up latency.
+    Used from the event loop thread only, which needs no locking.
+    """
+
+    def __init__(self, limit: int, queue_size: int, queue_timeout: float) -> None:
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.rejected = {"queue_full": 0, "timeout": 0}
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        """
+        Waits for a slot of the class.
+
+        Raises:
+            Overloaded: If the wait queue is full or no slot frees up before the queue timeout.
+        """
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+
+        if len(self._waiters) >= self.queue_size:
+            self.rejected["queue_full"] += 1
+            raise Overloaded("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # Unlike `wait_for`, this neither swallows a cancellation racing the hand-off nor cancels the waiter
+            await asyncio.wait((waiter,), timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancellation, pass it on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+
+        if not waiter.done():
+            self.rejected["timeout"] += 1
+            raise Overloaded("timeout")
+
+    def release(self) -> None:
+        """
+        Frees a slot, handing it over to the oldest waiter still waiting.
+        """
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+        self.active -= 1
+
+
+class TokenBucket:
+    """
+    Per client token buckets: each client may burst `burst` requests, then `rate` requests per second.
+
+    Buckets live in this worker only, so the effective limit scales with the number of workers.
+    The least recently seen clients are forgotten beyond `maxsize`, a forgotten client starts with a full bucket.
+    """
+
+    def __init__(self, rate: float, burst: int, maxsize: int = 100_000) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self.rejected = 0
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def take(self, client: str) -> float:
+        """
+        Takes a token from the client's bucket.
+
+        Args:
+            client: The client key, e.g. its address.
+
+        Returns:
+            0 if a token was taken, otherwise the number of seconds until the next token is available.
+        """
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(client, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+            self.rejected += 1
+
+        self._buckets[client] = (tokens, now)
+        if len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+
+        return wait
+
+
+def route_class(method: str, path: str) -> str | None:
+    """
+    Classifies a request for admission control.
+
+    Args:
+        method: The HTTP method of the request.
+        path: The path of the request.
+
+    Returns:
+        `auth` for logins, which are bound by bcrypt, `write` for other unsafe methods, `read` otherwise,
+        or None for requests that are never limited, the metrics scrape and health checks.
+    """
+    if path == settings.METRICS_PATH or path.startswith("/health/"):
+        return None
+    if path == LOGIN_PATH and method == "POST":
+        return "auth"
+    if method not in SAFE_METHODS:
+        return "write"
+
+    return "read"
+
+
+def _reject(status: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detail}, status_code=status, headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+class AdmissionControl:
+    """
+    The limiters of each route class and the login rate limit of this worker.
+    """
+
+    def __init__(self) -> None:
+        self.limiters = {
+            name: AdmissionLimiter(
+                settings.ADMISSION_LIMITS[name],
+                settings.ADMISSION_QUEUE_SIZES[name],
+                settings.ADMISSION_QUEUE_TIMEOUT_SECONDS[name],
+            )
+            for name in ROUTE_CLASSES
+        }
+        self.login_bucket = (
+            TokenBucket(settings.LOGIN_RATE_PER_MINUTE / 60, settings.LOGIN_RATE_BURST)
+            if settings.LOGIN_RATE_PER_MINUTE > 0
+            else None
+        )
+
+    def render(self) -> Iterator[str]:
+        """
+        Yields the exposition lines of the admission metrics.
+        """
+        yield "# TYPE admission_in_flight gauge"
+        for name, limiter in self.limiters.items():
+            yield f'admission_in_flight{{class="{name}"}} {limiter.active}'
+        yield "# TYPE admission_queued gauge"
+        for name, limiter in self.limiters.items():
+            yield f'admission_queued{{class="{name}"}} {limiter.queued}'
+        yield "# TYPE admission_rejected_total counter"
+        for name, limiter in self.limiters.items():
+            for reason, count in limiter.rejected.items():
+                yield f'admission_rejected_total{{class="{name}",reason="{reason}"}} {count}'
+        if self.login_bucket is not None:
+            yield f'admission_rejected_total{{class="auth",reason="rate_limit"}} {self.login_bucket.rejected}'
+
+
+admission = AdmissionControl()
+
+
+class AdmissionMiddleware:
+    """
+    Pure ASGI middleware enforcing the concurrency limit of each route class and the login rate limit.
+
+    Shed requests get a 503, rate limited logins a 429, both with a `Retry-After` header and without
+    reaching the application, so rejecting stays cheap under overload. The client of a login is its
+    address as seen by the server, run behind a proxy with `--forwarded-allow-ips` to get the real one.
+    """
+
+    def __init__(self, app: Callable, control: AdmissionControl = admission) -> None:
+        self.app = app
+        self.control = control
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        name = route_class(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        bucket = self.control.login_bucket
+        if name == "auth" and bucket is not None:
+            wait = bucket.take(scope["client"][0] if scope.get("client") else "")
+            if wait:
+                await _reject(429, "Too many login attempts", wait)(scope, receive, send)
+                return
+
+        limiter = self.control.limiters[name]
+        try:
+            await limiter.acquire()
+        except Overloaded:
+            await _reject(503, "Server overloaded", limiter.queue_timeout)(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
@@ -1,48 +1,328 @@
-from typing import List
+from collections import Counter
+from typing import Any, AsyncIterator, Iterable, Iterator, List, Sequence, Tuple
 
-from sqlalchemy import delete, update
-from sqlalchemy.orm import Session
+from sqlalchemy import (
+    ColumnElement,
+    Integer,
+    Row,
+    RowMapping,
+    Select,
+    String,
+    bindparam,
+    case,
+    cast,
+    column,
+    delete,
+    func,
+    insert,
+    literal,
+    select,
+    text,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy.sql.compiler import InsertmanyvaluesSentinelOpts
 
-from app.api.models.user import Item
-from app.api.schemas.item import ItemCreate, ItemUpdate
+from app.api.models.user import Item, ItemCount
+from app.api.schemas.item import ItemBulkUpdateEntry, ItemCreate, ItemOut, ItemUpdate
+from app.api.utils.cache import EntityCache
+from app.configs import settings
+from app.database import (
+    AsyncSessionLocal,
+    SessionLocal,
+    async_engine,
+    dialect_insert,
+    engine,
+    is_primary,
+)
 from app.dependencies import CurrentUser
 
+EXPORT_COLUMNS = (Item.id, Item.title, Item.description, Item.owner_id)
+# The columns listings load by default, those `ItemOut` exposes
+LIST_FIELDS = tuple(ItemOut.model_fields)
 
-def get_items(db: Session, skip: int, limit: int, current_user: CurrentUser) -> List[Item]:
+item_cache: EntityCache[Item] = EntityCache("item", Item, exclude=("search_vector",))
+
+
+def search_document(title: str, description: str | None) -> str:
+    """
+    Builds the text an item is searched by.
+
+    Args:
+        title: The title of the item.
+        description: The description of the item.
+
+    Returns:
+        The title and description, space separated.
+    """
+    return f"{title} {description}" if description else title
+
+
+def search_vector(dialect_name: str, document: ColumnElement) -> ColumnElement:
+    """
+    Builds the SQL expression computing `Item.search_vector` from a search document.
+
+    Every crud write path sets the column through this expression, so it never goes stale.
+
+    Args:
+        dialect_name: The name of the database dialect.
+        document: The search document, e.g. a bound parameter holding `search_document(...)`.
+
+    Returns:
+        The tsvector of the document on Postgres, the lowercased document elsewhere.
     """
-    Retrieves a list of items from the database based on the provided skip, limit, and current user.
+    if dialect_name == "postgresql":
+        return func.to_tsvector(cast(settings.SEARCH_CONFIG, REGCONFIG), document)
+
+    return func.lower(document)
+
+
+def select_items(current_user: CurrentUser, *columns: Any) -> Select:
+    """
+    Builds the ID ordered item listing query, restricted to the current user's items unless superuser.
+
+    Args:
+        current_user: The current user object.
+        *columns: The columns to select. Defaults to the Item entity.
+
+    Returns:
+        The select statement.
+    """
+    stmt = select(*(columns or (Item,))).order_by(Item.id)
+    if not current_user.is_superuser:
+        stmt = stmt.where(Item.owner_id == current_user.id)
+
+    return stmt
+
+
+def _adjust_item_counts(db: Session, owner_ids: Iterable[int | None], sign: int = 1) -> None:
+    """
+    Adds or removes items from the per owner counts with a single INSERT ... ON CONFLICT DO UPDATE statement.
+
+    Runs in the transaction of the write it accounts for. Owners are updated in ID order, so concurrent
+    writes touching the same owners lock their rows in the same order.
 
     Args:
         db: The database session.
-        skip: The number of items to skip.
+        owner_ids: The owner of each created or deleted item.
+        sign: 1 for created items, -1 for deleted ones.
+    """
+    deltas = Counter(owner_id for owner_id in owner_ids if owner_id is not None)
+    if not deltas:
+        return
+
+    stmt = dialect_insert(db, ItemCount).values(
+        [{"owner_id": owner_id, "count": sign * delta} for owner_id, delta in sorted(deltas.items())]
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[ItemCount.owner_id], set_={"count": ItemCount.count + stmt.excluded.count}
+        )
+    )
+
+
+def count_items(db: Session, current_user: CurrentUser) -> Tuple[int, bool]:
+    """
+    Counts the items visible to the current user without scanning the items.
+
+    Users get the exact count of their items from `item_counts`. Superusers get the row estimate of
+    the planner statistics on Postgres, and the sum of `item_counts` elsewhere or before the table
+    was first analyzed.
+
+    Args:
+        db: The database session.
+        current_user: The current user object.
+
+    Returns:
+        The count, and whether it is an estimate.
+    """
+    if not current_user.is_superuser:
+        stmt = select(ItemCount.count).where(ItemCount.owner_id == current_user.id)
+        return db.scalar(stmt) or 0, False
+
+    if db.get_bind().dialect.name == "postgresql":
+        # -1, or 0 before Postgres 14, until the table is vacuumed or analyzed
+        estimate = db.scalar(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'items'::regclass"))
+        if estimate is not None and estimate > 0:
+            return estimate, True
+
+    return db.scalar(select(func.coalesce(func.sum(ItemCount.count), 0))), False
+
+
+def get_item_counts(db: Session, after_id: int | None, limit: int, current_user: CurrentUser) -> List[Row]:
+    """
+    Retrieves a page of per owner item counts ordered by owner ID, only the current user's unless superuser.
+
+    Args:
+        db: The database session.
+        after_id: The owner ID of the last count of the previous page, or None for the first page.
+        limit: The maximum number of counts to retrieve.
+        current_user: The current user object.
+
+    Returns:
+        Rows with the `owner_id` and `count` of each owner with items.
+    """
+    stmt = select(ItemCount.owner_id, ItemCount.count).where(ItemCount.count > 0).order_by(ItemCount.owner_id)
+    if not current_user.is_superuser:
+        stmt = stmt.where(ItemCount.owner_id == current_user.id)
+    if after_id is not None:
+        stmt = stmt.where(ItemCount.owner_id > after_id)
+
+    return list(db.execute(stmt.limit(limit)).all())
+
+
+def get_items(
+    db: Session, after_id: int | None, limit: int, current_user: CurrentUser, fields: Sequence[str] = LIST_FIELDS
+) -> List[Item]:
+    """
+    Retrieves a page of items ordered by ID, starting after the provided ID, for the current user.
+
+    Args:
+        db: The database session.
+        after_id: The ID of the last item of the previous page, or None for the first page.
         limit: The maximum number of items to retrieve.
         current_user: The current user object.
+        fields: The columns to load besides the ID, the others are left unloaded.
 
     Returns:
         A list of Item objects retrieved from the database.
     """
-    query = db.query(Item).order_by(Item.id).offset(skip).limit(limit)
+    stmt = select_items(current_user).options(load_only(*(getattr(Item, name) for name in fields)))
+    if after_id is not None:
+        stmt = stmt.where(Item.id > after_id)
+
+    return list(db.scalars(stmt.limit(limit)).all())
+
+
+def search_items(db: Session, query: str, limit: int, offset: int, current_user: CurrentUser) -> List[Row]:
+    """
+    Searches the items visible to the current user by keywords in their title and description.
+
+    On Postgres the query uses web search syntax (quoted phrases, `or`, `-word`) against the GIN indexed
+    `search_vector`, results are ordered by `ts_rank_cd` and highlighted with `ts_headline`. Only the rows
+    of the requested page are highlighted, as it reparses their text. Elsewhere every word of the query
+    must appear in the title or description, results are ordered by ID and not highlighted.
+
+    Args:
+        db: The database session.
+        query: The search query.
+        limit: The maximum number of items to retrieve.
+        offset: The number of best matches to skip.
+        current_user: The current user object.
+
+    Returns:
+        Rows with the `id`, `title`, `description`, `owner_id`, `rank` and `snippet` of each matching item.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        stmt = select_items(current_user, *EXPORT_COLUMNS, literal(0.0).label("rank"), literal(None).label("snippet"))
+        for word in query.lower().split():
+            stmt = stmt.where(Item.search_vector.contains(word, autoescape=True))
+        return list(db.execute(stmt.limit(limit).offset(offset)).all())
+
+    config = cast(settings.SEARCH_CONFIG, REGCONFIG)
+    tsquery = func.websearch_to_tsquery(config, query)
+    rank = func.ts_rank_cd(Item.search_vector, tsquery).label("rank")
+    matches = select(Item.id, rank).where(Item.search_vector.op("@@")(tsquery))
     if not current_user.is_superuser:
-        query = query.filter(Item.owner_id == current_user.id)
+        matches = matches.where(Item.owner_id == current_user.id)
+    page = matches.order_by(rank.desc(), Item.id).limit(limit).offset(offset).subquery()
 
-    return query.all()
+    document = func.concat_ws(" ", Item.title, Item.description)
+    snippet = func.ts_headline(config, document, tsquery, "StartSel=<mark>, StopSel=</mark>, MaxFragments=2")
+    stmt = (
+        select(*EXPORT_COLUMNS, page.c.rank, snippet.label("snippet"))
+        .join(page, page.c.id == Item.id)
+        .order_by(page.c.rank.desc(), Item.id)
+    )
+    return list(db.execute(stmt).all())
+
+
+def iter_item_partitions(
+    current_user: CurrentUser, batch_size: int, bind: Engine | None = None
+) -> Iterator[Sequence[RowMapping]]:
+    """
+    Streams every item visible to the current user through a server-side cursor, in batches.
+
+    The generator owns its session so it can outlive the request scoped one while the response streams.
+
+    Args:
+        current_user: The current user object.
+        batch_size: The number of rows fetched from the cursor at a time.
+        bind: The engine to read from, e.g. a replica. Defaults to the primary.
+
+    Yields:
+        Batches of item row mappings, ordered by ID.
+    """
+    with SessionLocal(bind=bind or engine) as db:
+        stmt = select_items(current_user, *EXPORT_COLUMNS).execution_options(yield_per=batch_size)
+        yield from db.execute(stmt).mappings().partitions()
+
+
+async def aiter_item_partitions(
+    current_user: CurrentUser, batch_size: int, bind: AsyncEngine | None = None
+) -> AsyncIterator[Sequence[RowMapping]]:
+    """
+    Async counterpart of `iter_item_partitions`, used when `DB_ASYNC` is enabled.
+
+    Args:
+        current_user: The current user object.
+        batch_size: The number of rows fetched from the cursor at a time.
+        bind: The engine to read from, e.g. a replica. Defaults to the primary.
+
+    Yields:
+        Batches of item row mappings, ordered by ID.
+    """
+    async with AsyncSessionLocal(bind=bind or async_engine) as db:
+        stmt = select_items(current_user, *EXPORT_COLUMNS).execution_options(yield_per=batch_size)
+        result = await db.stream(stmt)
+        async for partition in result.mappings().partitions():
+            yield partition
 
 
 def get_item_by_id(db: Session, id: int) -> Item | None:
     """
-    Retrieves an item from the database based on the provided item ID and current user.
+    Retrieves an item by ID through the read-through item cache.
 
     Args:
         db: The database session.
         id: The ID of the item to retrieve.
 
     Returns:
-        An Item object retrieved from the database.
+        An Item object, detached when served from the cache, or None if it is not found.
+    """
+    return item_cache.get_or_load(id, lambda: db.query(Item).filter(Item.id == id).first(), fill=is_primary(db))
+
+
+def get_item_version(db: Session, id: int) -> Row | None:
+    """
+    Retrieves the owner and version of an item without loading the item itself.
+
+    Args:
+        db: The database session.
+        id: The ID of the item.
+
+    Returns:
+        A row with the `id`, `owner_id`, `version` and `updated_at` of the item, or None if it is not found.
+    """
+    return db.execute(select(Item.id, Item.owner_id, Item.version, Item.updated_at).where(Item.id == id)).first()
+
 
-    Raises:
-        HTTPException: If the item is not found.
+def get_items_by_ids(db: Session, ids: List[int]) -> List[Item]:
     """
-    return db.query(Item).filter(Item.id == id).first()
+    Retrieves the items with the given IDs in a single query.
+
+    Args:
+        db: The database session.
+        ids: The IDs of the items to retrieve.
+
+    Returns:
+        The Item objects found, in no particular order.
+    """
+    return db.query(Item).filter(Item.id.in_(ids)).all()
 
 
 def create_item(db: Session, item: ItemCreate, current_user: CurrentUser) -> Item:
@@ -57,41 +337,230 @@ def create_item(db: Session, item: ItemCreate, current_user: CurrentUser) -> Ite
     Returns:
         An Item object created in the database.
     """
-    db_item = Item(**item.dict(), owner_id=current_user.id)
+    document = literal(search_document(item.title, item.description))
+    db_item = Item(
+        **item.dict(), owner_id=current_user.id, search_vector=search_vector(db.get_bind().dialect.name, document)
+    )
     db.add(db_item)
+    _adjust_item_counts(db, [current_user.id])
+    # The primary key is fetched by the INSERT itself and the session does not expire on commit
     db.commit()
-    db.refresh(db_item)
+    # Drops a cached "not found" for the new ID
+    item_cache.invalidate(db_item.id)
     return db_item
 
 
-def update_item(db: Session, id: int, item_update: ItemUpdate) -> Item | None:
+def update_item(
+    db: Session,
+    id: int,
+    item_update: ItemUpdate,
+    current_user: CurrentUser,
+    expected_versions: List[int] | None = None,
+) -> Item | None:
     """
-    Updates an item in the database.
+    Updates an item in the database with a single ownership conditional UPDATE ... RETURNING statement.
 
     Args:
         db: The database session.
         id: The ID of the item to update.
         item_update: The item data to update.
+        current_user: The current user object, who must own the item unless superuser.
+        expected_versions: The versions the item must be at for the update to apply, None for any.
 
     Returns:
-        An Item object updated in the database.
+        An Item object updated in the database, or None if the item is missing, not owned by the user
+        or at another version.
     """
-    stmt = update(Item).where(Item.id == id).values(**item_update.dict()).execution_options(synchronize_session="fetch")
+    stmt = (
+        update(Item)
+        .where(Item.id == id)
+        .values(
+            **item_update.dict(),
+            search_vector=search_vector(
+                db.get_bind().dialect.name, literal(search_document(item_update.title, item_update.description))
+            ),
+            version=Item.version + 1,
+            updated_at=func.now(),
+        )
+        .returning(Item)
+        .execution_options(synchronize_session="fetch")
+    )
+    if not current_user.is_superuser:
+        stmt = stmt.where(Item.owner_id == current_user.id)
+    if expected_versions is not None:
+        stmt = stmt.where(Item.version.in_(expected_versions))
 
-    db.execute(stmt)
+    db_item = db.scalars(stmt).one_or_none()
     db.commit()
-
-    return db.query(Item).filter(Item.id == id).first()
+    if db_item is not None:
+        item_cache.invalidate(id)
+    return db_item
 
 
-def delete_item_by_id(db: Session, id: int) -> None:
+def delete_item_by_id(db: Session, id: int, current_user: CurrentUser) -> bool:
     """
-    Deletes an item by ID.
+    Deletes an item by ID with a single ownership conditional DELETE ... RETURNING statement.
 
     Args:
         db: The database session.
         id: The ID of the item to delete.
+        current_user: The current user object, who must own the item unless superuser.
+
+    Returns:
+        True if the item was deleted, False if it is missing or not owned by the user.
+    """
+    stmt = delete(Item).where(Item.id == id).returning(Item.owner_id).execution_options(synchronize_session=False)
+    if not current_user.is_superuser:
+        stmt = stmt.where(Item.owner_id == current_user.id)
+
+    deleted = db.execute(stmt).one_or_none()
+    if deleted is not None:
+        _adjust_item_counts(db, [deleted.owner_id], sign=-1)
+    db.commit()
+    if deleted is not None:
+        item_cache.invalidate(id)
+    return deleted is not None
+
+
+def create_items(db: Session, items: List[ItemCreate], current_user: CurrentUser) -> List[Item]:
+    """
+    Creates several items with a single multi-row INSERT ... RETURNING and one commit.
+
+    Args:
+        db: The database session.
+        items: The item data to create.
+        current_user: The current user object, owner of the new items.
+
+    Returns:
+        The created Item objects, in the order of `items`.
+    """
+    return create_owned_items(db, [(item, current_user.id) for item in items])
+
+
+def create_owned_items(db: Session, entries: List[Tuple[ItemCreate, int]]) -> List[Item]:
+    """
+    Creates items of possibly different owners with a single multi-row INSERT ... RETURNING and one commit.
+
+    Args:
+        db: The database session.
+        entries: The item data to create, each with the ID of its owner.
+
+    Returns:
+        The created Item objects, in the order of `entries`.
+    """
+    # Without an implicit sentinel, as on SQLite, an ordered RETURNING degrades to one INSERT per row.
+    # There the single statement assigns ascending IDs in VALUES order, so sorting by ID is equivalent.
+    ordered = db.get_bind().dialect.insertmanyvalues_implicit_sentinel != InsertmanyvaluesSentinelOpts.NOT_SUPPORTED
+    stmt = (
+        insert(Item)
+        .values(search_vector=search_vector(db.get_bind().dialect.name, bindparam("search_document")))
+        .returning(Item, sort_by_parameter_order=ordered)
+    )
+    rows = [
+        {**item.dict(), "owner_id": owner_id, "search_document": search_document(item.title, item.description)}
+        for item, owner_id in entries
+    ]
+    db_items = db.scalars(stmt, rows).all()
+    _adjust_item_counts(db, (owner_id for _, owner_id in entries))
+    db.commit()
+    item_cache.invalidate(*(item.id for item in db_items))
+    return list(db_items) if ordered else sorted(db_items, key=lambda item: item.id)
+
+
+def update_items(db: Session, items: List[ItemBulkUpdateEntry], current_user: CurrentUser) -> List[Item]:
+    """
+    Updates several items with a single UPDATE ... RETURNING statement.
+
+    On Postgres the new values are joined in with UPDATE ... FROM (VALUES ...). Other dialects, e.g. SQLite,
+    have no such form, so each column is set with a CASE keyed on the item ID instead. Items that do not
+    exist or that the current user does not own, unless superuser, are left untouched.
+
+    Args:
+        db: The database session.
+        items: The item data to update, each carrying the ID of the item.
+        current_user: The current user object.
+
+    Returns:
+        The updated Item objects.
+    """
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name == "postgresql":
+        data = values(
+            column("id", Integer),
+            column("title", String),
+            column("description", String),
+            column("document", String),
+            name="data",
+        ).data(
+            [(item.id, item.title, item.description, search_document(item.title, item.description)) for item in items]
+        )
+        stmt = (
+            update(Item)
+            .where(Item.id == data.c.id)
+            .values(
+                title=data.c.title,
+                description=data.c.description,
+                search_vector=search_vector(dialect_name, data.c.document),
+            )
+        )
+    else:
+        by_id = {item.id: item for item in items}
+        stmt = (
+            update(Item)
+            .where(Item.id.in_(by_id))
+            .values(
+                title=case({id: item.title for id, item in by_id.items()}, value=Item.id),
+                description=case({id: item.description for id, item in by_id.items()}, value=Item.id),
+                search_vector=search_vector(
+                    dialect_name,
+                    case(
+                        {id: search_document(item.title, item.description) for id, item in by_id.items()},
+                        value=Item.id,
+                    ),
+                ),
+            )
+        )
+
+    stmt = (
+        stmt.values(version=Item.version + 1, updated_at=func.now())
+        .returning(Item)
+        .execution_options(synchronize_session=False)
+    )
+    if not current_user.is_superuser:
+        stmt = stmt.where(Item.owner_id == current_user.id)
+
+    db_items = db.scalars(stmt).all()
+    db.commit()
+    item_cache.invalidate(*(item.id for item in db_items))
+    return list(db_items)
+
+
+def delete_items_by_ids(db: Session, ids: List[int], current_user: CurrentUser) -> List[int]:
     """
-    stmt = delete(Item).where(Item.id == id).execution_options(synchronize_session="fetch")
-    db.execute(stmt)
+    Deletes several items with a single DELETE ... WHERE id IN (...) RETURNING statement.
+
+    Items that do not exist or that the current user does not own, unless superuser, are left untouched.
+
+    Args:
+        db: The database session.
+        ids: The IDs of the items to delete.
+        current_user: The current user object.
+
+    Returns:
+        The IDs of the deleted items.
+    """
+    stmt = (
+        delete(Item)
+        .where(Item.id.in_(ids))
+        .returning(Item.id, Item.owner_id)
+        .execution_options(synchronize_session=False)
+    )
+    if not current_user.is_superuser:
+        stmt = stmt.where(Item.owner_id == current_user.id)
+
+    deleted = db.execute(stmt).all()
+    _adjust_item_counts(db, (row.owner_id for row in deleted), sign=-1)
     db.commit()
+    deleted_ids = [row.id for row in deleted]
+    item_cache.invalidate(*deleted_ids)
+    return deleted_ids
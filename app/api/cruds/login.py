@@ -1,14 +1,15 @@
-from sqlalchemy.orm import Session
-
-from app.api.cruds.user import get_user_by_email
+from app.api.cruds.user import get_user_by_email, update_password_hash
 from app.api.models.user import User
-from app.api.utils.security import verify_password
+from app.api.utils.security import verify_and_update_password_async
+from app.database import AnySession, run_db
 
 
-def authenticate(db: Session, email: str, password: str) -> User | None:
+async def authenticate(db: AnySession, email: str, password: str) -> User | None:
     """
     Authenticates a user based on their email and password.
 
+    The stored hash is transparently upgraded when it was made with a different bcrypt cost.
+
     Args:
         db: The database session.
         email: The email of the user.
@@ -17,9 +18,15 @@ def authenticate(db: Session, email: str, password: str) -> User | None:
     Returns:
         The authenticated user object if successful, otherwise None.
     """
-    user = get_user_by_email(db, email)
+    user = await run_db(db, get_user_by_email, email, with_password=True)
+    if not user:
+        return None
+
+    verified, new_hash = await verify_and_update_password_async(password, str(user.hash_password))
+    if not verified:
+        return None
 
-    if user and verify_password(password, str(user.hash_password)):
-        return user
+    if new_hash:
+        await run_db(db, update_password_hash, user, new_hash)
 
-    return None
+    return user
@@ -0,0 +1,122 @@
+import time
+from typing import List, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from app.api.models.user import TokenRevocation
+from app.api.utils.revocation import RevocationRow, revocations
+from app.configs import settings
+from app.database import dialect_insert
+
+
+def _longest_token_expiry() -> int:
+    # Every token minted up to now has expired by then
+    return int(time.time()) + max(settings.ACCESS_TOKEN_EXPIRE_MINUTES, settings.REFRESH_TOKEN_EXPIRE_MINUTES) * 60
+
+
+def _prune(db: Session) -> None:
+    db.execute(delete(TokenRevocation).where(TokenRevocation.expires_at <= int(time.time())))
+
+
+def add_generation_revocation(db: Session, user_id: int, generation: int) -> int:
+    """
+    Records the revocation of the tokens of a user below a generation, in the current transaction.
+
+    Callers commit, then apply the revocation to this worker with `revocations.revoke_generation`.
+
+    Args:
+        db: The database session.
+        user_id: The ID of the user.
+        generation: The first generation still valid.
+
+    Returns:
+        The Unix time after which the revocation can be forgotten.
+    """
+    expires_at = _longest_token_expiry()
+    _prune(db)
+    db.add(TokenRevocation(user_id=user_id, generation=generation, expires_at=expires_at))
+    return expires_at
+
+
+def add_stale_claims(db: Session, user_id: int, version: int) -> int:
+    """
+    Records that the claims of the access tokens of a user below a version are stale, in the current transaction.
+
+    Callers commit, then apply it to this worker with `revocations.mark_stale`.
+
+    Args:
+        db: The database session.
+        user_id: The ID of the user.
+        version: The first user version whose claims are current.
+
+    Returns:
+        The Unix time after which the record can be forgotten.
+    """
+    # Only access tokens carry claims
+    expires_at = int(time.time()) + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    _prune(db)
+    db.add(TokenRevocation(user_id=user_id, version=version, expires_at=expires_at))
+    return expires_at
+
+
+def revoke_token(db: Session, user_id: int, jti: str, expires_at: int) -> bool:
+    """
+    Revokes a single token with a single INSERT ... ON CONFLICT (jti) DO NOTHING RETURNING statement.
+
+    Args:
+        db: The database session.
+        user_id: The ID of the user the token belongs to.
+        jti: The ID of the token.
+        expires_at: The Unix time the token expires at.
+
+    Returns:
+        False if the token was already revoked, e.g. by a concurrent refresh with the same refresh token.
+    """
+    _prune(db)
+    stmt = (
+        dialect_insert(db, TokenRevocation)
+        .values(user_id=user_id, jti=jti, expires_at=expires_at)
+        .on_conflict_do_nothing(index_elements=[TokenRevocation.jti])
+        .returning(TokenRevocation.id)
+    )
+    revoked = db.scalar(stmt) is not None
+    db.commit()
+    revocations.revoke_token(jti, expires_at)
+    return revoked
+
+
+def get_revocations_fingerprint(db: Session) -> Tuple[int, int]:
+    """
+    Retrieves the row count and maximum ID of the `token_revocations` table, which change with any revocation.
+
+    Args:
+        db: The database session.
+
+    Returns:
+        The row count and the maximum ID, 0 for an empty table.
+    """
+    stmt = select(func.count(), func.coalesce(func.max(TokenRevocation.id), 0)).select_from(TokenRevocation)
+    count, max_id = db.execute(stmt).one()
+    return count, max_id
+
+
+def get_revocations(db: Session) -> List[RevocationRow]:
+    """
+    Retrieves the revocations whose tokens have not all expired yet.
+
+    Args:
+        db: The database session.
+
+    Returns:
+        The `id`, `user_id`, `jti`, `generation`, `version` and `expires_at` of each revocation.
+    """
+    stmt = select(
+        TokenRevocation.id,
+        TokenRevocation.user_id,
+        TokenRevocation.jti,
+        TokenRevocation.generation,
+        TokenRevocation.version,
+        TokenRevocation.expires_at,
+    ).where(TokenRevocation.expires_at > int(time.time()))
+    return [tuple(row) for row in db.execute(stmt)]
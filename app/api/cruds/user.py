@@ -1,52 +1,79 @@
-from typing import List
+from typing import List, Sequence
 
-from sqlalchemy import delete, update
-from sqlalchemy.orm import Session
+from sqlalchemy import Row, delete, func, select, update
+from sqlalchemy.orm import Session, load_only, undefer
 
+from app.api.cruds.token import add_generation_revocation, add_stale_claims
 from app.api.models.user import User
-from app.api.schemas.user import UserCreate, UserUpdate, UserUpdateMe
-from app.api.utils.security import get_password_hash
+from app.api.schemas.user import (
+    Principal,
+    UserCreate,
+    UserOut,
+    UserUpdate,
+    UserUpdateMe,
+)
+from app.api.utils.cache import EntityCache, principal_cache
+from app.api.utils.revocation import revocations
+from app.database import dialect_insert, is_primary
 
+# The password hash stays out of the shared cache, logins read users by email from the database
+user_cache: EntityCache[User] = EntityCache("user", User, exclude=("hash_password",))
+# The columns listings load by default, those `UserOut` exposes
+LIST_FIELDS = tuple(UserOut.model_fields)
 
-def create_user(db: Session, user_data: UserCreate) -> User:
+
+def create_user(db: Session, user_data: UserCreate, hashed_password: str) -> User | None:
     """
-    Create a new user in the database.
+    Create a new user in the database with a single INSERT ... ON CONFLICT (email) DO NOTHING RETURNING statement.
 
     Args:
         db: The database session.
         user_data: The data of the user to be created.
+        hashed_password: The hashed password of the user.
 
     Returns:
-        User: The created user object.
+        User: The created user object, or None if the email is already registered.
     """
-    # Generate the hashed password from the provided password
-    hashed_password = get_password_hash(user_data.password)
-    # Create the user object and add it to the database in one step
-    user = User(**user_data.dict(exclude={"password"}), hash_password=hashed_password)
-    db.add(user)
+    stmt = (
+        dialect_insert(db, User)
+        .values(**user_data.dict(exclude={"password"}), hash_password=hashed_password)
+        .on_conflict_do_nothing(index_elements=[User.email])
+        .returning(User)
+    )
+
+    user = db.scalars(stmt).one_or_none()
     db.commit()
-    db.refresh(user)
+    if user is not None:
+        # Drops a cached "not found" for the new ID
+        user_cache.invalidate(user.id)
     return user
 
 
-def get_users(db: Session, skip: int, limit: int) -> List[User]:
+def get_users(db: Session, after_id: int | None, limit: int, fields: Sequence[str] = LIST_FIELDS) -> List[User]:
     """
-    Retrieves a list of users from the database.
+    Retrieves a page of users ordered by ID, starting after the provided ID.
 
     Args:
-        skip: The number of users to skip.
-        limit: The maximum number of users to retrieve.
         db: The database session.
+        after_id: The ID of the last user of the previous page, or None for the first page.
+        limit: The maximum number of users to retrieve.
+        fields: The columns to load besides the ID, the others are left unloaded.
 
     Returns:
         A list of user objects.
     """
-    return db.query(User).offset(skip).limit(limit).all()
+    query = db.query(User).options(load_only(*(getattr(User, name) for name in fields))).order_by(User.id)
+    if after_id is not None:
+        query = query.filter(User.id > after_id)
+
+    return query.limit(limit).all()
 
 
 def get_user_by_id(db: Session, id: int) -> User | None:
     """
-    Retrieves a user from the database by their ID.
+    Retrieves a user by their ID through the read-through user cache.
+
+    Users served from the cache are detached and carry no password hash.
 
     Args:
         db: The database session.
@@ -55,77 +82,208 @@ def get_user_by_id(db: Session, id: int) -> User | None:
     Returns:
         The user object if found, otherwise None.
     """
-    return db.query(User).filter(User.id == id).first()
+    return user_cache.get_or_load(id, lambda: db.query(User).filter(User.id == id).first(), fill=is_primary(db))
 
 
-def get_user_by_email(db: Session, email: str | None) -> User | None:
+def get_user_version(db: Session, id: int) -> Row | None:
+    """
+    Retrieves the role and version of a user without loading the user itself.
+
+    Args:
+        db: The database session.
+        id: The ID of the user.
+
+    Returns:
+        A row with the `id`, `is_superuser`, `version` and `updated_at` of the user, or None if it is not found.
+    """
+    return db.execute(select(User.id, User.is_superuser, User.version, User.updated_at).where(User.id == id)).first()
+
+
+def get_users_by_ids(db: Session, ids: List[int]) -> List[User]:
+    """
+    Retrieves the users with the given IDs in a single query.
+
+    Args:
+        db: The database session.
+        ids: The IDs of the users to retrieve.
+
+    Returns:
+        The user objects found, in no particular order.
+    """
+    return db.query(User).filter(User.id.in_(ids)).all()
+
+
+def get_user_by_email(db: Session, email: str | None, with_password: bool = False) -> User | None:
     """
     Retrieves a user from the database based on their email.
 
     Args:
         db: The database session.
         email: The email of the user.
+        with_password: Whether to load the password hash too, which is deferred otherwise.
 
     Returns:
         The user object if found, otherwise None.
     """
-    return db.query(User).filter(User.email == email).first()
+    query = db.query(User).filter(User.email == email)
+    if with_password:
+        query = query.options(undefer(User.hash_password))
+
+    return query.first()
 
 
-def update_user(db: Session, user: User, user_update: UserUpdate) -> None:
+def update_user(
+    db: Session, id: int, user_update: UserUpdate, hashed_password: str, expected_versions: List[int] | None = None
+) -> User | None:
     """
-    Updates a user in the database.
+    Updates a user in the database with a single UPDATE ... RETURNING statement.
+
+    The password is replaced and the role may change, so the tokens of the user are revoked.
 
     Args:
         db: The database session.
-        user: The user object to update.
+        id: The ID of the user to update.
         user_update: The updated user data.
         hashed_password: The hashed password of the user.
+        expected_versions: The versions the user must be at for the update to apply, None for any.
+
+    Returns:
+        The updated user object, or None if the user is not found or at another version.
+
+    Raises:
+        IntegrityError: If the new email is already registered.
     """
     stmt = (
         update(User)
-        .where(User.id == user.id)
+        .where(User.id == id)
         .values(
             **user_update.dict(exclude={"password"}, exclude_none=True),
-            hash_password=get_password_hash(user_update.password),
+            hash_password=hashed_password,
+            version=User.version + 1,
+            updated_at=func.now(),
+            token_generation=User.token_generation + 1,
         )
+        .returning(User)
         .execution_options(synchronize_session="fetch")
     )
+    if expected_versions is not None:
+        stmt = stmt.where(User.version.in_(expected_versions))
 
-    db.execute(stmt)
+    user = db.scalars(stmt).one_or_none()
+    expires_at = add_generation_revocation(db, id, user.token_generation) if user is not None else None
+    db.commit()
+    if user is not None:
+        revocations.revoke_generation(id, user.token_generation, expires_at)
+    principal_cache.delete(id)
+    user_cache.invalidate(id)
+    return user
+
+
+def update_password_hash(db: Session, user: User, hashed_password: str) -> None:
+    """
+    Replaces the stored password hash of a user, e.g. after a bcrypt cost change.
+
+    The version is left alone: the hash is not part of any representation and the password is unchanged.
+
+    Args:
+        db: The database session.
+        user: The user object to update.
+        hashed_password: The new hashed password of the user.
+    """
+    user.hash_password = hashed_password  # type: ignore[assignment]
     db.commit()
 
 
-def update_me(db: Session, user: User, user_update: UserUpdateMe) -> User | None:
+def update_me(
+    db: Session, user: User | Principal, user_update: UserUpdateMe, expected_versions: List[int] | None = None
+) -> User | None:
     """
-    Updates a user me in the database.
+    Updates a user me in the database with a single UPDATE ... RETURNING statement.
+
+    A new email makes the claims of the access tokens of the user stale, which is recorded along.
 
     Args:
         db: The database session.
         user: The user object to update.
         user_update: The updated user data.
+        expected_versions: The versions the user must be at for the update to apply, None for any.
+
+    Returns:
+        The updated user object, or None if the user is not found or at another version.
+
+    Raises:
+        IntegrityError: If the new email is already registered.
     """
     stmt = (
         update(User)
         .where(User.id == user.id)
-        .values(**user_update.dict(exclude_none=True))
+        .values(**user_update.dict(exclude_none=True), version=User.version + 1, updated_at=func.now())
+        .returning(User)
         .execution_options(synchronize_session="fetch")
     )
+    if expected_versions is not None:
+        stmt = stmt.where(User.version.in_(expected_versions))
 
-    db.execute(stmt)
+    db_user = db.scalars(stmt).one_or_none()
+    stale = db_user is not None and user_update.email is not None
+    expires_at = add_stale_claims(db, user.id, db_user.version) if stale else None
     db.commit()
-
-    return db.query(User).filter(User.id == user.id).first()
+    if stale:
+        revocations.mark_stale(user.id, db_user.version, expires_at)
+    principal_cache.delete(user.id)
+    user_cache.invalidate(user.id)
+    return db_user
 
 
 def delete_user(db: Session, user: User) -> None:
     """
-    Deletes a user from the database.
+    Deletes a user from the database, revoking their tokens.
 
     Args:
         db: The database session.
         user: The user object to delete.
     """
-    stmt = delete(User).where(User.id == user.id).execution_options(synchronize_session="fetch")
-    db.execute(stmt)
+    stmt = (
+        delete(User)
+        .where(User.id == user.id)
+        .returning(User.token_generation)
+        .execution_options(synchronize_session="fetch")
+    )
+    generation = db.scalar(stmt)
+    expires_at = add_generation_revocation(db, user.id, generation + 1) if generation is not None else None
+    db.commit()
+    if generation is not None:
+        revocations.revoke_generation(user.id, generation + 1, expires_at)
+    principal_cache.delete(user.id)
+    user_cache.invalidate(user.id)
+
+
+def revoke_user_tokens(db: Session, id: int) -> int | None:
+    """
+    Revokes every token of a user by bumping their token generation.
+
+    Args:
+        db: The database session.
+        id: The ID of the user.
+
+    Returns:
+        The new token generation of the user, or None if the user is not found.
+    """
+    stmt = (
+        update(User)
+        .where(User.id == id)
+        .values(token_generation=User.token_generation + 1)
+        .returning(User.token_generation)
+        .execution_options(synchronize_session=False)
+    )
+    generation = db.scalar(stmt)
+    if generation is None:
+        db.rollback()
+        return None
+
+    expires_at = add_generation_revocation(db, id, generation)
     db.commit()
+    revocations.revoke_generation(id, generation, expires_at)
+    principal_cache.delete(id)
+    user_cache.invalidate(id)
+    return generation
@@ -1,5 +1,16 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    func,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 
 from app.database import Base
 
@@ -10,10 +21,37 @@ class User(Base):
     id = Column(Integer, autoincrement=True, primary_key=True, index=True)
     username = Column(String)
     email = Column(String, index=True, unique=True)
-    hash_password = Column(String)
+    # Only logins read it, see `cruds.user.get_user_by_email`
+    hash_password = deferred(Column(String))
     is_active = Column(Boolean)
     is_superuser = Column(Boolean)
     items = relationship("Item", uselist=True, order_by="Item.id", backref="users")
+    # Bumped by every write of the crud layer, they back the ETag and Last-Modified headers
+    version = Column(Integer, nullable=False, default=1)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=func.now())
+    # Carried by the tokens of the user, bumping it revokes all of them at once
+    token_generation = Column(Integer, nullable=False, default=0)
+
+
+class TokenRevocation(Base):
+    """
+    A revoked token, all the tokens of a user below a generation, or the stale claims of the tokens of a user
+    below a version, until the tokens concerned expire.
+
+    Workers mirror the table in memory, see `app.revocation`.
+    """
+
+    __tablename__ = "token_revocations"
+
+    id = Column(Integer, autoincrement=True, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    # One of the ID of the revoked token, the first generation of the user still valid, or the first
+    # user version whose claims are current
+    jti = Column(String, unique=True)
+    generation = Column(Integer)
+    version = Column(Integer)
+    # Unix time after which the revoked tokens are expired anyway and the row can go
+    expires_at = Column(Integer, nullable=False, index=True)
 
 
 class Item(Base):
@@ -23,3 +61,25 @@ class Item(Base):
     title = Column(String, index=True)
     description = Column(String)
     owner_id = Column(Integer, ForeignKey("users.id"))
+    version = Column(Integer, nullable=False, default=1)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=func.now())
+    # Written by the crud layer from the title and description, see `cruds.item.search_vector`.
+    # Plain lowercased text on SQLite, which has no tsvector. Deferred so regular loads skip it.
+    search_vector = deferred(Column(TSVECTOR().with_variant(Text(), "sqlite")))
+
+    # Serves the owner filtered, id ordered listing of `get_items` as an index range scan
+    __table_args__ = (
+        Index("ix_items_owner_id_id", "owner_id", "id"),
+        Index("ix_items_search_vector", "search_vector", postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
+
+
+class ItemCount(Base):
+    """
+    The number of items of each owner, kept up to date by the crud layer along with the items.
+    """
+
+    __tablename__ = "item_counts"
+
+    owner_id = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
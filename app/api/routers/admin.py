@@ -0,0 +1,46 @@
+from typing import Any
+
+from fastapi import APIRouter, Depends  # type: ignore
+
+from app.api.cruds.item import item_cache
+from app.api.cruds.user import user_cache
+from app.api.utils.cache import principal_cache
+from app.configs import settings
+from app.database import (
+    async_engine,
+    async_replica_engines,
+    engine,
+    pool_stats,
+    replica_engines,
+)
+from app.dependencies import get_current_active_superuser
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(get_current_active_superuser)])
+
+
+@router.get("/cache-stats", response_model=dict)
+async def read_cache_stats() -> Any:
+    """
+    Returns the size and hit/miss counters of the in-process caches, and this worker's shared cache lookups.
+
+    Returns:
+        A dictionary of cache statistics keyed by cache name.
+    """
+    return {"principal": principal_cache.stats(), "item": item_cache.stats(), "user": user_cache.stats()}
+
+
+@router.get("/pool-stats", response_model=dict)
+async def read_pool_stats() -> Any:
+    """
+    Returns the live state of the database connection pools of this worker.
+
+    Returns:
+        A dictionary of pool statistics for the primary and replica engines, and which kind serves requests.
+    """
+    return {
+        "active": "async" if settings.DB_ASYNC else "sync",
+        "sync": pool_stats(engine),
+        "async": pool_stats(async_engine.sync_engine),
+        "replicas": [pool_stats(replica) for replica in replica_engines],
+        "async_replicas": [pool_stats(replica.sync_engine) for replica in async_replica_engines],
+    }
@@ -0,0 +1,35 @@
+from typing import Any
+
+from fastapi import APIRouter, HTTPException, status  # type: ignore
+
+from app.readiness import readiness
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+
+@router.get("/live", response_model=dict)
+async def read_liveness() -> Any:
+    """
+    Reports that the worker is up, without touching the database.
+
+    Returns:
+        The status of the worker.
+    """
+    return {"status": "ok"}
+
+
+@router.get("/ready", response_model=dict)
+async def read_readiness() -> Any:
+    """
+    Reports whether the worker is ready for traffic: pool warm-up is complete and the schema is up to date.
+
+    Returns:
+        The status of the worker and the schema version of the database.
+
+    Raises:
+        HTTPException: If the worker is still warming up or the schema is behind the code.
+    """
+    if not readiness.ready:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=readiness.detail)
+
+    return {"status": "ready", "schema_version": readiness.schema_version}
@@ -1,47 +1,348 @@
-from typing import List
-
-from fastapi import APIRouter, Depends, HTTPException, status  # type: ignore
-from sqlalchemy.orm import Session
+import csv
+import io
+import json
+from typing import AsyncIterator, Iterator, List, Sequence, Tuple
+
+from fastapi import (  # type: ignore
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse  # type: ignore
+from sqlalchemy import Row, RowMapping
 
 from app.api.cruds import item as crud
-from app.api.schemas.item import ItemCreate, ItemOut, ItemUpdate
-from app.database import get_db
+from app.api.models.user import Item
+from app.api.schemas.batch import BatchStatus
+from app.api.schemas.item import (
+    ItemBatchResult,
+    ItemBulkCreate,
+    ItemBulkDelete,
+    ItemBulkDeleteResult,
+    ItemBulkResult,
+    ItemBulkUpdate,
+    ItemCreate,
+    ItemExportFormat,
+    ItemOut,
+    ItemOwnerStats,
+    ItemSearchResult,
+    ItemUpdate,
+)
+from app.api.schemas.user import Principal
+from app.api.utils.conditional import (
+    get_if_match,
+    is_conditional,
+    is_not_modified,
+    not_modified_response,
+    set_validator_headers,
+)
+from app.api.utils.fields import get_fields_param
+from app.api.utils.pagination import (
+    PageParams,
+    get_page_params,
+    set_next_page_headers,
+    set_total_count_headers,
+)
+from app.api.utils.serialization import render_fields, render_response
+from app.coalescer import item_create_coalescer
+from app.configs import settings
+from app.database import (
+    AnySession,
+    get_read_session,
+    get_session,
+    read_async_engine,
+    read_engine,
+    run_db,
+)
 from app.dependencies import CurrentUser
+from app.query_budget import query_budget
 
 router = APIRouter(prefix="/items", tags=["items"])
 
+EXPORT_FIELDS = [column.key for column in crud.EXPORT_COLUMNS]
+EXPORT_MEDIA_TYPES = {ItemExportFormat.ndjson: "application/x-ndjson", ItemExportFormat.csv: "text/csv"}
+
+get_item_fields = get_fields_param(ItemOut)
+
+
+def _can_access_item(item: Item | Row, current_user: Principal) -> bool:
+    """
+    Checks whether the current user may read or modify the item.
+
+    Args:
+        item: The item, or a row carrying its `owner_id`, to check.
+        current_user: The current user object.
+
+    Returns:
+        True if the current user is a superuser or owns the item, False otherwise.
+    """
+    return bool(current_user.is_superuser or item.owner_id == current_user.id)
+
+
+async def _write_error(
+    db: AnySession, id: int, current_user: Principal, expected_versions: List[int] | None = None
+) -> HTTPException:
+    """
+    Tells a missing item apart from a forbidden or modified one after a conditional write matched no row.
+
+    Only this failure path pays for the extra lookup.
+
+    Args:
+        db: The database session.
+        id: The ID of the item that was written.
+        current_user: The current user object.
+        expected_versions: The versions from `If-Match` the write was conditioned on, if any.
+
+    Returns:
+        The HTTPException to raise.
+    """
+    if current_user.is_superuser and expected_versions is None:
+        return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
+
+    item = await run_db(db, crud.get_item_version, id=id)
+    if not item:
+        return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
+    if not _can_access_item(item, current_user):
+        return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+
+    return HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Item was modified")
+
 
 @router.get("/", response_model=List[ItemOut], status_code=status.HTTP_200_OK)
-def read_items(current_user: CurrentUser, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@query_budget(4)
+async def read_items(
+    request: Request,
+    response: Response,
+    current_user: CurrentUser,
+    page: PageParams = Depends(get_page_params),
+    fields: Tuple[str, ...] | None = Depends(get_item_fields),
+    db: AnySession = Depends(get_read_session),
+):
     """
-    Retrieves a list of items from the database based on the provided skip and limit parameters.
+    Retrieves a page of items from the database, ordered by ID.
+
+    The cursor of the next page is returned in the `Link` and `X-Next-Cursor` headers, the number of
+    items in `X-Total-Count`, see `crud.count_items`. Only the columns of the requested fields are loaded.
 
     Args:
+        request: The current request.
+        response: The response, used to set the pagination headers.
         current_user: The current user object obtained from the dependency.
-        skip: The number of items to skip. Defaults to 0.
-        limit: The maximum number of items to retrieve. Defaults to 100.
-        db: The database session obtained from the `get_db` dependency.
+        page: The `cursor` and `limit` query parameters.
+        fields: The `fields` query parameter, the fields to return.
+        db: The database session obtained from the `get_read_session` dependency.
 
     Returns:
         A list of Item objects retrieved from the database.
     """
-    items = crud.get_items(db, skip, limit, current_user)
+    rows = await run_db(db, crud.get_items, page.after_id, page.limit + 1, current_user, fields or crud.LIST_FIELDS)
+    items, next_cursor = page.paginate(rows)
 
     if not items:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Items not found")
 
-    return items
+    set_next_page_headers(request, response, next_cursor)
+    set_total_count_headers(response, *await run_db(db, crud.count_items, current_user))
+    if fields:
+        return render_fields(items, fields, response)
+    return render_response(List[ItemOut], items, response)
+
+
+@router.get("/batch", response_model=List[ItemBatchResult], status_code=status.HTTP_200_OK)
+async def read_items_by_ids(
+    current_user: CurrentUser,
+    ids: List[int] = Query(default=[], max_length=settings.BATCH_MAX_IDS),
+    db: AnySession = Depends(get_read_session),
+):
+    """
+    Retrieves several items at once, resolving every ID with a single query.
+
+    Args:
+        current_user: The current user object obtained from the dependency.
+        ids: The IDs of the items to retrieve, e.g. `?ids=1&ids=2`.
+        db: The database session obtained from the `get_read_session` dependency.
+
+    Returns:
+        One result per distinct requested ID, in request order, marked as ok, not found or forbidden.
+    """
+    if not ids:
+        return []
+
+    items = {item.id: item for item in await run_db(db, crud.get_items_by_ids, ids)}
+
+    results = []
+    for item_id in dict.fromkeys(ids):
+        item = items.get(item_id)
+        if item is None:
+            results.append({"id": item_id, "status": BatchStatus.not_found})
+        elif not _can_access_item(item, current_user):
+            results.append({"id": item_id, "status": BatchStatus.forbidden})
+        else:
+            results.append({"id": item_id, "status": BatchStatus.ok, "item": item})
+
+    return results
+
+
+def _encode_partition(format: ItemExportFormat, partition: Sequence[RowMapping]) -> str:
+    """
+    Encodes a batch of exported rows as NDJSON lines or CSV records.
+
+    Args:
+        format: The export format.
+        partition: The rows to encode.
+
+    Returns:
+        The encoded chunk.
+    """
+    if format == ItemExportFormat.ndjson:
+        return "".join(json.dumps(dict(row)) + "\n" for row in partition)
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([row[field] for field in EXPORT_FIELDS] for row in partition)
+    return buffer.getvalue()
+
+
+def _export_chunks(format: ItemExportFormat, partitions: Iterator[Sequence[RowMapping]]) -> Iterator[str]:
+    """
+    Yields the export body chunk by chunk, starting with the CSV header if any.
+    """
+    if format == ItemExportFormat.csv:
+        yield ",".join(EXPORT_FIELDS) + "\r\n"
+    for partition in partitions:
+        yield _encode_partition(format, partition)
+
+
+async def _aexport_chunks(
+    format: ItemExportFormat, partitions: AsyncIterator[Sequence[RowMapping]]
+) -> AsyncIterator[str]:
+    """
+    Async counterpart of `_export_chunks`.
+    """
+    if format == ItemExportFormat.csv:
+        yield ",".join(EXPORT_FIELDS) + "\r\n"
+    async for partition in partitions:
+        yield _encode_partition(format, partition)
+
+
+@router.get("/export", response_class=StreamingResponse, status_code=status.HTTP_200_OK)
+async def export_items(request: Request, current_user: CurrentUser, format: ItemExportFormat = ItemExportFormat.ndjson):
+    """
+    Streams every item visible to the current user as NDJSON or CSV.
+
+    Rows are read from a server-side cursor in batches of `EXPORT_BATCH_SIZE`, so memory stays flat
+    regardless of the number of items. They come from a replica unless the client wrote recently.
+
+    Args:
+        request: The current request.
+        current_user: The current user object obtained from the dependency.
+        format: The export format, `ndjson` or `csv`. Defaults to `ndjson`.
+
+    Returns:
+        A streaming response with the exported items.
+    """
+    if settings.DB_ASYNC:
+        chunks: Iterator[str] | AsyncIterator[str] = _aexport_chunks(
+            format, crud.aiter_item_partitions(current_user, settings.EXPORT_BATCH_SIZE, read_async_engine(request))
+        )
+    else:
+        chunks = _export_chunks(
+            format, crud.iter_item_partitions(current_user, settings.EXPORT_BATCH_SIZE, read_engine(request))
+        )
+
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="items.{format.value}"'},
+    )
+
+
+@router.get("/search", response_model=List[ItemSearchResult], status_code=status.HTTP_200_OK)
+async def search_items(
+    current_user: CurrentUser,
+    q: str = Query(min_length=1, max_length=200, description="Keywords, quoted phrases, `or` and `-word`"),
+    limit: int = Query(default=settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    offset: int = Query(default=0, ge=0, le=settings.SEARCH_MAX_OFFSET),
+    db: AnySession = Depends(get_read_session),
+):
+    """
+    Searches the items visible to the current user by keywords in their title and description.
+
+    Results are ordered by relevance and carry a snippet with the matches highlighted in `<mark>` tags.
+
+    Args:
+        current_user: The current user object obtained from the dependency.
+        q: The search query.
+        limit: The maximum number of results to return.
+        offset: The number of best results to skip, bounded as deep pages rank every match.
+        db: The database session obtained from the `get_read_session` dependency.
+
+    Returns:
+        The matching items, best first. An empty list when nothing matches.
+    """
+    return await run_db(db, crud.search_items, q, limit, offset, current_user)
+
+
+@router.get("/stats", response_model=List[ItemOwnerStats], status_code=status.HTTP_200_OK)
+async def read_item_stats(
+    request: Request,
+    response: Response,
+    current_user: CurrentUser,
+    page: PageParams = Depends(get_page_params),
+    db: AnySession = Depends(get_read_session),
+):
+    """
+    Retrieves the number of items of each owner, ordered by owner ID, only the current user's unless superuser.
+
+    Counts are read from `item_counts`, the items are not scanned. The cursor of the next page is
+    returned in the `Link` and `X-Next-Cursor` headers.
+
+    Args:
+        request: The current request.
+        response: The response, used to set the pagination headers.
+        current_user: The current user object obtained from the dependency.
+        page: The `cursor` and `limit` query parameters.
+        db: The database session obtained from the `get_read_session` dependency.
+
+    Returns:
+        The item count of each owner with items.
+    """
+    rows = await run_db(db, crud.get_item_counts, page.after_id, page.limit + 1, current_user)
+    stats, next_cursor = page.paginate(rows, key="owner_id")
+
+    set_next_page_headers(request, response, next_cursor)
+    return stats
 
 
 @router.get("/{id}", response_model=ItemOut | None, status_code=status.HTTP_200_OK)
-def read_item_by_id(id: int, current_user: CurrentUser, db: Session = Depends(get_db)):
+@query_budget(3)
+async def read_item_by_id(
+    id: int,
+    request: Request,
+    response: Response,
+    current_user: CurrentUser,
+    fields: Tuple[str, ...] | None = Depends(get_item_fields),
+    db: AnySession = Depends(get_read_session),
+):
     """
     Retrieves an item from the database based on the provided item ID and current user.
 
+    The item version is returned in the `ETag` and `Last-Modified` headers. A request carrying
+    `If-None-Match` or `If-Modified-Since` that still matches gets a 304 from a version lookup alone.
+
+    Unlike listings, the requested fields do not narrow the query with `load_only`: the item is read
+    through the entity cache, which holds full rows, so a cache hit runs no query at all.
+
     Args:
         id: The ID of the item to retrieve.
+        request: The current request.
+        response: The response, used to set the validator headers.
         current_user: The current user object obtained from the dependency.
-        db: The database session obtained from the `get_db` dependency.
+        fields: The `fields` query parameter, the fields to return.
+        db: The database session obtained from the `get_read_session` dependency.
 
     Returns:
         An Item object retrieved from the database.
@@ -49,65 +350,162 @@ def read_item_by_id(id: int, current_user: CurrentUser, db: Session = Depends(ge
     Raises:
         HTTPException: If the item is not found.
     """
-    item = crud.get_item_by_id(db=db, id=id)
+    if is_conditional(request):
+        current = await run_db(db, crud.get_item_version, id=id)
+        if (
+            current
+            and _can_access_item(current, current_user)
+            and is_not_modified(request, current.version, current.updated_at, fields)
+        ):
+            return not_modified_response(current.version, current.updated_at, fields)
+
+    item = await run_db(db, crud.get_item_by_id, id=id)
     if not item:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
 
-    if not current_user.is_superuser and item.owner_id != current_user.id:
+    if not _can_access_item(item, current_user):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
 
+    set_validator_headers(response, item.version, item.updated_at, fields)
+    if fields:
+        return render_fields(item, fields, response)
     return item
 
 
 @router.post("/", response_model=ItemOut, status_code=status.HTTP_201_CREATED)
-def create_item(item: ItemCreate, current_user: CurrentUser, db: Session = Depends(get_db)):
+@query_budget(3)
+async def create_item(item: ItemCreate, current_user: CurrentUser, db: AnySession = Depends(get_session)):
     """
     Creates an item in the database.
 
+    With `ITEM_CREATE_COALESCING`, concurrent creations are written together by `item_create_coalescer`.
+
     Args:
         item: The item data to create.
-        db: The database session obtained from the `get_db` dependency.
+        db: The database session obtained from the `get_session` dependency.
         current_user: The current user object obtained from the dependency.
 
     Returns:
         An Item object created in the database.
     """
-    return crud.create_item(db=db, item=item, current_user=current_user)
+    if settings.ITEM_CREATE_COALESCING:
+        return await item_create_coalescer.submit((item, current_user.id))
+
+    return await run_db(db, crud.create_item, item=item, current_user=current_user)
+
+
+@router.post("/bulk", response_model=ItemBulkResult, status_code=status.HTTP_201_CREATED)
+async def create_items(bulk: ItemBulkCreate, current_user: CurrentUser, db: AnySession = Depends(get_session)):
+    """
+    Creates up to `BULK_MAX_ITEMS` items in one statement and one transaction.
+
+    Args:
+        bulk: The items to create.
+        current_user: The current user object obtained from the dependency.
+        db: The database session obtained from the `get_session` dependency.
+
+    Returns:
+        The created items, in request order.
+    """
+    items = await run_db(db, crud.create_items, items=bulk.items, current_user=current_user)
+    return {"items": items}
+
+
+@router.patch("/bulk", response_model=ItemBulkResult)
+async def update_items(bulk: ItemBulkUpdate, current_user: CurrentUser, db: AnySession = Depends(get_session)):
+    """
+    Updates up to `BULK_MAX_ITEMS` items in one statement and one transaction.
+
+    Args:
+        bulk: The items to update, each carrying its ID.
+        current_user: The current user object obtained from the dependency.
+        db: The database session obtained from the `get_session` dependency.
+
+    Returns:
+        The updated items and the IDs that were not found or not owned by the current user.
+    """
+    items = await run_db(db, crud.update_items, items=bulk.items, current_user=current_user)
+    updated_ids = {item.id for item in items}
+    return {
+        "items": items,
+        "missing_ids": [entry.id for entry in bulk.items if entry.id not in updated_ids],
+    }
+
+
+@router.post("/bulk-delete", response_model=ItemBulkDeleteResult)
+async def delete_items(bulk: ItemBulkDelete, current_user: CurrentUser, db: AnySession = Depends(get_session)):
+    """
+    Deletes up to `BULK_MAX_ITEMS` items in one statement and one transaction.
+
+    Args:
+        bulk: The IDs of the items to delete.
+        current_user: The current user object obtained from the dependency.
+        db: The database session obtained from the `get_session` dependency.
+
+    Returns:
+        The deleted IDs and the IDs that were not found or not owned by the current user.
+    """
+    deleted_ids = await run_db(db, crud.delete_items_by_ids, ids=bulk.ids, current_user=current_user)
+    deleted = set(deleted_ids)
+    return {
+        "deleted_ids": deleted_ids,
+        "missing_ids": [id for id in dict.fromkeys(bulk.ids) if id not in deleted],
+    }
 
 
 @router.put("/{id}", response_model=ItemOut)
-def update_item(id: int, item_update: ItemUpdate, current_user: CurrentUser, db: Session = Depends(get_db)):
+@query_budget(3)
+async def update_item(
+    id: int,
+    item_update: ItemUpdate,
+    response: Response,
+    current_user: CurrentUser,
+    expected_versions: List[int] | None = Depends(get_if_match),
+    db: AnySession = Depends(get_session),
+):
     """
     Updates an item in the database.
 
+    With `If-Match`, the update only applies if the item is still at one of the given versions.
+
     Args:
         id: The ID of the item to update.
         item_update: The item data to update.
+        response: The response, used to set the validator headers of the new version.
         current_user: The current user object obtained from the dependency.
-        db: The database session obtained from the `get_db` dependency.
+        expected_versions: The versions parsed from the `If-Match` header, if any.
+        db: The database session obtained from the `get_session` dependency.
 
     Returns:
         An Item object updated in the database.
+
+    Raises:
+        HTTPException: If the item is not found, if there are permission issues or if it was modified since.
     """
-    db_item = crud.get_item_by_id(db=db, id=id)
+    db_item = await run_db(
+        db,
+        crud.update_item,
+        id=id,
+        item_update=item_update,
+        current_user=current_user,
+        expected_versions=expected_versions,
+    )
     if not db_item:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
-
-    if not current_user.is_superuser and db_item.owner_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+        raise await _write_error(db, id, current_user, expected_versions)
 
-    return crud.update_item(db=db, id=id, item_update=item_update)
+    set_validator_headers(response, db_item.version, db_item.updated_at)
+    return db_item
 
 
 @router.delete("/{id}", response_model=dict)
-def delete_item_by_id(id: int, current_user: CurrentUser, db: Session = Depends(get_db)):
+async def delete_item_by_id(id: int, current_user: CurrentUser, db: AnySession = Depends(get_session)):
     """
     Deletes an item by ID.
 
     Args:
         id: The ID of the item to delete.
         current_user: The current user object obtained from the dependency.
-        db: The database session obtained from the `get_db` dependency.
+        db: The database session obtained from the `get_session` dependency.
 
     Returns:
         A message indicating the success of the deletion.
@@ -115,12 +513,7 @@ def delete_item_by_id(id: int, current_user: CurrentUser, db: Session = Depends(
     Raises:
         HTTPException: If the item is not found or if there are permission issues.
     """
-    db_item = crud.get_item_by_id(db=db, id=id)
-    if not db_item:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
-
-    if not current_user.is_superuser and db_item.owner_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+    if not await run_db(db, crud.delete_item_by_id, id=id, current_user=current_user):
+        raise await _write_error(db, id, current_user)
 
-    crud.delete_item_by_id(db=db, id=id)
     return {"message": "Item deleted successfully"}
@@ -1,41 +1,46 @@
-from datetime import timedelta
 from typing import Annotated, Any
 
 from fastapi import APIRouter, Depends, HTTPException, status  # type: ignore
 from fastapi.security import OAuth2PasswordRequestForm  # type: ignore
-from sqlalchemy.orm import Session
 
 from app.api.cruds import login as crud
-from app.api.schemas.token import Token
+from app.api.cruds.token import revoke_token
+from app.api.cruds.user import get_user_by_id, revoke_user_tokens
+from app.api.schemas.token import (
+    LogoutRequest,
+    RefreshTokenRequest,
+    Token,
+    TokenPayload,
+)
 from app.api.schemas.user import UserOut
 from app.api.utils import security
-from app.configs import settings
-from app.database import get_db
-from app.dependencies import CurrentUser
+from app.api.utils.revocation import revocations
+from app.database import AnySession, get_read_session, get_session, run_db
+from app.dependencies import CurrentUser, get_token_payload
 
 router = APIRouter(prefix="/login", tags=["login"])
 
 
 @router.post("/access-token")
-def create_access_token(
+async def create_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    db: Session = Depends(get_db),
+    db: AnySession = Depends(get_session),
 ) -> Token:
     """
-    Create an access token for the user.
+    Create an access token and a refresh token for the user.
 
     Args:
         form_data: The form data containing the user's username and password.
-        db: The database session. Defaults to the session obtained from the `get_db` dependency.
+        db: The database session. Defaults to the session obtained from the `get_session` dependency.
 
     Returns:
-        The access token for the user.
+        The tokens for the user.
 
     Raises:
         HTTPException: If the username or password is incorrect or the user is inactive.
     """
     # Authenticate the user
-    user = crud.authenticate(db, form_data.username, form_data.password)
+    user = await crud.authenticate(db, form_data.username, form_data.password)
 
     # Check if the user exists and is active
     if not user:
@@ -43,23 +48,109 @@ def create_access_token(
     elif not user.is_active:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User is not active")
 
-    # Create the access token with the user's ID and expiration time
-    access_token_expiration = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = security.create_access_token(user.id, expires_delta=access_token_expiration)
+    # Create the tokens with the user's ID and token generation
+    return security.create_token_pair(user)
 
-    # Return the access token as a response
-    return Token(access_token=access_token)
+
+@router.post("/refresh-token")
+async def refresh_access_token(body: RefreshTokenRequest, db: AnySession = Depends(get_session)) -> Token:
+    """
+    Exchange a refresh token for new tokens.
+
+    The refresh token is rotated: it is revoked and a new one is returned. Presenting a revoked refresh
+    token again is taken as a sign it leaked, and revokes every token of the user.
+
+    Args:
+        body: The refresh token.
+        db: The database session. Defaults to the session obtained from the `get_session` dependency.
+
+    Returns:
+        The new tokens for the user.
+
+    Raises:
+        HTTPException: If the refresh token is invalid, expired or revoked, or the user is inactive.
+    """
+    token_data = security.decode_token(body.refresh_token, token_type="refresh")
+    invalid = HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Could not validate credentials")
+    if revocations.is_generation_revoked(token_data.sub, token_data.gen):
+        raise invalid
+    if revocations.is_token_revoked(token_data.jti):
+        await run_db(db, revoke_user_tokens, token_data.sub)
+        raise invalid
+
+    user = await run_db(db, get_user_by_id, token_data.sub)
+    if not user or not user.is_active or user.token_generation != token_data.gen:
+        raise invalid
+
+    if token_data.jti is None or token_data.exp is None:
+        raise invalid
+    # Only one of concurrent refreshes with the same token gets to revoke it
+    if not await run_db(db, revoke_token, user.id, token_data.jti, token_data.exp):
+        raise invalid
+
+    return security.create_token_pair(user)
+
+
+@router.post("/logout", response_model=dict)
+async def logout(
+    current_user: CurrentUser,
+    token_data: Annotated[TokenPayload, Depends(get_token_payload)],
+    body: LogoutRequest | None = None,
+    db: AnySession = Depends(get_session),
+) -> Any:
+    """
+    Revoke the access token of the request, and the refresh token given along.
+
+    Args:
+        current_user: The current user object.
+        token_data: The payload of the access token of the request.
+        body: The refresh token to revoke, if any.
+        db: The database session. Defaults to the session obtained from the `get_session` dependency.
+
+    Returns:
+        A message indicating the success of the logout.
+
+    Raises:
+        HTTPException: If the refresh token is invalid or belongs to another user.
+    """
+    refresh_token = security.decode_token(body.refresh_token, "refresh") if body and body.refresh_token else None
+    if refresh_token is not None and refresh_token.sub != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Could not validate credentials")
+
+    for payload in (token_data, refresh_token):
+        if payload is not None and payload.jti is not None and payload.exp is not None:
+            await run_db(db, revoke_token, current_user.id, payload.jti, payload.exp)
+
+    return {"message": "Logged out successfully"}
+
+
+@router.post("/logout-all", response_model=dict)
+async def logout_all(current_user: CurrentUser, db: AnySession = Depends(get_session)) -> Any:
+    """
+    Revoke every token of the current user, on every device.
+
+    Args:
+        current_user: The current user object.
+        db: The database session. Defaults to the session obtained from the `get_session` dependency.
+
+    Returns:
+        A message indicating the success of the logout.
+    """
+    await run_db(db, revoke_user_tokens, current_user.id)
+    return {"message": "Logged out of all sessions successfully"}
 
 
 @router.get("/test-access-token", response_model=UserOut)
-def read_access_token(current_user: CurrentUser) -> Any:
+async def read_access_token(current_user: CurrentUser, db: AnySession = Depends(get_read_session)) -> Any:
     """
     This endpoint is used to test the validity of the access token by returning the current user object.
 
     Args:
         current_user: The current user object obtained from the dependency.
+        db: The database session. Defaults to the session obtained from the `get_read_session` dependency.
 
     Returns:
         Any: The current user object.
     """
-    return current_user
+    # The cached principal does not carry every field of `UserOut`
+    return await run_db(db, get_user_by_id, current_user.id)
@@ -0,0 +1,73 @@
+from typing import Any, Iterator
+
+from fastapi import APIRouter  # type: ignore
+from fastapi.responses import PlainTextResponse  # type: ignore
+
+from app.admission import admission
+from app.api.cruds.item import item_cache
+from app.api.cruds.user import user_cache
+from app.api.utils.cache import principal_cache
+from app.coalescer import item_create_coalescer
+from app.configs import settings
+from app.database import (
+    async_engine,
+    async_replica_engines,
+    engine,
+    pool_stats,
+    replica_engines,
+)
+from app.metrics import registry
+
+router = APIRouter(tags=["metrics"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+POOL_GAUGES = ("size", "checked_in", "checked_out", "overflow")
+POOL_COUNTERS = ("checkouts", "timeouts", "wait_seconds_total")
+
+
+def _render_pools() -> Iterator[str]:
+    pools = {"sync": pool_stats(engine), "async": pool_stats(async_engine.sync_engine)}
+    for n, replica in enumerate(replica_engines):
+        pools[f"sync_replica{n}"] = pool_stats(replica)
+    for n, async_replica in enumerate(async_replica_engines):
+        pools[f"async_replica{n}"] = pool_stats(async_replica.sync_engine)
+    for key in POOL_GAUGES + POOL_COUNTERS:
+        name = f"db_pool_{key}"
+        yield f"# TYPE {name} {'gauge' if key in POOL_GAUGES else 'counter'}"
+        for pool, stats in pools.items():
+            if key in stats:
+                yield f'{name}{{pool="{pool}"}} {stats[key]}'
+
+
+def _render_caches() -> Iterator[str]:
+    caches = {"principal": principal_cache.stats(), "item": item_cache.stats(), "user": user_cache.stats()}
+    yield "# TYPE cache_hits_total counter"
+    for cache, stats in caches.items():
+        yield f'cache_hits_total{{cache="{cache}"}} {stats["hits"]}'
+    yield "# TYPE cache_misses_total counter"
+    for cache, stats in caches.items():
+        yield f'cache_misses_total{{cache="{cache}"}} {stats["misses"]}'
+    yield "# TYPE cache_stale_hits_total counter"
+    for cache in ("item", "user"):
+        yield f'cache_stale_hits_total{{cache="{cache}"}} {caches[cache]["stale_hits"]}'
+    yield "# TYPE cache_size gauge"
+    yield f'cache_size{{cache="principal"}} {caches["principal"]["size"]}'
+
+
+@router.get(settings.METRICS_PATH, response_class=PlainTextResponse, include_in_schema=False)
+async def read_metrics() -> Any:
+    """
+    Returns the metrics of this worker in the Prometheus text exposition format.
+
+    Returns:
+        The request, database, pool, cache, admission and write coalescing metrics.
+    """
+    lines = [
+        *registry.render(),
+        *_render_pools(),
+        *_render_caches(),
+        *admission.render(),
+        *item_create_coalescer.render(),
+    ]
+    return PlainTextResponse("\n".join(lines) + "\n", media_type=PROMETHEUS_CONTENT_TYPE)
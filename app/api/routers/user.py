@@ -1,27 +1,103 @@
-from typing import List
-
-from fastapi import APIRouter, Depends, HTTPException, status  # type: ignore
+from typing import List, Tuple
+
+from fastapi import (  # type: ignore
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
 from pydantic import ValidationError
-from sqlalchemy.orm import Session
+from sqlalchemy import Row
+from sqlalchemy.exc import IntegrityError
 
 from app.api.cruds import user as crud
 from app.api.models.user import User
-from app.api.schemas.user import UserCreate, UserOut, UserUpdate, UserUpdateMe
-from app.database import get_db
+from app.api.schemas.batch import BatchStatus
+from app.api.schemas.user import (
+    Principal,
+    UserBatchResult,
+    UserCreate,
+    UserOut,
+    UserUpdate,
+    UserUpdateMe,
+)
+from app.api.utils.conditional import (
+    get_if_match,
+    is_conditional,
+    is_not_modified,
+    not_modified_response,
+    set_validator_headers,
+)
+from app.api.utils.fields import get_fields_param
+from app.api.utils.pagination import PageParams, get_page_params, set_next_page_headers
+from app.api.utils.security import get_password_hash_async
+from app.api.utils.serialization import render_fields, render_response
+from app.configs import settings
+from app.database import AnySession, get_read_session, get_session, run_db
 from app.dependencies import CurrentUser, get_current_active_superuser
+from app.query_budget import query_budget
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+get_user_fields = get_fields_param(UserOut)
+
+
+def _can_read_user(user: User | Row, current_user: Principal) -> bool:
+    """
+    Checks whether the current user may read the user's information.
+
+    Args:
+        user: The user, or a row carrying its `id` and `is_superuser`, to check.
+        current_user: The current user object.
+
+    Returns:
+        True if the current user has enough privileges, False otherwise.
+    """
+    return bool(user.id == current_user.id or user.is_superuser)
+
+
+async def _write_error(db: AnySession, id: int, expected_versions: List[int] | None) -> HTTPException:
+    """
+    Tells a missing user apart from a modified one after a conditional write matched no row.
+
+    Args:
+        db: The database session.
+        id: The ID of the user that was written.
+        expected_versions: The versions from `If-Match` the write was conditioned on, if any.
+
+    Returns:
+        The HTTPException to raise.
+    """
+    if expected_versions is None or not await run_db(db, crud.get_user_version, id):
+        return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+    return HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="User was modified")
+
 
 @router.get("/", dependencies=[Depends(get_current_active_superuser)], response_model=List[UserOut])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)) -> List[User]:
+@query_budget(2)
+async def read_users(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(get_page_params),
+    fields: Tuple[str, ...] | None = Depends(get_user_fields),
+    db: AnySession = Depends(get_read_session),
+) -> List[User]:
     """
-    Retrieves a list of users from the database.
+    Retrieves a page of users from the database, ordered by ID.
+
+    The cursor of the next page is returned in the `Link` and `X-Next-Cursor` headers. Only the columns
+    of the requested fields are loaded.
 
     Args:
-        skip : The number of users to skip. Defaults to 0.
-        limit: The maximum number of users to retrieve. Defaults to 100.
-        db: The database session. Defaults to the session obtained from the `get_db` dependency.
+        request: The current request.
+        response: The response, used to set the pagination headers.
+        page: The `cursor` and `limit` query parameters.
+        fields: The `fields` query parameter, the fields to return.
+        db: The database session. Defaults to the session obtained from the `get_read_session` dependency.
 
     Returns:
         A list of user objects.
@@ -29,72 +105,143 @@ def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)) -
     Raises:
         HTTPException: If no users are found in the database.
     """
-    users = crud.get_users(db, skip, limit)
+    rows = await run_db(db, crud.get_users, page.after_id, page.limit + 1, fields or crud.LIST_FIELDS)
+    users, next_cursor = page.paginate(rows)
     if not users:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Users not found")
-    return users
+
+    set_next_page_headers(request, response, next_cursor)
+    if fields:
+        return render_fields(users, fields, response)
+    return render_response(List[UserOut], users, response)
 
 
 @router.post("/", dependencies=[Depends(get_current_active_superuser)], response_model=UserOut)
-def create_user(user_data: UserCreate, db: Session = Depends(get_db)) -> User:
+@query_budget(2)
+async def create_user(user_data: UserCreate, db: AnySession = Depends(get_session)) -> User:
     """
     Create a new user.
 
     Args:
         user_data: The data of the user to be created.
-        db: The database session. Defaults to the session obtained from the `get_db` dependency.
+        db: The database session. Defaults to the session obtained from the `get_session` dependency.
 
     Returns:
         User
     """
-    user = crud.get_user_by_email(db, email=user_data.email)
+    hashed_password = await get_password_hash_async(user_data.password)
 
-    if user:
+    user = await run_db(db, crud.create_user, user_data, hashed_password)
+    if not user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
 
-    return crud.create_user(db, user_data)
+    return user
 
 
 @router.patch("/me", response_model=UserOut)
-def update_user_me(current_user: CurrentUser, user_update: UserUpdateMe, db: Session = Depends(get_db)):
+@query_budget(4)
+async def update_user_me(
+    current_user: CurrentUser,
+    user_update: UserUpdateMe,
+    response: Response,
+    expected_versions: List[int] | None = Depends(get_if_match),
+    db: AnySession = Depends(get_session),
+):
     """
     Updates the current user's information in the database.
 
+    With `If-Match`, the update only applies if the user is still at one of the given versions.
+
     Args:
         current_user: The current user object.
         user_update: The updated user data.
-        db: The database session. Defaults to the session obtained from the `get_db` dependency.
+        response: The response, used to set the validator headers of the new version.
+        expected_versions: The versions parsed from the `If-Match` header, if any.
+        db: The database session. Defaults to the session obtained from the `get_session` dependency.
 
     Returns:
         UserOut: The updated user object.
 
     Raises:
-        HTTPException: If the user is not found or if there is an error updating the user.
+        HTTPException: If the user is not found, if it was modified since or if there is an error updating the user.
     """
-    if user_update.email:
-        existing_user = crud.get_user_by_email(db, email=user_update.email)
-        if existing_user and existing_user.id != current_user.id:
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email already registered")
-
     try:
-        user_me = crud.update_me(db, current_user, user_update)
+        user_me = await run_db(db, crud.update_me, current_user, user_update, expected_versions)
+    except IntegrityError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email already registered")
     except ValidationError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=e.errors())
     except Exception:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Update failed")
 
+    if not user_me:
+        raise await _write_error(db, current_user.id, expected_versions)
+
+    set_validator_headers(response, user_me.version, user_me.updated_at)
     return user_me
 
 
+@router.get("/batch", response_model=List[UserBatchResult])
+async def read_users_by_ids(
+    current_user: CurrentUser,
+    ids: List[int] = Query(default=[], max_length=settings.BATCH_MAX_IDS),
+    db: AnySession = Depends(get_read_session),
+):
+    """
+    Retrieves several users at once, resolving every ID with a single query.
+
+    Args:
+        current_user: The current user object.
+        ids: The IDs of the users to retrieve, e.g. `?ids=1&ids=2`.
+        db: The database session. Defaults to the session obtained from the `get_read_session` dependency.
+
+    Returns:
+        One result per distinct requested ID, in request order, marked as ok, not found or forbidden.
+    """
+    if not ids:
+        return []
+
+    users = {user.id: user for user in await run_db(db, crud.get_users_by_ids, ids)}
+
+    results = []
+    for user_id in dict.fromkeys(ids):
+        user = users.get(user_id)
+        if user is None:
+            results.append({"id": user_id, "status": BatchStatus.not_found})
+        elif not _can_read_user(user, current_user):
+            results.append({"id": user_id, "status": BatchStatus.forbidden})
+        else:
+            results.append({"id": user_id, "status": BatchStatus.ok, "user": user})
+
+    return results
+
+
 @router.get("/{id}", response_model=UserOut | None)
-def read_user_by_id(id: int, current_user: CurrentUser, db: Session = Depends(get_db)) -> User:
+@query_budget(2)
+async def read_user_by_id(
+    id: int,
+    request: Request,
+    response: Response,
+    current_user: CurrentUser,
+    fields: Tuple[str, ...] | None = Depends(get_user_fields),
+    db: AnySession = Depends(get_read_session),
+) -> User | Response:
     """
     Retrieves a user from the database by ID.
 
+    The user version is returned in the `ETag` and `Last-Modified` headers. A request carrying
+    `If-None-Match` or `If-Modified-Since` that still matches gets a 304 from a version lookup alone.
+
+    The requested fields are only applied when rendering: users are read through the user cache, which
+    stores full rows for every reader, so a partial load could not be cached.
+
     Args:
         id: The ID of the user to retrieve.
+        request: The current request.
+        response: The response, used to set the validator headers.
         current_user: The current user object.
-        db: The database session. Defaults to the session obtained from the `get_db` dependency.
+        fields: The `fields` query parameter, the fields to return.
+        db: The database session. Defaults to the session obtained from the `get_read_session` dependency.
 
     Returns:
         The user object if found.
@@ -102,65 +249,91 @@ def read_user_by_id(id: int, current_user: CurrentUser, db: Session = Depends(ge
     Raises:
         HTTPException: If the user is not found or doesn't have enough privileges.
     """
+    if is_conditional(request):
+        current = await run_db(db, crud.get_user_version, id)
+        if (
+            current
+            and _can_read_user(current, current_user)
+            and is_not_modified(request, current.version, current.updated_at, fields)
+        ):
+            return not_modified_response(current.version, current.updated_at, fields)
+
     # Retrieve the user from the database
-    user = crud.get_user_by_id(db, id)
+    user = await run_db(db, crud.get_user_by_id, id)
 
     # Check if the user was found
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
     # Check if the current user has enough privileges to access the user's information
-    if user != current_user and not user.is_superuser:
+    if not _can_read_user(user, current_user):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="The user doesn't have enough privileges")
 
     # Return the user object
+    set_validator_headers(response, user.version, user.updated_at, fields)
+    if fields:
+        return render_fields(user, fields, response)
     return user
 
 
 @router.patch("/{id}", dependencies=[Depends(get_current_active_superuser)], response_model=UserOut)
-def update_user(id: int, user_update: UserUpdate, db: Session = Depends(get_db)):
+@query_budget(5)
+async def update_user(
+    id: int,
+    user_update: UserUpdate,
+    response: Response,
+    expected_versions: List[int] | None = Depends(get_if_match),
+    db: AnySession = Depends(get_session),
+):
     """
     Updates a user in the database with the given user ID and user update data.
 
+    With `If-Match`, the update only applies if the user is still at one of the given versions.
+
     Args:
         id: The ID of the user to update.
         user_update: The updated user data.
-        db: The database session. Defaults to the session obtained from the `get_db` dependency.
+        response: The response, used to set the validator headers of the new version.
+        expected_versions: The versions parsed from the `If-Match` header, if any.
+        db: The database session. Defaults to the session obtained from the `get_session` dependency.
 
     Returns:
         UserOut: The updated user object.
 
     Raises:
-        HTTPException: If the user is not found, if the email is already registered, or if there is an error updating the user.
+        HTTPException: If the user is not found, if it was modified since, if the email is already registered, or if there is an error updating the user.
     """
-    user = crud.get_user_by_id(db, id)
-    if not user:
+    # A missing user is rejected before paying for the hash
+    if not await run_db(db, crud.get_user_by_id, id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    if user_update.email:
-        existing_user = crud.get_user_by_email(db, email=user_update.email)
-        if existing_user and existing_user.id != id:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
+    hashed_password = await get_password_hash_async(user_update.password)
 
     try:
-        crud.update_user(db, user, user_update)
+        user = await run_db(db, crud.update_user, id, user_update, hashed_password, expected_versions)
+    except IntegrityError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
     except ValidationError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=e.errors())
     except Exception:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Update failed")
 
-    return crud.get_user_by_id(db, id)
+    if not user:
+        raise await _write_error(db, id, expected_versions)
+
+    set_validator_headers(response, user.version, user.updated_at)
+    return user
 
 
 @router.delete("/{id}", response_model=dict)
-def delete_user(id: int, current_user: CurrentUser, db: Session = Depends(get_db)):
+async def delete_user(id: int, current_user: CurrentUser, db: AnySession = Depends(get_session)):
     """
     Deletes a user by ID.
 
     Args:
         id: The ID of the user to delete.
         current_user: The current user object.
-        db: The database session. Defaults to the session obtained from the `get_db` dependency.
+        db: The database session. Defaults to the session obtained from the `get_session` dependency.
 
     Returns:
         A message indicating the success of the deletion.
@@ -168,14 +341,14 @@ def delete_user(id: int, current_user: CurrentUser, db: Session = Depends(get_db
     Raises:
         HTTPException: If the user is not found or if there are permission issues.
     """
-    user = crud.get_user_by_id(db, id)
+    user = await run_db(db, crud.get_user_by_id, id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    elif user != current_user and not user.is_superuser:
+    elif not _can_read_user(user, current_user):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="The user doesn't have enough privileges")
-    elif user == current_user and user.is_superuser:
+    elif user.id == current_user.id and user.is_superuser:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Superuser cannot delete themselves")
 
-    crud.delete_user(db, user)
+    await run_db(db, crud.delete_user, user)
     return {"message": "User deleted successfully"}
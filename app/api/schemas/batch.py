@@ -0,0 +1,7 @@
+from enum import Enum
+
+
+class BatchStatus(str, Enum):
+    ok = "ok"
+    not_found = "not_found"
+    forbidden = "forbidden"
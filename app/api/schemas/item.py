@@ -1,5 +1,11 @@
+from enum import Enum
+from typing import List
+
 from pydantic import BaseModel, Extra, Field
 
+from app.api.schemas.batch import BatchStatus
+from app.configs import settings
+
 
 class ItemBase(BaseModel):
     title: str = Field(examples=["Foo"])
@@ -28,3 +34,55 @@ class Item(ItemBase):
     class Config:
         from_attributes = True
         extra = Extra.forbid
+
+
+class ItemSearchResult(Item):
+    rank: float = Field(examples=[0.1])
+    snippet: str | None = Field(
+        default=None, examples=["A very <mark>nice</mark> Item"], description="Matches highlighted, Postgres only"
+    )
+
+
+class ItemOwnerStats(BaseModel):
+    owner_id: int = Field(examples=[1])
+    count: int = Field(examples=[42], description="Number of items of the owner")
+
+    class Config:
+        from_attributes = True
+
+
+class ItemBatchResult(BaseModel):
+    id: int = Field(examples=[1])
+    status: BatchStatus = Field(examples=[BatchStatus.ok])
+    item: ItemOut | None = Field(default=None)
+
+
+class ItemBulkCreate(BaseModel):
+    items: List[ItemCreate] = Field(min_length=1, max_length=settings.BULK_MAX_ITEMS)
+
+
+class ItemBulkUpdateEntry(ItemBase):
+    id: int = Field(examples=[1])
+
+
+class ItemBulkUpdate(BaseModel):
+    items: List[ItemBulkUpdateEntry] = Field(min_length=1, max_length=settings.BULK_MAX_ITEMS)
+
+
+class ItemBulkDelete(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=settings.BULK_MAX_ITEMS, examples=[[1, 2]])
+
+
+class ItemBulkResult(BaseModel):
+    items: List[Item] = Field(default=[])
+    missing_ids: List[int] = Field(default=[], description="IDs that were not found or not owned by the user")
+
+
+class ItemBulkDeleteResult(BaseModel):
+    deleted_ids: List[int] = Field(default=[])
+    missing_ids: List[int] = Field(default=[], description="IDs that were not found or not owned by the user")
+
+
+class ItemExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
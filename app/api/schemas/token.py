@@ -1,10 +1,32 @@
+from typing import Literal
+
 from pydantic import BaseModel, Field
 
 
 class Token(BaseModel):
     access_token: str = Field(examples=["ey..."])
     token_type: str = Field(default="bearer")
+    expires_in: int | None = Field(default=None, description="Lifetime of the access token in seconds")
+    refresh_token: str | None = Field(default=None, examples=["ey..."])
 
 
 class TokenPayload(BaseModel):
     sub: int = Field(examples=[1])
+    exp: int | None = Field(default=None)
+    # Tokens minted before revocation support carry neither an ID nor a generation
+    jti: str | None = Field(default=None)
+    gen: int = Field(default=0)
+    type: Literal["access", "refresh"] = Field(default="access")
+    # Claims of access tokens, current as of the `ver` version of the user
+    ver: int | None = Field(default=None)
+    email: str | None = Field(default=None)
+    is_active: bool | None = Field(default=None)
+    is_superuser: bool | None = Field(default=None)
+
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str = Field(examples=["ey..."])
+
+
+class LogoutRequest(BaseModel):
+    refresh_token: str | None = Field(default=None, examples=["ey..."])
@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field
 
+from app.api.schemas.batch import BatchStatus
+
 
 class UserBase(BaseModel):
     username: str | None = Field(examples=["hDn24"], default=None)
@@ -34,3 +36,20 @@ class UserUpdateMe(BaseModel):
 
 class UserOut(UserBase):
     id: int
+
+
+class UserBatchResult(BaseModel):
+    id: int = Field(examples=[1])
+    status: BatchStatus = Field(examples=[BatchStatus.ok])
+    user: UserOut | None = Field(default=None)
+
+
+class Principal(BaseModel):
+    id: int
+    email: str | None
+    is_active: bool
+    is_superuser: bool
+
+    class Config:
+        from_attributes = True
+        frozen = True
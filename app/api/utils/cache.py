@@ -0,0 +1,482 @@
+import asyncio
+import json
+import logging
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Generic, Hashable, TypeVar
+from urllib.parse import unquote, urlsplit
+
+from pydantic_core import to_json
+from sqlalchemy import DateTime
+from sqlalchemy.util.concurrency import await_only, in_greenlet
+
+from app.configs import settings
+
+logger = logging.getLogger(__name__)
+
+V = TypeVar("V")
+M = TypeVar("M")
+
+# How often a reader waiting for another reader's fill polls the backend
+FILL_POLL_SECONDS = 0.005
+
+
+class TTLCache(Generic[V]):
+    """
+    A thread safe, size bounded LRU cache whose entries expire after a fixed time to live.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> V | None:
+        """
+        Returns the cached value for the key, or None if it is missing or expired.
+
+        Args:
+            key: The cache key.
+
+        Returns:
+            The cached value if present and fresh, otherwise None.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: V) -> None:
+        """
+        Stores a value, evicting the least recently used entry when the cache is full.
+
+        Args:
+            key: The cache key.
+            value: The value to cache.
+        """
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """
+        Removes the key from the cache if present.
+
+        Args:
+            key: The cache key.
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Removes every entry and resets the counters.
+        """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Returns the size and hit/miss counters of the cache.
+
+        Returns:
+            A dictionary with the current size, capacity, hits, misses and hit ratio.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Authenticated principals keyed by user id, see `app.dependencies.get_current_user`
+principal_cache: TTLCache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+
+class CacheError(Exception):
+    """
+    Raised by a cache backend that cannot serve a command, e.g. when the server is unreachable.
+    """
+
+
+class MemoryBackend:
+    """
+    A thread safe, size bounded, in-process cache backend with a time to live per entry.
+
+    Only shared by the threads of one worker, so it suits single worker deployments and tests.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_fresh(self, key: str) -> bytes | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def _put(self, key: str, value: bytes, ttl: float) -> None:
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            return self._get_fresh(key)
+
+    def get_many(self, *keys: str) -> list[bytes | None]:
+        with self._lock:
+            return [self._get_fresh(key) for key in keys]
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            self._put(key, value, ttl)
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        with self._lock:
+            if self._get_fresh(key) is not None:
+                return False
+            self._put(key, value, ttl)
+            return True
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisBackend:
+    """
+    A cache backend speaking the Redis protocol (RESP) to Redis or any compatible server.
+
+    Each thread keeps its own connection. The crud functions calling it are synchronous, so commands
+    block their thread (the event loop in async mode) for one round trip, bounded by `timeout`.
+    """
+
+    def __init__(self, url: str, timeout: float) -> None:
+        parsed = urlsplit(url)
+        self.address = (parsed.hostname or "localhost", parsed.port or 6379)
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> tuple[socket.socket, Any]:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            sock = socket.create_connection(self.address, timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = self._local.connection = (sock, sock.makefile("rb"))
+            if self.password:
+                self._command("AUTH", self.password)
+            if self.db:
+                self._command("SELECT", str(self.db))
+
+        return connection
+
+    def _read_reply(self, reader: Any) -> Any:
+        line = reader.readline()
+        if not line:
+            raise CacheError("connection closed by the server")
+
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload
+        if kind == b"-":
+            raise CacheError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            return None if length < 0 else reader.read(length + 2)[:-2]
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [self._read_reply(reader) for _ in range(length)]
+
+        raise CacheError(f"unexpected reply {line!r}")
+
+    def _command(self, *args: str | bytes) -> Any:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg.encode() if isinstance(arg, str) else arg
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+
+        try:
+            sock, reader = self._connection()
+            sock.sendall(b"".join(parts))
+            return self._read_reply(reader)
+        except (OSError, CacheError):
+            # Start over on a fresh connection next time, the stream may be out of sync
+            self.close()
+            raise
+
+    def close(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        self._local.connection = None
+        if connection is not None:
+            connection[1].close()
+            connection[0].close()
+
+    def get(self, key: str) -> bytes | None:
+        return self._command("GET", key)
+
+    def get_many(self, *keys: str) -> list[bytes | None]:
+        return self._command("MGET", *keys)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._command("SET", key, value, "PX", str(max(1, int(ttl * 1000))))
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        return self._command("SET", key, value, "PX", str(max(1, int(ttl * 1000))), "NX") is not None
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self._command("DEL", *keys)
+
+
+CacheBackend = MemoryBackend | RedisBackend
+
+
+def build_backend() -> CacheBackend | None:
+    """
+    Creates the shared cache backend selected by `CACHE_BACKEND`.
+
+    Returns:
+        The backend, or None when caching is disabled.
+    """
+    if settings.CACHE_BACKEND == "memory":
+        return MemoryBackend(maxsize=settings.CACHE_MEMORY_SIZE)
+    if settings.CACHE_BACKEND == "redis":
+        return RedisBackend(settings.CACHE_REDIS_URL, timeout=settings.CACHE_TIMEOUT_SECONDS)
+
+    return None
+
+
+cache_backend = build_backend()
+
+
+def _sleep(seconds: float) -> None:
+    # Crud functions run in the threadpool, or on the event loop through `AsyncSession.run_sync`
+    if in_greenlet():
+        await_only(asyncio.sleep(seconds))
+    else:
+        time.sleep(seconds)
+
+
+class EntityCache(Generic[M]):
+    """
+    Read-through cache of ORM rows by ID, stored as JSON in the shared backend.
+
+    Missing rows are cached too, for `CACHE_NEGATIVE_TTL_SECONDS`. Loads are single-flight: the first
+    reader of a missing entry takes a short lock in the backend and loads it, while concurrent readers
+    wait for its fill instead of all hitting the database at once. Entries are served for a grace period
+    past their TTL: the first reader of a stale entry takes the same lock and reloads it, while concurrent
+    readers, and those that do not fill, keep getting the stale copy.
+
+    Each entry carries the version token its reader saw in the backend before loading the row, and is
+    only served while that token is current. Writes invalidate entries by dropping the token, so a load
+    that read the row before a write cannot store a copy that outlives it, whenever its fill lands.
+
+    Backend failures are logged and treated as misses, the database stays the source of truth.
+    """
+
+    def __init__(self, namespace: str, model: type[M], exclude: tuple[str, ...] = ()) -> None:
+        self.namespace = namespace
+        self.model = model
+        self.columns = [column for column in model.__table__.columns if column.key not in exclude]
+        self.datetime_columns = {column.key for column in self.columns if isinstance(column.type, DateTime)}
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.shared_loads = 0
+
+    def key(self, id: Any) -> str:
+        return f"{settings.CACHE_KEY_PREFIX}{self.namespace}:{id}"
+
+    def _dump(self, obj: M | None, version: str) -> bytes:
+        ttl = settings.CACHE_TTL_SECONDS if obj is not None else settings.CACHE_NEGATIVE_TTL_SECONDS
+        value = None if obj is None else {column.key: getattr(obj, column.key) for column in self.columns}
+        return to_json({"fresh_until": time.time() + ttl, "version": version, "value": value})
+
+    def _entry(self, raw: bytes | None, version: bytes | None) -> dict | None:
+        # Entries stored under another version, or whose version is gone, were loaded before a write
+        if raw is None or version is None:
+            return None
+
+        entry = json.loads(raw)
+        return entry if entry.get("version") == version.decode() else None
+
+    def _version(self, key: str, current: bytes | None) -> str | None:
+        # The version of an entry is created by its first load and dropped by every write, see `invalidate`.
+        # It outlives the entries stored under it, an expired or evicted version only costs a reload.
+        assert cache_backend is not None
+        if current is None:
+            token = uuid.uuid4().hex.encode()
+            ttl = 2 * (settings.CACHE_TTL_SECONDS + settings.CACHE_STALE_GRACE_SECONDS)
+            added = cache_backend.add(f"{key}:version", token, ttl)
+            current = token if added else cache_backend.get(f"{key}:version")
+
+        return None if current is None else current.decode()
+
+    def _load(self, value: dict | None) -> M | None:
+        if value is None:
+            return None
+
+        for key in self.datetime_columns:
+            if value[key] is not None:
+                value[key] = datetime.fromisoformat(value[key])
+
+        return self.model(**value)
+
+    def _wait_for_fill(self, key: str, lock: str) -> dict | None:
+        # Gives up once the loader released the lock without filling, e.g. after a failed load
+        assert cache_backend is not None
+        deadline = time.monotonic() + settings.CACHE_REFRESH_LOCK_SECONDS
+        while time.monotonic() < deadline:
+            _sleep(FILL_POLL_SECONDS)
+            raw, locked, version = cache_backend.get_many(key, lock, f"{key}:version")
+            entry = self._entry(raw, version)
+            if entry is not None:
+                return entry
+            if locked is None:
+                break
+
+        return None
+
+    def get_or_load(self, id: Any, loader: Callable[[], M | None], fill: bool = True) -> M | None:
+        """
+        Returns the cached row for the ID, calling the loader on a miss.
+
+        Args:
+            id: The ID of the row.
+            loader: Loads the row from the database, returning None if it does not exist.
+            fill: Whether to store what the loader returns, e.g. False for reads from a lagging replica.
+
+        Returns:
+            The row, detached from any session when it comes from the cache, or None if it does not exist.
+        """
+        if cache_backend is None:
+            return loader()
+
+        key = self.key(id)
+        lock = f"{key}:refresh"
+        locked = False
+        version = None
+        try:
+            raw, current = cache_backend.get_many(key, f"{key}:version")
+            entry = self._entry(raw, current)
+            if entry is not None:
+                if entry["fresh_until"] > time.time():
+                    self.hits += 1
+                    return self._load(entry["value"])
+
+                # Readers that cannot store a reload, e.g. from a replica, serve the stale copy without the lock
+                locked = fill and cache_backend.add(lock, b"1", settings.CACHE_REFRESH_LOCK_SECONDS)
+                if not locked:
+                    self.hits += 1
+                    self.stale_hits += 1
+                    return self._load(entry["value"])
+            elif fill:
+                locked = cache_backend.add(lock, b"1", settings.CACHE_REFRESH_LOCK_SECONDS)
+                entry = None if locked else self._wait_for_fill(key, lock)
+                if entry is not None:
+                    self.hits += 1
+                    self.shared_loads += 1
+                    return self._load(entry["value"])
+            if fill:
+                version = self._version(key, current)
+        except (OSError, CacheError, ValueError):
+            logger.warning("Cache read of %s failed", key, exc_info=True)
+
+        self.misses += 1
+        try:
+            obj = loader()
+            if version is not None:
+                try:
+                    ttl = settings.CACHE_TTL_SECONDS if obj is not None else settings.CACHE_NEGATIVE_TTL_SECONDS
+                    cache_backend.set(key, self._dump(obj, version), ttl + settings.CACHE_STALE_GRACE_SECONDS)
+                except (OSError, CacheError):
+                    logger.warning("Cache fill of %s failed", key, exc_info=True)
+        finally:
+            if locked:
+                try:
+                    cache_backend.delete(lock)
+                except (OSError, CacheError):
+                    logger.warning("Cache unlock of %s failed", key, exc_info=True)
+
+        return obj
+
+    def invalidate(self, *ids: Any) -> None:
+        """
+        Drops the entries of the IDs and their versions, to be called after every write to the rows.
+
+        Creates count as writes, a missing row may be cached.
+
+        Args:
+            *ids: The IDs of the written rows.
+        """
+        if cache_backend is None or not ids:
+            return
+
+        # A load still in flight may have read the row before the write: its lock goes, and its fill
+        # carries the dropped version
+        keys = [self.key(id) for id in ids]
+        try:
+            cache_backend.delete(*(f"{key}{suffix}" for key in keys for suffix in ("", ":refresh", ":version")))
+        except (OSError, CacheError):
+            logger.error("Cache invalidation of %s %s failed", self.namespace, ids, exc_info=True)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Returns the hit/miss counters of the cache.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "backend": settings.CACHE_BACKEND,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "shared_loads": self.shared_loads,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
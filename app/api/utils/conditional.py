@@ -0,0 +1,103 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Sequence
+
+from fastapi import Header, Request, Response, status  # type: ignore
+
+
+def make_etag(version: int, fields: Sequence[str] | None = None) -> str:
+    """
+    Returns the strong entity tag of a resource version, or of its partial representation with only some fields.
+    """
+    return f'"{version}:{"+".join(fields)}"' if fields else f'"{version}"'
+
+
+def _as_utc(updated_at: datetime) -> datetime:
+    # SQLite hands back naive datetimes, stored in UTC
+    return updated_at.replace(tzinfo=timezone.utc) if updated_at.tzinfo is None else updated_at.astimezone(timezone.utc)
+
+
+def set_validator_headers(
+    response: Response, version: int, updated_at: datetime, fields: Sequence[str] | None = None
+) -> None:
+    """
+    Sets the `ETag` and `Last-Modified` headers of a resource version.
+
+    Args:
+        response: The response to add the headers to.
+        version: The version of the resource.
+        updated_at: The time of the last write of the resource.
+        fields: The fields of a partial representation, None for the full one.
+    """
+    response.headers["ETag"] = make_etag(version, fields)
+    response.headers["Last-Modified"] = format_datetime(_as_utc(updated_at), usegmt=True)
+
+
+def is_conditional(request: Request) -> bool:
+    """
+    Checks whether a read carries `If-None-Match` or `If-Modified-Since`.
+    """
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def is_not_modified(request: Request, version: int, updated_at: datetime, fields: Sequence[str] | None = None) -> bool:
+    """
+    Evaluates `If-None-Match`, or `If-Modified-Since` in its absence, against a resource version.
+
+    Args:
+        request: The current request.
+        version: The current version of the resource.
+        updated_at: The time of the last write of the resource.
+        fields: The fields of the requested partial representation, None for the full one.
+
+    Returns:
+        True if the client's copy is current and a 304 can be returned.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison, as required for If-None-Match
+        etag = make_etag(version, fields)
+        return any(tag.strip().removeprefix("W/") in (etag, "*") for tag in if_none_match.split(","))
+
+    try:
+        if_modified_since = parsedate_to_datetime(request.headers["if-modified-since"])
+    except (TypeError, ValueError):
+        return False
+    if if_modified_since.tzinfo is None:
+        if_modified_since = if_modified_since.replace(tzinfo=timezone.utc)
+
+    # Last-Modified has a one second resolution
+    return _as_utc(updated_at).replace(microsecond=0) <= if_modified_since
+
+
+def not_modified_response(version: int, updated_at: datetime, fields: Sequence[str] | None = None) -> Response:
+    """
+    Returns an empty 304 response carrying the validators of the current version.
+    """
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_validator_headers(response, version, updated_at, fields)
+    return response
+
+
+def get_if_match(if_match: str | None = Header(default=None)) -> list[int] | None:
+    """
+    Parses `If-Match` into the resource versions a write may apply to.
+
+    Only strong tags are compared, as required for If-Match, so weak or foreign tags match no version.
+
+    Args:
+        if_match: The `If-Match` request header.
+
+    Returns:
+        The acceptable versions, or None when the header is absent or `*`.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+
+    versions = []
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        if tag.startswith('"') and tag.endswith('"') and tag[1:-1].isdigit():
+            versions.append(int(tag[1:-1]))
+
+    return versions
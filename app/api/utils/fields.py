@@ -0,0 +1,38 @@
+from typing import Callable, Tuple, Type
+
+from fastapi import HTTPException, Query, status  # type: ignore
+from pydantic import BaseModel
+
+
+def get_fields_param(model: Type[BaseModel]) -> Callable[..., Tuple[str, ...] | None]:
+    """
+    Builds the dependency parsing the `fields` query parameter of the endpoints returning a model.
+
+    Args:
+        model: The response model whose fields may be requested.
+
+    Returns:
+        The dependency, returning the requested fields in model order, or None when all are.
+    """
+    allowed = tuple(model.model_fields)
+
+    def get_fields(
+        fields: str | None = Query(
+            default=None,
+            description=f"Comma separated fields to return, among {', '.join(allowed)}. Defaults to all of them.",
+        ),
+    ) -> Tuple[str, ...] | None:
+        if fields is None:
+            return None
+
+        requested = {name.strip() for name in fields.split(",")} - {""}
+        unknown = requested.difference(allowed)
+        if unknown or not requested:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}" if unknown else "No fields requested",
+            )
+
+        return tuple(name for name in allowed if name in requested)
+
+    return get_fields
@@ -0,0 +1,127 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple, TypeVar
+
+from fastapi import HTTPException, Query, Request, Response, status  # type: ignore
+
+from app.configs import settings
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class PageParams:
+    """
+    Keyset pagination parameters: rows with an id greater than `after_id`, at most `limit` of them.
+    """
+
+    after_id: int | None
+    limit: int
+
+    def paginate(self, rows: Sequence[T], key: str = "id") -> Tuple[List[T], str | None]:
+        """
+        Trims rows fetched with `limit + 1` to the page size and computes the cursor of the next page.
+
+        Args:
+            rows: The rows fetched for this page, ordered by `key`, with at most one extra row.
+            key: The attribute of the rows the listing is ordered by.
+
+        Returns:
+            The rows of the page and the cursor of the next page, or None on the last page.
+        """
+        page = list(rows[: self.limit])
+        if len(rows) > self.limit:
+            return page, encode_cursor(getattr(page[-1], key))
+
+        return page, None
+
+
+def encode_cursor(last_id: int) -> str:
+    """
+    Encodes the id of the last row of a page into an opaque cursor.
+
+    Args:
+        last_id: The id of the last row returned.
+
+    Returns:
+        The URL safe cursor string.
+    """
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Decodes a cursor created by `encode_cursor`.
+
+    Args:
+        cursor: The cursor string.
+
+    Returns:
+        The id of the last row of the previous page.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return int(data["id"])
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def get_page_params(
+    cursor: str | None = None,
+    limit: int = Query(default=settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+) -> PageParams:
+    """
+    Parses the `cursor` and `limit` query parameters of a listing endpoint.
+
+    Args:
+        cursor: The opaque cursor returned by the previous page, if any.
+        limit: The maximum number of rows to return, capped by `MAX_PAGE_SIZE`.
+
+    Returns:
+        The pagination parameters.
+
+    Raises:
+        HTTPException: If the cursor is malformed.
+    """
+    try:
+        after_id = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    return PageParams(after_id=after_id, limit=limit)
+
+
+def set_next_page_headers(request: Request, response: Response, next_cursor: str | None) -> None:
+    """
+    Advertises the next page through the `Link` and `X-Next-Cursor` headers.
+
+    Args:
+        request: The current request.
+        response: The response to add the headers to.
+        next_cursor: The cursor of the next page, or None on the last page.
+    """
+    if next_cursor is None:
+        return
+
+    next_url = request.url.include_query_params(cursor=next_cursor)
+    response.headers["Link"] = f'<{next_url}>; rel="next"'
+    response.headers["X-Next-Cursor"] = next_cursor
+
+
+def set_total_count_headers(response: Response, count: int, estimated: bool) -> None:
+    """
+    Advertises the number of rows of the whole listing through the `X-Total-Count` header.
+
+    Args:
+        response: The response to add the headers to.
+        count: The number of rows.
+        estimated: Whether the count is an estimate, flagged by `X-Total-Count-Estimated`.
+    """
+    response.headers["X-Total-Count"] = str(count)
+    if estimated:
+        response.headers["X-Total-Count-Estimated"] = "true"
@@ -0,0 +1,122 @@
+import time
+from typing import Iterable, Tuple
+
+from app.api.schemas.token import TokenPayload
+
+# The `id`, `user_id`, `jti`, `generation`, `version` and `expires_at` of a `TokenRevocation` row
+RevocationRow = Tuple[int, int, str | None, int | None, int | None, int]
+
+
+class RevocationList:
+    """
+    The token revocations known to this worker, checked on every authenticated request without I/O.
+
+    Holds the first valid generation of the users whose tokens were all revoked, and the IDs of the
+    tokens revoked one by one, each until the revoked tokens expire. Both stay small: only revocations
+    within the lifetime of a refresh token are kept, and access tokens are short-lived.
+
+    Also holds the first user version whose claims are current for the users whose claims changed,
+    e.g. their email: access tokens minted before still authenticate, but their claims are stale.
+
+    Revocations made by this worker apply at once, those of other workers once `app.revocation`
+    syncs them from the database. Entries are replaced, never mutated, so lookups need no lock.
+    """
+
+    def __init__(self) -> None:
+        self._generations: dict[int, Tuple[int, int]] = {}
+        self._tokens: dict[str, int] = {}
+        self._versions: dict[int, Tuple[int, int]] = {}
+        self.fingerprint: Tuple[int, int] | None = None
+
+    def __len__(self) -> int:
+        return len(self._generations) + len(self._tokens) + len(self._versions)
+
+    def revoke_generation(self, user_id: int, generation: int, expires_at: int) -> None:
+        """
+        Revokes the tokens of a user below a generation.
+
+        Args:
+            user_id: The ID of the user.
+            generation: The first generation still valid.
+            expires_at: The Unix time after which every revoked token has expired.
+        """
+        current = self._generations.get(user_id)
+        if current is None or current[0] < generation:
+            self._generations[user_id] = (generation, expires_at)
+
+    def revoke_token(self, jti: str, expires_at: int) -> None:
+        """
+        Revokes a single token.
+
+        Args:
+            jti: The ID of the token.
+            expires_at: The Unix time the token expires at.
+        """
+        self._tokens[jti] = expires_at
+
+    def mark_stale(self, user_id: int, version: int, expires_at: int) -> None:
+        """
+        Marks the claims of the tokens of a user below a version as stale.
+
+        Args:
+            user_id: The ID of the user.
+            version: The first user version whose claims are current.
+            expires_at: The Unix time after which every access token with stale claims has expired.
+        """
+        current = self._versions.get(user_id)
+        if current is None or current[0] < version:
+            self._versions[user_id] = (version, expires_at)
+
+    def is_stale(self, user_id: int, version: int) -> bool:
+        current = self._versions.get(user_id)
+        return current is not None and version < current[0]
+
+    def is_token_revoked(self, jti: str | None) -> bool:
+        return jti is not None and jti in self._tokens
+
+    def is_generation_revoked(self, user_id: int, generation: int) -> bool:
+        current = self._generations.get(user_id)
+        return current is not None and generation < current[0]
+
+    def is_revoked(self, payload: TokenPayload) -> bool:
+        """
+        Tells whether a verified token was revoked.
+
+        Args:
+            payload: The payload of the token.
+
+        Returns:
+            True if the token was revoked on its own or along with all the tokens of its user.
+        """
+        return self.is_generation_revoked(payload.sub, payload.gen) or self.is_token_revoked(payload.jti)
+
+    def replace(self, rows: Iterable[RevocationRow], fingerprint: Tuple[int, int] | None = None) -> None:
+        """
+        Replaces the known revocations with the rows of the `token_revocations` table, dropping expired ones.
+
+        Args:
+            rows: The revocation rows.
+            fingerprint: The row count and maximum ID of the table the rows were read with.
+        """
+        now = int(time.time())
+        generations: dict[int, Tuple[int, int]] = {}
+        tokens: dict[str, int] = {}
+        versions: dict[int, Tuple[int, int]] = {}
+        for _, user_id, jti, generation, version, expires_at in rows:
+            if expires_at <= now:
+                continue
+            if jti is not None:
+                tokens[jti] = expires_at
+            elif generation is not None and generation > generations.get(user_id, (0, 0))[0]:
+                generations[user_id] = (generation, expires_at)
+            elif version is not None and version > versions.get(user_id, (0, 0))[0]:
+                versions[user_id] = (version, expires_at)
+
+        self._generations, self._tokens, self._versions = generations, tokens, versions
+        self.fingerprint = fingerprint
+
+    def clear(self) -> None:
+        self.replace(())
+
+
+revocations = RevocationList()
@@ -1,34 +1,128 @@
+import asyncio
+import multiprocessing
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any
+from typing import Any, Callable, TypeVar
 
-from jose import jwt  # type: ignore
+from fastapi import HTTPException, status  # type: ignore
+from jose import JWTError, jwt  # type: ignore
 from passlib.context import CryptContext  # type: ignore
+from pydantic import ValidationError
 
+from app.api.schemas.token import Token, TokenPayload
 from app.configs import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Pinning min/max to the configured cost makes `needs_update` flag hashes made with any other cost
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
 
 
 ALGORITHM = "HS256"
 
+T = TypeVar("T")
 
-def create_access_token(subject: str | Any, expires_delta: timedelta) -> str:
+_hash_pool: ProcessPoolExecutor | None = None
+_hash_pending = 0
+
+
+def create_access_token(
+    subject: str | Any,
+    expires_delta: timedelta,
+    generation: int = 0,
+    token_type: str = "access",
+    claims: dict[str, Any] | None = None,
+) -> str:
     """
     Creates a JSON Web Token (JWT) with the given subject and expiration time.
 
+    Every token gets a unique `jti` so it can be revoked on its own, and carries the token generation
+    of its user so all of them can be revoked at once.
+
     Args:
         subject: The subject of the JWT.
         expires_delta: The time delta after which the JWT will expire.
+        generation: The token generation of the user.
+        token_type: `access` or `refresh`.
+        claims: Additional claims of the JWT.
 
     Returns:
         The encoded JWT.
     """
     expire = datetime.utcnow() + expires_delta
-    to_encode = {"exp": expire, "sub": str(subject)}
+    to_encode = {
+        "exp": expire,
+        "sub": str(subject),
+        "jti": uuid.uuid4().hex,
+        "gen": generation,
+        "type": token_type,
+        **(claims or {}),
+    }
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+def create_token_pair(user: Any) -> Token:
+    """
+    Creates a short-lived access token and a long-lived refresh token for a user.
+
+    The access token carries the email and role of the user as of their current version, enough to
+    authenticate requests without loading the user.
+
+    Args:
+        user: The user object.
+
+    Returns:
+        The tokens.
+    """
+    claims = {
+        "ver": user.version,
+        "email": user.email,
+        "is_active": user.is_active,
+        "is_superuser": user.is_superuser,
+    }
+    access_token_expiration = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    return Token(
+        access_token=create_access_token(user.id, access_token_expiration, user.token_generation, claims=claims),
+        expires_in=int(access_token_expiration.total_seconds()),
+        refresh_token=create_access_token(
+            user.id, timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES), user.token_generation, "refresh"
+        ),
+    )
+
+
+def decode_token(token: str, token_type: str = "access") -> TokenPayload:
+    """
+    Verifies a JWT and decodes its payload.
+
+    Args:
+        token: The encoded JWT.
+        token_type: The type the token must have.
+
+    Returns:
+        The payload of the token.
+
+    Raises:
+        HTTPException: If the token is invalid, expired or of another type.
+    """
+    try:
+        payload = TokenPayload(**jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM]))
+    except (JWTError, ValidationError):
+        payload = None
+
+    if payload is None or payload.type != token_type:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Could not validate credentials",
+        )
+    return payload
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verify if the given plain password matches the hashed password.
@@ -54,3 +148,103 @@ def get_password_hash(password: str) -> str:
         The hashed password.
     """
     return pwd_context.hash(password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Verify the given plain password and rehash it if the stored hash uses an outdated cost.
+
+    Args:
+        plain_password: The plain password to be verified.
+        hashed_password: The hashed password to compare against.
+
+    Returns:
+        A tuple of whether the password matches and the new hash, or None if no rehash is needed.
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def get_hash_pool() -> ProcessPoolExecutor:
+    """
+    Returns the process pool used for bcrypt, creating it on first use.
+
+    Returns:
+        The password hashing process pool.
+    """
+    global _hash_pool
+
+    if _hash_pool is None:
+        _hash_pool = ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    return _hash_pool
+
+
+def shutdown_hash_pool() -> None:
+    """
+    Shuts down the password hashing process pool if it was started.
+    """
+    global _hash_pool
+
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False, cancel_futures=True)
+        _hash_pool = None
+
+
+async def _run_in_hash_pool(fn: Callable[..., T], *args: Any) -> T:
+    """
+    Runs a bcrypt function in the hashing process pool, rejecting the call when the pool is saturated.
+
+    Args:
+        fn: The module level function to run.
+        *args: Positional arguments passed to `fn`.
+
+    Returns:
+        The value returned by `fn`.
+
+    Raises:
+        HTTPException: If the number of pending hashes exceeds the pool size plus `PASSWORD_HASH_MAX_QUEUE`.
+    """
+    global _hash_pending
+
+    if _hash_pending >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_MAX_QUEUE:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many password operations in progress",
+            headers={"Retry-After": "1"},
+        )
+
+    _hash_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_hash_pool(), fn, *args)
+    finally:
+        _hash_pending -= 1
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Runs `verify_and_update_password` in the hashing process pool.
+
+    Args:
+        plain_password: The plain password to be verified.
+        hashed_password: The hashed password to compare against.
+
+    Returns:
+        A tuple of whether the password matches and the new hash, or None if no rehash is needed.
+    """
+    return await _run_in_hash_pool(verify_and_update_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    Runs `get_password_hash` in the hashing process pool.
+
+    Args:
+        password: The password to be hashed.
+
+    Returns:
+        The hashed password.
+    """
+    return await _run_in_hash_pool(get_password_hash, password)
@@ -0,0 +1,98 @@
+from functools import lru_cache
+from typing import Any, Sequence
+
+from fastapi import Response  # type: ignore
+from fastapi.responses import JSONResponse  # type: ignore
+from pydantic import TypeAdapter
+from pydantic_core import to_json
+
+from app.configs import settings
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    A JSON response encoded by pydantic-core straight to bytes instead of the stdlib json encoder.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
+
+
+@lru_cache(maxsize=None)
+def get_type_adapter(tp: Any) -> TypeAdapter:
+    """
+    Returns the compiled validator and serializer of a type, built once per type.
+
+    Args:
+        tp: The type to adapt, e.g. `List[ItemOut]`.
+
+    Returns:
+        The cached type adapter.
+    """
+    return TypeAdapter(tp)
+
+
+def dump_json(tp: Any, content: Any) -> bytes:
+    """
+    Validates ORM objects, row mappings or plain data against a type and dumps them to JSON bytes.
+
+    Args:
+        tp: The response type, e.g. `List[ItemOut]`.
+        content: The data to serialize.
+
+    Returns:
+        The JSON encoded content.
+    """
+    adapter = get_type_adapter(tp)
+    return adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+
+
+def render_response(tp: Any, content: Any, response: Response | None = None, status_code: int = 200) -> Any:
+    """
+    Serializes route content through the fast path when `FAST_SERIALIZATION` is enabled.
+
+    Returning a `Response` makes FastAPI skip its `response_model` validation and encoding, so the
+    headers set on the injected response are carried over. With the setting disabled, the content
+    is returned unchanged for FastAPI to serialize as usual.
+
+    Args:
+        tp: The response type, the route's `response_model`.
+        content: The data to serialize.
+        response: The response injected into the route, whose headers to keep.
+        status_code: The status code of the response.
+
+    Returns:
+        A response holding the encoded content, or the content itself.
+    """
+    if not settings.FAST_SERIALIZATION:
+        return content
+
+    fast_response = Response(content=dump_json(tp, content), status_code=status_code, media_type="application/json")
+    if response is not None:
+        fast_response.raw_headers.extend(header for header in response.raw_headers if header[0] != b"content-length")
+
+    return fast_response
+
+
+def render_fields(content: Any, fields: Sequence[str], response: Response | None = None) -> Response:
+    """
+    Serializes only the requested fields of ORM objects or rows, the sparse fieldsets of `fields=`.
+
+    Args:
+        content: An object or a list of objects carrying the fields as attributes.
+        fields: The fields to serialize, JSON native values of the response model.
+        response: The response injected into the route, whose headers to keep.
+
+    Returns:
+        A response holding the encoded fields.
+    """
+    if isinstance(content, list):
+        data: Any = [{name: getattr(obj, name) for name in fields} for obj in content]
+    else:
+        data = {name: getattr(content, name) for name in fields}
+
+    sparse_response = (FastJSONResponse if settings.FAST_SERIALIZATION else JSONResponse)(data)
+    if response is not None:
+        sparse_response.raw_headers.extend(header for header in response.raw_headers if header[0] != b"content-length")
+
+    return sparse_response
@@ -0,0 +1,340 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../"))
+
+SUPERUSER = "admin@benchmark.local"
+PASSWORD = "benchmark-password"
+SEED_CHUNK_SIZE = 5000
+# Seeded descriptions are drawn from these words, so search queries match a realistic share of items
+WORDS = (
+    "red green blue black white small large light heavy steel wooden glass cotton leather kettle lamp chair "
+    "table shelf mug bottle jacket boots backpack notebook pencil camera speaker cable charger"
+).split()
+
+
+@dataclass
+class BenchState:
+    """
+    The seeded fixtures shared by the scenarios: one token and item list per user.
+    """
+
+    user_ids: list[int]
+    emails: list[str]
+    headers: list[dict] = field(default_factory=list)
+    superuser_headers: dict = field(default_factory=dict)
+    item_ids: list[list[int]] = field(default_factory=list)
+
+
+Scenario = Callable[[Any, BenchState, int], Awaitable[Any]]
+
+
+async def login(client: Any, state: BenchState, i: int) -> Any:
+    email = state.emails[i % len(state.emails)]
+    return await client.post("/api/v1/login/access-token", data={"username": email, "password": PASSWORD})
+
+
+async def list_items(client: Any, state: BenchState, i: int) -> Any:
+    return await client.get("/api/v1/items/", params={"limit": 100}, headers=state.headers[i % len(state.headers)])
+
+
+async def read_item(client: Any, state: BenchState, i: int) -> Any:
+    user = i % len(state.headers)
+    item_ids = state.item_ids[user]
+    return await client.get(f"/api/v1/items/{item_ids[i % len(item_ids)]}", headers=state.headers[user])
+
+
+async def create_item(client: Any, state: BenchState, i: int) -> Any:
+    return await client.post(
+        "/api/v1/items/",
+        json={"title": f"item {i}", "description": "created"},
+        headers=state.headers[i % len(state.headers)],
+    )
+
+
+async def update_item(client: Any, state: BenchState, i: int) -> Any:
+    user = i % len(state.headers)
+    item_ids = state.item_ids[user]
+    return await client.put(
+        f"/api/v1/items/{item_ids[i % len(item_ids)]}",
+        json={"title": f"updated {i}", "description": "updated"},
+        headers=state.headers[user],
+    )
+
+
+async def delete_item(client: Any, state: BenchState, i: int) -> Any:
+    user = i % len(state.headers)
+    # Deletes consume the seeded items from the end of each user's list
+    return await client.delete(f"/api/v1/items/{state.item_ids[user].pop()}", headers=state.headers[user])
+
+
+async def search_items(client: Any, state: BenchState, i: int) -> Any:
+    query = f"{WORDS[i % len(WORDS)]} {WORDS[(i * 7 + 3) % len(WORDS)]}"
+    return await client.get(
+        "/api/v1/items/search", params={"q": query, "limit": 20}, headers=state.headers[i % len(state.headers)]
+    )
+
+
+async def list_users(client: Any, state: BenchState, i: int) -> Any:
+    return await client.get("/api/v1/users/", params={"limit": 100}, headers=state.superuser_headers)
+
+
+async def read_user(client: Any, state: BenchState, i: int) -> Any:
+    user = i % len(state.headers)
+    return await client.get(f"/api/v1/users/{state.user_ids[user]}", headers=state.headers[user])
+
+
+# Run in this order: deletes shrink the seeded item lists the read and update scenarios cycle through
+SCENARIOS: dict[str, tuple[Scenario, int]] = {
+    "login": (login, 200),
+    "list_items": (list_items, 200),
+    "read_item": (read_item, 200),
+    "search_items": (search_items, 200),
+    "create_item": (create_item, 201),
+    "update_item": (update_item, 200),
+    "delete_item": (delete_item, 200),
+    "list_users": (list_users, 200),
+    "read_user": (read_user, 200),
+}
+
+
+def seed(users: int, items: int) -> BenchState:
+    """
+    Recreates the schema and seeds users and their items with bulk inserts.
+
+    Args:
+        users: The number of regular users to create, plus one superuser.
+        items: The number of items to create, spread evenly across the regular users.
+
+    Returns:
+        The seeded user IDs and emails, and item IDs per user.
+    """
+    from sqlalchemy import bindparam, func, insert, select
+
+    from app.api.cruds.item import search_document, search_vector
+    from app.api.models.user import Item, ItemCount, User
+    from app.api.utils.security import get_password_hash
+    from app.database import SessionLocal, engine
+    from app.init_data import reset_database
+    from app.migrations import migrate
+
+    reset_database()
+    migrate(engine)
+
+    hashed_password = get_password_hash(PASSWORD)
+    emails = [f"user{n}@benchmark.local" for n in range(users)]
+    with SessionLocal() as session:
+        session.execute(
+            insert(User),
+            [
+                {
+                    "email": email,
+                    "hash_password": hashed_password,
+                    "is_active": True,
+                    "is_superuser": email == SUPERUSER,
+                }
+                for email in [SUPERUSER, *emails]
+            ],
+        )
+        user_ids = list(session.scalars(select(User.id).where(User.is_superuser.is_(False)).order_by(User.id)))
+
+        rows = (
+            {
+                "title": f"item {n}",
+                "description": " ".join(WORDS[(n * k * 31 + k) % len(WORDS)] for k in range(1, 6)),
+                "owner_id": user_ids[n % users],
+            }
+            for n in range(items)
+        )
+        stmt = insert(Item).values(search_vector=search_vector(engine.dialect.name, bindparam("search_document")))
+        while chunk := list(itertools.islice(rows, SEED_CHUNK_SIZE)):
+            for row in chunk:
+                row["search_document"] = search_document(row["title"], row["description"])
+            session.execute(stmt, chunk)
+        session.execute(
+            insert(ItemCount).from_select(
+                ["owner_id", "count"], select(Item.owner_id, func.count()).group_by(Item.owner_id)
+            )
+        )
+        session.commit()
+
+        state = BenchState(user_ids=user_ids, emails=emails)
+        owner_index = {user_id: n for n, user_id in enumerate(user_ids)}
+        state.item_ids = [[] for _ in user_ids]
+        for item_id, owner_id in session.execute(select(Item.id, Item.owner_id).order_by(Item.id)):
+            state.item_ids[owner_index[owner_id]].append(item_id)
+
+    return state
+
+
+async def run_scenario(
+    client: Any, state: BenchState, scenario: Scenario, expected_status: int, requests: int, concurrency: int
+) -> dict[str, Any]:
+    """
+    Drives one scenario with concurrent workers sharing a request counter.
+
+    Args:
+        client: The HTTP client bound to the application.
+        state: The seeded fixtures.
+        scenario: The scenario to run.
+        expected_status: The status code of a successful request, anything else counts as an error.
+        requests: The total number of requests to issue.
+        concurrency: The number of concurrent workers.
+
+    Returns:
+        The request count, error count, throughput and latency percentiles of the run.
+    """
+    counter = itertools.count()
+    latencies: list[float] = []
+    errors = 0
+
+    async def worker() -> None:
+        nonlocal errors
+        while (i := next(counter)) < requests:
+            start = time.perf_counter()
+            response = await scenario(client, state, i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != expected_status:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(quantiles[49] * 1000, 2),
+        "p95_ms": round(quantiles[94] * 1000, 2),
+        "p99_ms": round(quantiles[98] * 1000, 2),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    """
+    Seeds the database, boots the application in process and runs the selected scenarios.
+
+    Args:
+        args: The parsed command line arguments.
+
+    Returns:
+        The run metadata and the results of each scenario.
+    """
+    import httpx
+
+    from app.database import engine
+    from app.main import app
+
+    state = seed(args.users, args.items)
+    results: dict[str, Any] = {}
+    transport = httpx.ASGITransport(app=app)  # type: ignore[arg-type]
+    async with app.router.lifespan_context(app), httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        for n in range(len(state.emails)):
+            response = await login(client, state, n)
+            state.headers.append({"Authorization": f"Bearer {response.json()['access_token']}"})
+        response = await client.post("/api/v1/login/access-token", data={"username": SUPERUSER, "password": PASSWORD})
+        state.superuser_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        for name in args.scenarios:
+            scenario, expected_status = SCENARIOS[name]
+            requests = args.login_requests if name == "login" else args.requests
+            await run_scenario(client, state, scenario, expected_status, args.warmup, args.concurrency)
+            results[name] = await run_scenario(client, state, scenario, expected_status, requests, args.concurrency)
+            print(f"{name:<12} " + " ".join(f"{key}={value}" for key, value in results[name].items()))
+
+    return {
+        "meta": {
+            "database": engine.dialect.name,
+            "db_async": os.environ.get("DB_ASYNC", "false"),
+            "item_create_coalescing": os.environ.get("ITEM_CREATE_COALESCING", "false"),
+            "users": args.users,
+            "items": args.items,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "python": platform.python_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "scenarios": results,
+    }
+
+
+def compare(result: dict[str, Any], baseline: dict[str, Any], threshold: float) -> list[str]:
+    """
+    Compares a run against a baseline run.
+
+    Args:
+        result: The results of this run.
+        baseline: The results of the baseline run.
+        threshold: The tolerated relative drop in throughput or rise in p95 latency, e.g. 0.1 for 10%.
+
+    Returns:
+        A description of each regression beyond the threshold.
+    """
+    regressions = []
+    for name, base in baseline["scenarios"].items():
+        current = result["scenarios"].get(name)
+        if current is None:
+            continue
+        if current["rps"] < base["rps"] * (1 - threshold):
+            regressions.append(f"{name}: {current['rps']} req/s is below the baseline {base['rps']} req/s")
+        if current["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {current['p95_ms']}ms is above the baseline {base['p95_ms']}ms")
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the API hot paths in process. Drops and recreates all tables of the target database."
+    )
+    parser.add_argument("--database-url", help="Database to benchmark against. Defaults to a temporary SQLite file.")
+    parser.add_argument("--users", type=int, default=10, help="Number of seeded users.")
+    parser.add_argument("--items", type=int, default=10_000, help="Number of seeded items.")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per scenario.")
+    parser.add_argument("--login-requests", type=int, default=100, help="Requests of the bcrypt bound login scenario.")
+    parser.add_argument("--warmup", type=int, default=20, help="Unrecorded requests before each scenario.")
+    parser.add_argument("--concurrency", type=int, default=20, help="Number of concurrent clients.")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--save", help="Write the results to this JSON file, e.g. to record a baseline.")
+    parser.add_argument("--baseline", help="Compare against the results in this JSON file.")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Tolerated relative regression.")
+    args = parser.parse_args()
+    # Deletes pop the items of user `i % users`, and the warm-up and measured runs both start at i = 0
+    if "delete_item" in args.scenarios and args.items < args.requests + args.warmup + 2 * args.users:
+        parser.error("the delete_item scenario needs --items of at least --requests + --warmup + 2 * --users")
+
+    # Settings are read when the application is imported, so the database has to be chosen first
+    os.environ["DATABASE_URL"] = (
+        args.database_url
+        or os.environ.get("DATABASE_URL")
+        or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    )
+
+    # Every scenario logs in from the same client address
+    os.environ.setdefault("LOGIN_RATE_PER_MINUTE", "0")
+
+    result = asyncio.run(run(args))
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(result, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(result, json.load(file), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
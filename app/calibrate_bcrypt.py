@@ -0,0 +1,67 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../"))
+
+
+from app.api.utils.security import pwd_context
+
+
+def measure_rounds(rounds: int, samples: int) -> float:
+    """
+    Measures the median time in milliseconds of one bcrypt hash at the given cost.
+
+    Args:
+        rounds: The bcrypt cost factor.
+        samples: The number of hashes to time.
+
+    Returns:
+        The median hashing time in milliseconds.
+    """
+    context = pwd_context.copy(bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds)
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        context.hash("calibration-password")
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return statistics.median(timings)
+
+
+def calibrate(target_ms: float, samples: int, min_rounds: int = 4, max_rounds: int = 16) -> int:
+    """
+    Picks the highest bcrypt cost whose median hashing time stays within the target latency.
+
+    Args:
+        target_ms: The target hashing latency in milliseconds.
+        samples: The number of hashes to time per cost.
+        min_rounds: The lowest cost to consider.
+        max_rounds: The highest cost to consider.
+
+    Returns:
+        The calibrated bcrypt cost.
+    """
+    # The first hash pays for loading the bcrypt backend, keep it out of the measurements
+    measure_rounds(min_rounds, 1)
+
+    chosen = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        elapsed = measure_rounds(rounds, samples)
+        print(f"rounds={rounds:<2} median={elapsed:.1f}ms")
+        if elapsed > target_ms:
+            break
+        chosen = rounds
+
+    return chosen
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pick BCRYPT_ROUNDS for a target hashing latency on this machine.")
+    parser.add_argument("--target-ms", type=float, default=250.0, help="Target latency of one hash in milliseconds.")
+    parser.add_argument("--samples", type=int, default=3, help="Number of hashes timed per cost.")
+    args = parser.parse_args()
+
+    print(f"BCRYPT_ROUNDS={calibrate(args.target_ms, args.samples)}")
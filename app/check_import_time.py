@@ -0,0 +1,70 @@
+import argparse
+import os
+import subprocess
+import sys
+from typing import List, Tuple
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def measure_import(module: str) -> List[Tuple[str, int, int]]:
+    """
+    Imports a module in a fresh interpreter with `-X importtime`.
+
+    Args:
+        module: The module to import, e.g. `app.main`.
+
+    Returns:
+        The name, self time and cumulative time in microseconds of every module imported.
+
+    Raises:
+        RuntimeError: If the import fails.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-W", "ignore", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr}")
+
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        timings.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    return timings
+
+
+def check(module: str, budget_ms: float, top: int) -> bool:
+    """
+    Prints the import time of a module and its slowest dependencies, and checks it against a budget.
+
+    Args:
+        module: The module to import.
+        budget_ms: The maximum import time in milliseconds.
+        top: The number of slowest modules, by self time, to print.
+
+    Returns:
+        True if the import is within budget.
+    """
+    timings = measure_import(module)
+    total_ms = next(cumulative for name, _, cumulative in timings if name == module) / 1000
+    print(f"import {module}: {total_ms:.0f}ms (budget {budget_ms:.0f}ms)")
+    for name, self_us, _ in sorted(timings, key=lambda timing: timing[1], reverse=True)[:top]:
+        print(f"  {self_us / 1000:8.1f}ms  {name}")
+
+    return total_ms <= budget_ms
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the cold import time of the application against a budget.")
+    parser.add_argument("--module", default="app.main", help="The module to import.")
+    parser.add_argument("--budget-ms", type=float, default=2000, help="The maximum import time.")
+    parser.add_argument("--top", type=int, default=15, help="The number of slowest modules to show.")
+    args = parser.parse_args()
+
+    sys.exit(0 if check(args.module, args.budget_ms, args.top) else 1)
@@ -0,0 +1,162 @@
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Callable, Generic, Iterator, List, Tuple, TypeVar
+
+from fastapi.concurrency import run_in_threadpool  # type: ignore
+from sqlalchemy.orm import Session
+
+from app.api.cruds.item import create_owned_items
+from app.api.models.user import Item
+from app.api.schemas.item import ItemCreate
+from app.configs import settings
+from app.database import AsyncSessionLocal, SessionLocal
+from app.metrics import LATENCY_BUCKETS, Histogram
+from app.query_budget import QueryLog, capture_queries, current_query_log
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the batch size histogram
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+E = TypeVar("E")
+R = TypeVar("R")
+
+# A write waiting for its batch: the entry, its result, when it was submitted and the query log of its request
+Pending = Tuple[E, asyncio.Future, float, QueryLog | None]
+
+
+class WriteCoalescer(Generic[E, R]):
+    """
+    Gathers concurrent writes into batches, each written with one statement and one commit.
+
+    The first write of a batch waits at most `window` seconds for others to join, and a batch is
+    written as soon as it holds `max_batch` writes. A batch failing as a whole is retried one write at
+    a time, so a bad write only fails its own request. The statements of a batch are charged to the
+    query log of every request in it. Used from the event loop thread only, which needs no locking.
+    """
+
+    def __init__(self, name: str, write: Callable[[Session, List[E]], List[R]], window: float, max_batch: int) -> None:
+        self.name = name
+        self.write = write
+        self.window = window
+        self.max_batch = max_batch
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.wait = Histogram(LATENCY_BUCKETS)
+        self.failed_batches = 0
+        self._pending: List[Pending[E]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, entry: E) -> R:
+        """
+        Adds a write to the current batch and waits for the batch to be written.
+
+        Args:
+            entry: The write, as `write` takes it.
+
+        Returns:
+            The result of the write.
+
+        Raises:
+            Exception: Whatever writing the entry on its own raised.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((entry, future, time.perf_counter(), current_query_log()))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        # In an empty context, the statements of the batch are charged to its requests by `_run` instead
+        task = contextvars.Context().run(asyncio.get_running_loop().create_task, self._write_batch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _write_batch(self, batch: List[Pending[E]]) -> None:
+        # Requests that gave up waiting, e.g. on a client disconnect, are left out
+        batch = [pending for pending in batch if not pending[1].done()]
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        for _, _, submitted, _ in batch:
+            self.wait.observe(started - submitted)
+        self.batch_sizes.observe(len(batch))
+
+        try:
+            results = await self._run([entry for entry, _, _, _ in batch], [log for _, _, _, log in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                _settle(batch[0][1], exception=e)
+                return
+
+            logger.warning("Coalesced %s batch of %d failed, retrying one by one: %s", self.name, len(batch), e)
+            self.failed_batches += 1
+            for entry, future, _, log in batch:
+                try:
+                    _settle(future, result=(await self._run([entry], [log]))[0])
+                except Exception as entry_error:
+                    _settle(future, exception=entry_error)
+            return
+
+        for (_, future, _, _), result in zip(batch, results):
+            _settle(future, result=result)
+
+    def _write_with_new_session(self, entries: List[E]) -> List[R]:
+        with SessionLocal() as db:
+            return self.write(db, entries)
+
+    async def _run(self, entries: List[E], logs: List[QueryLog | None]) -> List[R]:
+        with capture_queries() as batch_log:
+            try:
+                if settings.DB_ASYNC:
+                    async with AsyncSessionLocal() as db:
+                        return await db.run_sync(self.write, entries)
+
+                return await run_in_threadpool(self._write_with_new_session, entries)
+            finally:
+                for log in logs:
+                    if log is not None:
+                        log.merge(batch_log)
+
+    def render(self) -> Iterator[str]:
+        """
+        Yields the exposition lines of the coalescer metrics.
+        """
+        labels = f'coalescer="{self.name}"'
+        yield "# HELP write_coalescer_batch_size Writes per coalesced batch."
+        yield "# TYPE write_coalescer_batch_size histogram"
+        yield from self.batch_sizes.render("write_coalescer_batch_size", labels)
+        yield "# HELP write_coalescer_wait_seconds Time writes waited for their batch to start."
+        yield "# TYPE write_coalescer_wait_seconds histogram"
+        yield from self.wait.render("write_coalescer_wait_seconds", labels)
+        yield "# TYPE write_coalescer_failed_batches_total counter"
+        yield f"write_coalescer_failed_batches_total{{{labels}}} {self.failed_batches}"
+
+
+def _settle(future: asyncio.Future, result: object = None, exception: BaseException | None = None) -> None:
+    if future.done():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+
+
+item_create_coalescer: WriteCoalescer[Tuple[ItemCreate, int], Item] = WriteCoalescer(
+    "create_item",
+    create_owned_items,
+    window=settings.ITEM_CREATE_COALESCING_WINDOW_MS / 1000,
+    max_batch=settings.ITEM_CREATE_COALESCING_MAX_BATCH,
+)
@@ -1,5 +1,6 @@
 import secrets
 import warnings
+from typing import Literal
 
 from pydantic import Field, PostgresDsn, computed_field, model_validator
 from pydantic_core import MultiHostUrl
@@ -13,17 +14,98 @@ class Settings(BaseSettings):
     ENVIRONMENT: str = Field(default="local")
     PROJECT_NAME: str = Field(default="fastapi-boilerplate")
 
+    # Production server, see app/gunicorn_conf.py
+    SERVER_BIND: str = Field(default="0.0.0.0:8000")
+    SERVER_WORKERS: int = Field(default=0, ge=0, description="0 to derive it from the available CPUs")
+    SERVER_WORKERS_PER_CORE: float = Field(default=1, gt=0)
+    SERVER_BACKLOG: int = Field(default=2048, ge=1)
+    SERVER_KEEPALIVE_SECONDS: int = Field(default=5, ge=0)
+    SERVER_LIMIT_CONCURRENCY: int | None = Field(default=None, ge=1, description="Per worker, None for no limit")
+    SERVER_TIMEOUT_SECONDS: int = Field(default=60, ge=0)
+    SERVER_GRACEFUL_TIMEOUT_SECONDS: int = Field(default=30, ge=0)
+    SERVER_MAX_REQUESTS: int = Field(default=10_000, ge=0, description="Requests before a worker is recycled")
+    SERVER_MAX_REQUESTS_JITTER: int = Field(default=1000, ge=0)
+    SERVER_PRELOAD: bool = Field(default=False, description="Import the app once in the master, SIGHUP won't reload")
+    SERVER_FORWARDED_ALLOW_IPS: str = Field(default="127.0.0.1")
+    SERVER_ACCESS_LOG: bool = Field(default=False)
+
     DB_HOST: str = Field(default="0.0.0.0")
     DB_PORT: int = Field(default=5432)
     DB_NAME: str = Field(default="postgres")
     DB_USER: str = Field(default="postgres")
     DB_PASS: str = Field(default="postgres")
+    DB_ASYNC: bool = Field(default=False)
+    DATABASE_URL: str | None = Field(default=None, description="Overrides the URL built from the DB_* settings")
+
+    # Pool settings apply per engine and per worker process
+    DB_POOL_SIZE: int = Field(default=5, ge=1)
+    DB_MAX_OVERFLOW: int = Field(default=10, ge=0)
+    DB_POOL_TIMEOUT: float = Field(default=30, gt=0)
+    DB_POOL_RECYCLE: int = Field(default=1800, description="Seconds before a connection is replaced, -1 to disable")
+    DB_POOL_PRE_PING: bool = Field(default=True)
+    DB_POOL_WARMUP: int = Field(default=5, ge=1, description="Connections opened per pool before reporting ready")
+    DB_WARMUP_RETRY_SECONDS: float = Field(default=1, gt=0)
+    DB_REPLICA_URLS: list[str] = Field(default=[], description="Read replica URLs, as a JSON list")
+    DB_REPLICA_STICKINESS_SECONDS: float = Field(default=5, ge=0, description="Primary reads after a client's write")
+    DB_STATEMENT_TIMEOUT_MS: int = Field(default=0, ge=0, description="Per connection statement_timeout, 0 to disable")
 
     API_V1_STR: str = Field(default="/api/v1")
-
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(default=60 * 24 * 8)
+    BATCH_MAX_IDS: int = Field(default=100, ge=1)
+    DEFAULT_PAGE_SIZE: int = Field(default=100, ge=1)
+    MAX_PAGE_SIZE: int = Field(default=500, ge=1)
+    SEARCH_CONFIG: str = Field(default="english", description="Postgres text search configuration of item search")
+    SEARCH_MAX_OFFSET: int = Field(default=1000, ge=0)
+    BULK_MAX_ITEMS: int = Field(default=1000, ge=1)
+    # Concurrent `POST /items/` calls written together, see `app.coalescer`
+    ITEM_CREATE_COALESCING: bool = Field(default=False)
+    ITEM_CREATE_COALESCING_WINDOW_MS: float = Field(default=2, gt=0)
+    ITEM_CREATE_COALESCING_MAX_BATCH: int = Field(default=100, ge=1)
+    EXPORT_BATCH_SIZE: int = Field(default=1000, ge=1)
+
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(default=15, gt=0)
+    REFRESH_TOKEN_EXPIRE_MINUTES: int = Field(default=60 * 24 * 8, gt=0)
+    TOKEN_REVOCATION_SYNC_SECONDS: float = Field(
+        default=1, gt=0, description="How often workers pick up the token revocations of other workers"
+    )
     SECRET_KEY: str = Field(default=secrets.token_urlsafe(32))
 
+    BCRYPT_ROUNDS: int = Field(default=12, ge=4, le=31)
+    PASSWORD_HASH_WORKERS: int = Field(default=2, ge=1)
+    PASSWORD_HASH_MAX_QUEUE: int = Field(default=32, ge=0)
+
+    PRINCIPAL_CACHE_SIZE: int = Field(default=10_000, ge=1)
+    PRINCIPAL_CACHE_TTL_SECONDS: float = Field(default=30, ge=0)
+
+    FAST_SERIALIZATION: bool = Field(default=False, description="Encode responses with pydantic-core")
+
+    # Shared read-through cache of item and user rows
+    CACHE_BACKEND: Literal["none", "memory", "redis"] = Field(default="none")
+    CACHE_REDIS_URL: str = Field(default="redis://localhost:6379/0")
+    CACHE_KEY_PREFIX: str = Field(default="fb:")
+    CACHE_MEMORY_SIZE: int = Field(default=100_000, ge=1)
+    CACHE_TTL_SECONDS: float = Field(default=60, gt=0)
+    CACHE_NEGATIVE_TTL_SECONDS: float = Field(default=5, gt=0)
+    CACHE_STALE_GRACE_SECONDS: float = Field(default=10, ge=0, description="Stale entries served while one reloads")
+    CACHE_REFRESH_LOCK_SECONDS: float = Field(default=5, gt=0)
+    CACHE_TIMEOUT_SECONDS: float = Field(default=0.1, gt=0)
+
+    # Admission control: concurrent requests, wait queue length and queue deadline per route class
+    ADMISSION_ENABLED: bool = Field(default=True)
+    ADMISSION_LIMITS: dict[str, int] = Field(default={"auth": 8, "write": 32, "read": 64})
+    ADMISSION_QUEUE_SIZES: dict[str, int] = Field(default={"auth": 16, "write": 64, "read": 256})
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: dict[str, float] = Field(default={"auth": 2, "write": 1, "read": 0.5})
+    LOGIN_RATE_PER_MINUTE: float = Field(default=10, ge=0, description="Per client login rate, 0 to disable")
+    LOGIN_RATE_BURST: int = Field(default=10, ge=1)
+
+    METRICS_ENABLED: bool = Field(default=True)
+    METRICS_PATH: str = Field(default="/metrics")
+
+    QUERY_BUDGET_MODE: Literal["off", "warn", "raise"] = Field(default="off")
+    QUERY_BUDGET_DEFAULT: int = Field(
+        default=10, ge=0, description="Statements per request for routes without a budget"
+    )
+    QUERY_REPEAT_THRESHOLD: int = Field(default=3, ge=2, description="Same statement shape repeats flagged as N+1")
+
     SUPER_USER: str = Field(default="hDn24@gmail.com", examples=["hDn24@gmail.com"])
     SUPER_USER_PASSWORD: str = Field(default="changethis", examples=["hDn24"])
 
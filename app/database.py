@@ -1,16 +1,180 @@
-from typing import Iterator
+import itertools
+import math
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Iterator, TypeVar
 
-from sqlalchemy import create_engine
+from fastapi import Depends, Request, Response  # type: ignore
+from fastapi.concurrency import run_in_threadpool  # type: ignore
+from sqlalchemy import URL, Engine, create_engine, exc, make_url
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import Session, scoped_session, sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 from .configs import settings
+from .metrics import instrument_engine
+from .query_budget import guard_engine
 
-SQLALCHEMY_DATABASE_URL = f"postgresql+psycopg://{settings.DB_USER}:{settings.DB_PASS}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
+# Set after a write, see `get_write_db`
+PRIMARY_UNTIL_COOKIE = "db_primary_until"
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
 
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL or str(settings.SQLALCHEMY_DATABASE_URI)
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = scoped_session(sessionmaker(bind=engine, autocommit=False, autoflush=False))
+# Async drivers for URLs whose driver is sync only
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "sqlite+pysqlite": "sqlite+aiosqlite"}
+
+
+class PoolWaitStats:
+    """
+    Thread safe counters of how long connection checkouts take, including waits for a free connection.
+    """
+
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, elapsed: float, timed_out: bool) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.wait_seconds_total += elapsed
+            self.wait_seconds_max = max(self.wait_seconds_max, elapsed)
+
+
+class _TimedPoolMixin:
+    """
+    Records the duration of every `connect()` of a queue pool into `wait_stats`.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def connect(self) -> Any:
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super().connect()  # type: ignore[misc]
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            self.wait_stats.record(time.perf_counter() - start, timed_out)
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _engine_options() -> dict[str, Any]:
+    """
+    Builds the pool and connection options shared by the sync and async engines from `Settings`.
+
+    Returns:
+        The keyword arguments for `create_engine` / `create_async_engine`.
+    """
+    options: dict[str, Any] = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if settings.DB_STATEMENT_TIMEOUT_MS:
+        # Applied by the server to every session opened on the connection
+        options["connect_args"] = {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+
+    return options
+
+
+def _async_url(url: str) -> URL:
+    """
+    Returns the URL with its driver swapped for an async one where the configured driver is sync only.
+
+    Args:
+        url: The database URL.
+
+    Returns:
+        The URL to create the async engine with.
+    """
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername))
+
+
+def pool_stats(engine: Engine) -> dict[str, Any]:
+    """
+    Returns the live state of an engine's connection pool.
+
+    Args:
+        engine: The engine whose pool to inspect.
+
+    Returns:
+        A dictionary with the pool size, checked in/out and overflow connections and checkout wait times.
+    """
+    pool = engine.pool
+    stats: dict[str, Any] = {"status": pool.status()}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    if isinstance(pool, _TimedPoolMixin):
+        wait = pool.wait_stats
+        stats.update(
+            checkouts=wait.checkouts,
+            timeouts=wait.timeouts,
+            wait_seconds_total=wait.wait_seconds_total,
+            wait_seconds_max=wait.wait_seconds_max,
+            wait_seconds_avg=wait.wait_seconds_total / wait.checkouts if wait.checkouts else 0.0,
+        )
+
+    return stats
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=TimedQueuePool, **_engine_options())
+SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, expire_on_commit=False)
+
+# psycopg 3 ships both drivers, so the same URL resolves to the async dialect here
+async_engine = create_async_engine(
+    _async_url(SQLALCHEMY_DATABASE_URL), poolclass=TimedAsyncAdaptedQueuePool, **_engine_options()
+)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+# Read only endpoints are spread round robin over the replicas, when any are configured
+replica_engines = [
+    create_engine(url, poolclass=TimedQueuePool, **_engine_options()) for url in settings.DB_REPLICA_URLS
+]
+async_replica_engines = [
+    create_async_engine(_async_url(url), poolclass=TimedAsyncAdaptedQueuePool, **_engine_options())
+    for url in settings.DB_REPLICA_URLS
+]
+_replica_counter = itertools.count()
+
+for _engine in [engine, async_engine.sync_engine, *replica_engines, *(e.sync_engine for e in async_replica_engines)]:
+    instrument_engine(_engine)
+    guard_engine(_engine)
+
+AnySession = Session | AsyncSession
+
+T = TypeVar("T")
+E = TypeVar("E", Engine, AsyncEngine)
 
 
 # Dependency
@@ -29,4 +193,186 @@ def get_db() -> Iterator[Session]:
         db.close()
 
 
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """
+    Get an async database session for executing database operations.
+
+    Returns:
+        AsyncIterator[AsyncSession]: An async context manager that provides a database session.
+            The session is automatically closed when the context is exited.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def is_sticky(request: Request) -> bool:
+    """
+    Checks whether the client wrote recently enough that replicas may not have caught up yet.
+
+    Args:
+        request: The current request.
+
+    Returns:
+        True while the stickiness cookie set by the last write is unexpired.
+    """
+    try:
+        return float(request.cookies.get(PRIMARY_UNTIL_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def _pick(replicas: list[E], primary: E, request: Request) -> E:
+    if not replicas or is_sticky(request):
+        return primary
+
+    return replicas[next(_replica_counter) % len(replicas)]
+
+
+def read_engine(request: Request) -> Engine:
+    """
+    Returns the engine a read only request should query: a replica, or the primary while the client is sticky.
+    """
+    return _pick(replica_engines, engine, request)
+
+
+def read_async_engine(request: Request) -> AsyncEngine:
+    """
+    Async counterpart of `read_engine`.
+    """
+    return _pick(async_replica_engines, async_engine, request)
+
+
+def _mark_write(request: Request, response: Response) -> None:
+    # Pins the client to the primary for a while after any unsafe request, so it reads its own writes
+    if replica_engines and request.method not in SAFE_METHODS:
+        response.set_cookie(
+            PRIMARY_UNTIL_COOKIE,
+            str(time.time() + settings.DB_REPLICA_STICKINESS_SECONDS),
+            max_age=math.ceil(settings.DB_REPLICA_STICKINESS_SECONDS),
+            httponly=True,
+            samesite="lax",
+        )
+
+
+def get_write_db(request: Request, response: Response) -> Iterator[Session]:
+    """
+    Get a primary database session, pinning the client to the primary after unsafe requests.
+
+    Returns:
+        Iterator[Session]: A database session bound to the primary.
+    """
+    _mark_write(request, response)
+    yield from get_db()
+
+
+async def get_async_write_db(request: Request, response: Response) -> AsyncIterator[AsyncSession]:
+    """
+    Async counterpart of `get_write_db`.
+
+    Returns:
+        AsyncIterator[AsyncSession]: A database session bound to the primary.
+    """
+    _mark_write(request, response)
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_read_db(request: Request, primary: Session = Depends(get_write_db)) -> Iterator[Session]:
+    """
+    Get a database session for read only endpoints, bound to a replica unless the client is sticky.
+
+    When reads go to the primary, the request's primary session is shared, e.g. with the current user
+    lookup, so a request never holds two connections of the primary pool at once. Requests each waiting
+    on a second connection would otherwise exhaust the pool under load.
+
+    Returns:
+        Iterator[Session]: A database session bound to the engine picked by `read_engine`.
+    """
+    bind = read_engine(request)
+    if bind is engine:
+        yield primary
+        return
+
+    db = SessionLocal(bind=bind)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db(
+    request: Request, primary: AsyncSession = Depends(get_async_write_db)
+) -> AsyncIterator[AsyncSession]:
+    """
+    Async counterpart of `get_read_db`.
+
+    Returns:
+        AsyncIterator[AsyncSession]: A database session bound to the engine picked by `read_async_engine`.
+    """
+    bind = read_async_engine(request)
+    if bind is async_engine:
+        yield primary
+        return
+
+    async with AsyncSessionLocal(bind=bind) as db:
+        yield db
+
+
+# The session dependencies used by the routers, selected by `settings.DB_ASYNC`
+get_session = get_async_write_db if settings.DB_ASYNC else get_write_db
+get_read_session = get_async_read_db if settings.DB_ASYNC else get_read_db
+
+
+async def run_db(db: AnySession, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Runs a synchronous crud function against either kind of session without blocking the event loop.
+
+    With an `AsyncSession` the function runs through `run_sync`, so its queries go through the async driver.
+    With a `Session` the function runs in the threadpool, like a sync `def` route would.
+
+    Args:
+        db: The database session obtained from the `get_session` dependency.
+        fn: The crud function, taking a `Session` as its first argument.
+        *args: Positional arguments passed to `fn`.
+        **kwargs: Keyword arguments passed to `fn`.
+
+    Returns:
+        The value returned by `fn`.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+def dialect_insert(db: Session, entity: Any) -> postgresql.Insert | sqlite.Insert:
+    """
+    Returns an INSERT construct of the session's dialect, exposing `on_conflict_do_nothing/update`.
+
+    Args:
+        db: The database session.
+        entity: The mapped class or table to insert into.
+
+    Returns:
+        The dialect specific INSERT construct.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(entity)
+
+    return postgresql.insert(entity)
+
+
+def is_primary(db: Session) -> bool:
+    """
+    Tells whether a session reads from the primary database, as opposed to a possibly lagging replica.
+
+    Args:
+        db: The database session, the sync session of an `AsyncSession` inside `run_db`.
+
+    Returns:
+        True if the session is bound to the primary engine.
+    """
+    return db.get_bind() in (engine, async_engine.sync_engine)
+
+
 Base = declarative_base()
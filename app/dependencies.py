@@ -2,56 +2,95 @@ from typing import Annotated
 
 from fastapi import Depends, HTTPException, status  # type: ignore
 from fastapi.security import OAuth2PasswordBearer  # type: ignore
-from jose import JWTError, jwt  # type: ignore
-from pydantic import ValidationError
-from sqlalchemy.orm import Session
 
-from app.api.models.user import User
+from app.api.cruds.user import get_user_by_id
 from app.api.schemas.token import TokenPayload
+from app.api.schemas.user import Principal
 from app.api.utils import security
+from app.api.utils.cache import principal_cache
+from app.api.utils.revocation import revocations
 from app.configs import settings
-from app.database import get_db
+from app.database import AnySession, get_session, run_db
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/login/access-token")
 
 
-def get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)],
-    db: Session = Depends(get_db),
-):
+async def get_token_payload(token: Annotated[str, Depends(oauth2_scheme)]) -> TokenPayload:
     """
-    Retrieves the current user based on the provided JWT token.
+    Verifies the access token of the request and checks it against the revocation list of this worker.
 
     Args:
         token: The JWT token used for authentication.
-        db: The database session. Defaults to the session obtained from the `get_db` dependency.
 
     Returns:
-        User
+        The payload of the token.
+
+    Raises:
+        HTTPException: If the token is invalid, expired, not an access token or revoked.
     """
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[security.ALGORITHM])
-        token_data = TokenPayload(**payload)
-    except (JWTError, ValidationError):
+    token_data = security.decode_token(token)
+    if revocations.is_revoked(token_data):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
+    return token_data
+
+
+def _principal_from_claims(token_data: TokenPayload) -> Principal | None:
+    if token_data.ver is None or token_data.is_active is None or token_data.is_superuser is None:
+        return None
+    if revocations.is_stale(token_data.sub, token_data.ver):
+        return None
+
+    return Principal(
+        id=token_data.sub,
+        email=token_data.email,
+        is_active=token_data.is_active,
+        is_superuser=token_data.is_superuser,
+    )
+
+
+async def get_current_user(
+    token_data: Annotated[TokenPayload, Depends(get_token_payload)],
+    db: AnySession = Depends(get_session),
+) -> Principal:
+    """
+    Retrieves the current user based on the provided JWT token.
+
+    The principal is built from the claims of the token, unless they are stale: the user changed since
+    the token was minted, or the token predates claims. It is then served from `principal_cache` when
+    possible, so the user row is only loaded on a miss.
+
+    Args:
+        token_data: The payload of the verified access token.
+        db: The database session. Defaults to the session obtained from the `get_session` dependency.
+
+    Returns:
+        Principal
+    """
+    principal = _principal_from_claims(token_data)
+    if principal is None:
+        principal = principal_cache.get(token_data.sub)
+
+    if principal is None:
+        user = await run_db(db, get_user_by_id, token_data.sub)
+        if not user:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    user = db.query(User).filter(User.id == token_data.sub).first()
+        principal = Principal.model_validate(user)
+        principal_cache.set(token_data.sub, principal)
 
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    elif not user.is_active:
+    if not principal.is_active:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
 
-    return user
+    return principal
 
 
-CurrentUser = Annotated[User, Depends(get_current_user)]
+CurrentUser = Annotated[Principal, Depends(get_current_user)]
 
 
-def get_current_active_superuser(current_user: CurrentUser) -> User:
+async def get_current_active_superuser(current_user: CurrentUser) -> Principal:
     """
     Retrieves the current active superuser based on the provided current user object.
 
@@ -0,0 +1,100 @@
+"""
+Gunicorn configuration of the production server, `gunicorn -c app/gunicorn_conf.py app.main:app`.
+
+Each worker runs the application on uvloop and httptools through `app.workers.UvicornWorker`. Every
+value comes from `Settings`, so the same `SERVER_*` environment variables tune any deployment.
+Send SIGHUP to the master for a graceful rolling restart of the workers.
+"""
+
+import math
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../"))
+
+from app.configs import settings
+
+
+def cgroup_cpu_limit(root: str = "/sys/fs/cgroup") -> float | None:
+    """
+    Reads the CPU quota of the container from the cgroup filesystem, v2 or v1.
+
+    Args:
+        root: The mount point of the cgroup filesystem.
+
+    Returns:
+        The number of CPUs the quota allows, fractional if so configured, or None without a quota.
+    """
+    try:
+        with open(os.path.join(root, "cpu.max")) as file:
+            quota, period = file.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+
+    try:
+        with open(os.path.join(root, "cpu", "cpu.cfs_quota_us")) as file:
+            quota = file.read().strip()
+        with open(os.path.join(root, "cpu", "cpu.cfs_period_us")) as file:
+            period = file.read().strip()
+        return None if int(quota) <= 0 else int(quota) / int(period)
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus(root: str = "/sys/fs/cgroup") -> float:
+    """
+    Returns the CPUs this process may use: its affinity mask, capped by the cgroup quota.
+
+    Args:
+        root: The mount point of the cgroup filesystem.
+    """
+    cpus: float = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    limit = cgroup_cpu_limit(root)
+    return min(cpus, limit) if limit else cpus
+
+
+def worker_count(cpus: float) -> int:
+    """
+    Returns the number of workers to run, `SERVER_WORKERS` or else `SERVER_WORKERS_PER_CORE` per CPU.
+
+    Args:
+        cpus: The available CPUs.
+    """
+    if settings.SERVER_WORKERS:
+        return settings.SERVER_WORKERS
+
+    return max(1, math.ceil(cpus * settings.SERVER_WORKERS_PER_CORE))
+
+
+def post_fork(server: object, worker: object) -> None:
+    """
+    Drops the pooled connections a worker inherits when the application is preloaded in the master.
+
+    The worker then fills its own pools on startup, see `app.readiness.warm_up`.
+    """
+    from app.database import (
+        async_engine,
+        async_replica_engines,
+        engine,
+        replica_engines,
+    )
+
+    for sync_engine in (engine, *replica_engines, *(e.sync_engine for e in (async_engine, *async_replica_engines))):
+        # Leaves the inherited connections to the master instead of closing them under it
+        sync_engine.dispose(close=False)
+
+
+bind = settings.SERVER_BIND
+workers = worker_count(available_cpus())
+worker_class = "app.workers.UvicornWorker"
+backlog = settings.SERVER_BACKLOG
+keepalive = settings.SERVER_KEEPALIVE_SECONDS
+timeout = settings.SERVER_TIMEOUT_SECONDS
+graceful_timeout = settings.SERVER_GRACEFUL_TIMEOUT_SECONDS
+# Workers are recycled after about this many requests, jittered so they do not all restart at once
+max_requests = settings.SERVER_MAX_REQUESTS
+max_requests_jitter = settings.SERVER_MAX_REQUESTS_JITTER
+preload_app = settings.SERVER_PRELOAD
+forwarded_allow_ips = settings.SERVER_FORWARDED_ALLOW_IPS
+accesslog = "-" if settings.SERVER_ACCESS_LOG else None
@@ -1,3 +1,4 @@
+import argparse
 import os
 import sys
 
@@ -6,36 +7,50 @@ sys.path.append(os.path.join(os.path.dirname(__file__), "../"))
 
 from app.api.cruds import user as crud
 from app.api.schemas.user import UserCreate
+from app.api.utils.security import get_password_hash
 from app.configs import settings
 from app.database import Base, SessionLocal, engine
+from app.migrations import migrate
 
 
 def initialize_data() -> None:
     """
-    Initializes the data for the application by resetting the database and creating a superuser.
+    Brings the database schema up to date and creates the superuser if it does not exist yet.
+
+    Idempotent and cheap once done: the migrations are already applied and the superuser lookup
+    spares hashing the password again, so it can run before every start, from every pod.
     """
-    session = SessionLocal()
-    reset_database()
+    for name in migrate(engine):
+        print(f"Applied migration {name}")
 
-    superuser_data = UserCreate(
-        email=settings.SUPER_USER,
-        password=settings.SUPER_USER_PASSWORD,
-        is_superuser=True,
-    )
+    with SessionLocal() as session:
+        if crud.get_user_by_email(session, settings.SUPER_USER) is not None:
+            return
 
-    crud.create_user(session, superuser_data)
+        superuser_data = UserCreate(
+            email=settings.SUPER_USER,
+            password=settings.SUPER_USER_PASSWORD,
+            is_superuser=True,
+        )
+        # Another pod may create it first, the insert then does nothing
+        crud.create_user(session, superuser_data, get_password_hash(superuser_data.password))
 
 
 def reset_database() -> None:
     """
-    Resets the database by dropping all tables and recreating them.
+    Resets the database by dropping all tables, including the migration history.
 
     """
-    # Drop all tables from the database
     Base.metadata.drop_all(bind=engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DROP TABLE IF EXISTS schema_migrations")
 
-    # Recreate all tables in the database
-    Base.metadata.create_all(bind=engine)
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate the database and create the superuser if missing.")
+    parser.add_argument("--reset", action="store_true", help="Drop every table first. Destroys all data.")
+    args = parser.parse_args()
 
-initialize_data()
+    if args.reset:
+        reset_database()
+    initialize_data()
@@ -1,16 +1,65 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from fastapi import FastAPI  # type: ignore
+from fastapi.responses import JSONResponse  # type: ignore
 
+from app.admission import AdmissionMiddleware
+from app.api.routers.admin import router as admin_router
+from app.api.routers.health import router as health_router
 from app.api.routers.item import router as item_router
 from app.api.routers.login import router as login_router
+from app.api.routers.metrics import router as metrics_router
 from app.api.routers.user import router as user_router
+from app.api.utils.security import shutdown_hash_pool
+from app.api.utils.serialization import FastJSONResponse
 from app.configs import settings
+from app.database import async_engine, engine
+from app.metrics import MetricsMiddleware
+from app.query_budget import QueryBudgetMiddleware
+from app.readiness import warm_up
+from app.revocation import sync_revocations
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    Warms up the connection pools and starts syncing token revocations in the background on startup,
+    and releases process wide resources when the application shuts down.
+
+    Startup does not wait for the warm-up, `/health/ready` reports when it is complete.
+    """
+    tasks = [asyncio.create_task(warm_up()), asyncio.create_task(sync_revocations())]
+    yield
+    for task in tasks:
+        task.cancel()
+    shutdown_hash_pool()
+    engine.dispose()
+    await async_engine.dispose()
+
 
-app = FastAPI(title=settings.PROJECT_NAME, openapi_url=f"{settings.API_V1_STR}/openapi.json")
+app = FastAPI(
+    title=settings.PROJECT_NAME,
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse if settings.FAST_SERIALIZATION else JSONResponse,
+)
 
+if settings.QUERY_BUDGET_MODE != "off":
+    app.add_middleware(QueryBudgetMiddleware, mode=settings.QUERY_BUDGET_MODE)
+if settings.ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware)
+if settings.METRICS_ENABLED:
+    # Outermost, so shed requests are recorded too
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics_router)
 
+app.include_router(health_router)
 app.include_router(login_router, prefix=settings.API_V1_STR)
 app.include_router(user_router, prefix=settings.API_V1_STR)
 app.include_router(item_router, prefix=settings.API_V1_STR)
+app.include_router(admin_router, prefix=settings.API_V1_STR)
 
 if __name__ == "__main__":
     import uvicorn  # type: ignore
@@ -0,0 +1,209 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator
+
+from sqlalchemy import Engine, event
+
+# Upper bounds, in seconds, of the request and database time histograms
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds of the per request query count histogram
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class Histogram:
+    """
+    A Prometheus style cumulative histogram over fixed bucket bounds.
+    """
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        # One extra slot for the +Inf bucket
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> Iterator[str]:
+        """
+        Yields the exposition lines of the histogram.
+
+        Args:
+            name: The metric name.
+            labels: The pre-rendered label pairs of the series, without braces.
+        """
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class RequestDbStats:
+    """
+    Database work done while serving one request, filled in by the engine hooks.
+    """
+
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.seconds = 0.0
+
+
+class RouteSeries:
+    """
+    All the metrics of one (method, route) pair, with labels rendered once at creation.
+    """
+
+    __slots__ = ("labels", "latency", "db_time", "db_queries", "statuses")
+
+    def __init__(self, method: str, route: str) -> None:
+        self.labels = f'method="{method}",route="{route}"'
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.db_time = Histogram(LATENCY_BUCKETS)
+        self.db_queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.statuses: dict[int, int] = {}
+
+    def observe(self, elapsed: float, status: int, db: RequestDbStats) -> None:
+        self.latency.observe(elapsed)
+        self.db_time.observe(db.seconds)
+        self.db_queries.observe(db.queries)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+
+class MetricsRegistry:
+    """
+    Process wide store of the HTTP and database metrics.
+
+    Series are only created the first time a (method, route) pair is seen, so recording a request
+    allocates no label structures. Updates happen on the event loop thread, which needs no locking.
+    """
+
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.series: dict[tuple[str, str], RouteSeries] = {}
+
+    def series_for(self, method: str, route: str) -> RouteSeries:
+        key = (method, route)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = RouteSeries(method, route)
+        return series
+
+    def render(self) -> Iterator[str]:
+        """
+        Yields the exposition lines of every HTTP and database metric.
+        """
+        yield "# HELP http_requests_in_flight Requests currently being served."
+        yield "# TYPE http_requests_in_flight gauge"
+        yield f"http_requests_in_flight {self.in_flight}"
+
+        series = list(self.series.values())
+
+        yield "# HELP http_requests_total Requests served, by route and status code."
+        yield "# TYPE http_requests_total counter"
+        for s in series:
+            for status, count in s.statuses.items():
+                yield f'http_requests_total{{{s.labels},status="{status}"}} {count}'
+
+        for name, attr, description in (
+            ("http_request_duration_seconds", "latency", "Request latency."),
+            ("db_request_duration_seconds", "db_time", "Time spent executing SQL per request."),
+            ("db_request_queries", "db_queries", "SQL statements executed per request."),
+        ):
+            yield f"# HELP {name} {description}"
+            yield f"# TYPE {name} histogram"
+            for s in series:
+                yield from getattr(s, attr).render(name, s.labels)
+
+    def reset(self) -> None:
+        self.in_flight = 0
+        self.series.clear()
+
+
+registry = MetricsRegistry()
+
+_request_db_stats: ContextVar[RequestDbStats | None] = ContextVar("request_db_stats", default=None)
+
+
+def current_db_stats() -> RequestDbStats | None:
+    """
+    Returns the database stats of the request being served, if any.
+    """
+    return _request_db_stats.get()
+
+
+def _before_cursor_execute(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool):
+    context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool):
+    stats = _request_db_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += time.perf_counter() - context._metrics_start
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Attaches the cursor execution hooks that attribute SQL time to the current request.
+
+    Args:
+        engine: The engine to instrument, `AsyncEngine.sync_engine` for async engines.
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording latency, status, in-flight count and database work per route.
+
+    It is written against the raw ASGI interface rather than `BaseHTTPMiddleware` so the request's
+    context variables reach the endpoint and the threadpool.
+    """
+
+    def __init__(self, app: Callable) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        db_stats = RequestDbStats()
+        token = _request_db_stats.set(db_stats)
+        registry.in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            registry.in_flight -= 1
+            _request_db_stats.reset(token)
+
+            # Set by FastAPI's router on the shared scope once the request is matched
+            route = scope.get("route")
+            registry.series_for(scope["method"], route.path if route else UNMATCHED_ROUTE).observe(
+                elapsed, status, db_stats
+            )
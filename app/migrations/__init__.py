@@ -0,0 +1,131 @@
+import importlib
+import logging
+import pkgutil
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Callable, List
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    func,
+    insert,
+    inspect,
+    select,
+    text,
+)
+from sqlalchemy.engine import Connection, Engine
+
+from app.migrations import versions
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key of the Postgres advisory lock serializing concurrent `migrate` calls, e.g. from several pods
+MIGRATION_LOCK_KEY = 72_091_605
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    """
+    One schema change, a module of `app.migrations.versions` named `v<version>_<name>`.
+    """
+
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+def _load(module: ModuleType) -> Migration:
+    version, _, name = module.__name__.rsplit(".", 1)[-1][1:].partition("_")
+    return Migration(int(version), name, module.upgrade)
+
+
+def load_migrations() -> List[Migration]:
+    """
+    Loads the migrations of `app.migrations.versions`, in version order.
+
+    Returns:
+        The migrations.
+    """
+    migrations = [
+        _load(importlib.import_module(f"{versions.__name__}.{module.name}"))
+        for module in pkgutil.iter_modules(versions.__path__)
+        if module.name.startswith("v")
+    ]
+    return sorted(migrations, key=lambda migration: migration.version)
+
+
+def head_version() -> int:
+    """
+    Returns the version of the latest migration, the one the code expects the database to be at.
+    """
+    migrations = load_migrations()
+    return migrations[-1].version if migrations else 0
+
+
+def current_version(connection: Connection) -> int:
+    """
+    Returns the version of the latest migration applied to the database, 0 if none is.
+
+    Args:
+        connection: A connection to the database.
+    """
+    if not inspect(connection).has_table(schema_migrations.name):
+        return 0
+
+    return connection.scalar(select(func.coalesce(func.max(schema_migrations.c.version), 0)))
+
+
+def has_column(connection: Connection, table: str, column: str) -> bool:
+    """
+    Tells whether a column exists, for migrations adopting databases created by `create_all`.
+
+    Args:
+        connection: A connection to the database.
+        table: The name of the table.
+        column: The name of the column.
+    """
+    return any(existing["name"] == column for existing in inspect(connection).get_columns(table))
+
+
+def migrate(engine: Engine) -> List[str]:
+    """
+    Applies the pending migrations, each in its own transaction along with its version row.
+
+    Safe to run concurrently and repeatedly: on Postgres an advisory lock makes other callers wait and
+    then find nothing left to apply. Migrations run under that lock, so DDL on large tables should
+    avoid long locks, e.g. no table rewrites.
+
+    Args:
+        engine: The engine of the database to migrate.
+
+    Returns:
+        The names of the applied migrations, empty when the database was already up to date.
+    """
+    applied = []
+    for migration in load_migrations():
+        with engine.begin() as connection:
+            if connection.dialect.name == "postgresql":
+                connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            schema_migrations.create(connection, checkfirst=True)
+            if current_version(connection) >= migration.version:
+                continue
+
+            logger.info("Applying migration %04d %s", migration.version, migration.name)
+            migration.upgrade(connection)
+            connection.execute(insert(schema_migrations).values(version=migration.version, name=migration.name))
+            applied.append(f"{migration.version:04d}_{migration.name}")
+
+    return applied
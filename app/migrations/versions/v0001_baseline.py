@@ -0,0 +1,35 @@
+"""
+The users and items tables as the original `init_data.py` created them.
+
+Tables that already exist are left alone, so databases created by `create_all` before migrations
+existed are adopted as they are.
+"""
+
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, MetaData, String, Table
+from sqlalchemy.engine import Connection
+
+metadata = MetaData()
+
+Table(
+    "users",
+    metadata,
+    Column("id", Integer, autoincrement=True, primary_key=True, index=True),
+    Column("username", String),
+    Column("email", String, index=True, unique=True),
+    Column("hash_password", String),
+    Column("is_active", Boolean),
+    Column("is_superuser", Boolean),
+)
+
+Table(
+    "items",
+    metadata,
+    Column("id", Integer, autoincrement=True, primary_key=True, index=True),
+    Column("title", String, index=True),
+    Column("description", String),
+    Column("owner_id", Integer, ForeignKey("users.id")),
+)
+
+
+def upgrade(connection: Connection) -> None:
+    metadata.create_all(connection, checkfirst=True)
@@ -0,0 +1,30 @@
+"""
+Adds the `version` and `updated_at` columns backing the ETag and Last-Modified headers, and the index
+serving the owner filtered item listing.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.migrations import has_column
+
+
+def upgrade(connection: Connection) -> None:
+    for table in ("users", "items"):
+        if has_column(connection, table, "version"):
+            continue
+
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+        if connection.dialect.name == "postgresql":
+            # A non volatile default, existing rows get it without a table rewrite
+            connection.execute(
+                text(f"ALTER TABLE {table} ADD COLUMN updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()")
+            )
+        else:
+            # SQLite only adds columns with a constant default
+            connection.execute(
+                text(f"ALTER TABLE {table} ADD COLUMN updated_at DATETIME NOT NULL DEFAULT '1970-01-01 00:00:00'")
+            )
+            connection.execute(text(f"UPDATE {table} SET updated_at = CURRENT_TIMESTAMP"))
+
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_items_owner_id_id ON items (owner_id, id)"))
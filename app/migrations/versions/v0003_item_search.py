@@ -0,0 +1,30 @@
+"""
+Adds the `search_vector` column of item search, fills it for existing items and indexes it on Postgres.
+
+The values match `cruds.item.search_vector`, which keeps the column up to date from then on.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.configs import settings
+from app.migrations import has_column
+
+DOCUMENT = "CASE WHEN coalesce(description, '') = '' THEN title ELSE title || ' ' || description END"
+
+
+def upgrade(connection: Connection) -> None:
+    if has_column(connection, "items", "search_vector"):
+        return
+
+    if connection.dialect.name != "postgresql":
+        connection.execute(text("ALTER TABLE items ADD COLUMN search_vector TEXT"))
+        connection.execute(text(f"UPDATE items SET search_vector = lower({DOCUMENT})"))
+        return
+
+    connection.execute(text("ALTER TABLE items ADD COLUMN search_vector TSVECTOR"))
+    connection.execute(
+        text(f"UPDATE items SET search_vector = to_tsvector(CAST(:config AS REGCONFIG), {DOCUMENT})"),
+        {"config": settings.SEARCH_CONFIG},
+    )
+    connection.execute(text("CREATE INDEX ix_items_search_vector ON items USING gin (search_vector)"))
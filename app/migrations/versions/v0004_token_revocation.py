@@ -0,0 +1,27 @@
+"""
+Adds the token generation of users and the `token_revocations` table backing logouts.
+"""
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, text
+from sqlalchemy.engine import Connection
+
+from app.migrations import has_column
+
+metadata = MetaData()
+
+Table(
+    "token_revocations",
+    metadata,
+    Column("id", Integer, autoincrement=True, primary_key=True),
+    Column("user_id", Integer, nullable=False),
+    Column("jti", String, unique=True),
+    Column("generation", Integer),
+    Column("expires_at", Integer, nullable=False, index=True),
+)
+
+
+def upgrade(connection: Connection) -> None:
+    if not has_column(connection, "users", "token_generation"):
+        connection.execute(text("ALTER TABLE users ADD COLUMN token_generation INTEGER NOT NULL DEFAULT 0"))
+
+    metadata.create_all(connection, checkfirst=True)
@@ -0,0 +1,13 @@
+"""
+Adds the `version` column of `token_revocations`, recording the users whose token claims are stale.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.migrations import has_column
+
+
+def upgrade(connection: Connection) -> None:
+    if not has_column(connection, "token_revocations", "version"):
+        connection.execute(text("ALTER TABLE token_revocations ADD COLUMN version INTEGER"))
@@ -0,0 +1,28 @@
+"""
+Adds the `item_counts` table of per owner item counts, filled from the existing items.
+"""
+
+from sqlalchemy import Column, Integer, MetaData, Table, inspect, text
+from sqlalchemy.engine import Connection
+
+metadata = MetaData()
+
+item_counts = Table(
+    "item_counts",
+    metadata,
+    Column("owner_id", Integer, primary_key=True),
+    Column("count", Integer, nullable=False),
+)
+
+
+def upgrade(connection: Connection) -> None:
+    if inspect(connection).has_table(item_counts.name):
+        return
+
+    item_counts.create(connection)
+    connection.execute(
+        text(
+            "INSERT INTO item_counts (owner_id, count) "
+            "SELECT owner_id, count(*) FROM items WHERE owner_id IS NOT NULL GROUP BY owner_id"
+        )
+    )
@@ -0,0 +1,211 @@
+import logging
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, TypeVar
+
+from sqlalchemy import Engine, event
+from starlette.datastructures import MutableHeaders  # type: ignore
+
+from app.configs import settings
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<!:):\w+|\?")
+_VALUE_LISTS = re.compile(r"\(\?(?:, \?)*\)(?:, \(\?(?:, \?)*\))+|\?(?:, \?)+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """
+    Raised when a request runs more SQL statements than its budget or repeats a statement shape.
+    """
+
+
+def fingerprint(statement: str) -> str:
+    """
+    Reduces a SQL statement to its shape, so statements differing only in parameters compare equal.
+
+    Args:
+        statement: The SQL statement as sent to the driver.
+
+    Returns:
+        The statement with literals and placeholders replaced by `?` and value lists collapsed.
+    """
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    shape = _PLACEHOLDERS.sub("?", _LITERALS.sub("?", shape))
+    return _VALUE_LISTS.sub(lambda match: "(?)" if match.group().startswith("(") else "?", shape)
+
+
+class QueryLog:
+    """
+    The SQL statements executed while serving one request.
+    """
+
+    __slots__ = ("method", "path", "statements", "shapes")
+
+    def __init__(self, method: str = "", path: str = "") -> None:
+        self.method = method
+        self.path = path
+        self.statements: list[str] = []
+        self.shapes: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+    def record(self, statement: str) -> None:
+        self.statements.append(statement)
+        shape = fingerprint(statement)
+        self.shapes[shape] = self.shapes.get(shape, 0) + 1
+
+    def merge(self, other: "QueryLog") -> None:
+        self.statements.extend(other.statements)
+        for shape, count in other.shapes.items():
+            self.shapes[shape] = self.shapes.get(shape, 0) + count
+
+    def violations(self, budget: int, repeat_threshold: int) -> list[str]:
+        """
+        Checks the log against a statement budget and the N+1 repeat threshold.
+
+        Args:
+            budget: The maximum number of statements allowed.
+            repeat_threshold: How many executions of the same statement shape count as an N+1 pattern.
+
+        Returns:
+            A description of each violation, empty when the request is within budget.
+        """
+        problems = []
+        if len(self.statements) > budget:
+            problems.append(f"{len(self.statements)} statements exceed the budget of {budget}")
+        for shape, count in self.shapes.items():
+            if count >= repeat_threshold:
+                problems.append(f"statement repeated {count} times: {shape}")
+        return problems
+
+
+_current_log: ContextVar[QueryLog | None] = ContextVar("query_log", default=None)
+_collectors: list[list[QueryLog]] = []
+
+
+def _after_cursor_execute(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool):
+    log = _current_log.get()
+    if log is not None:
+        log.record(statement)
+
+
+def guard_engine(engine: Engine) -> None:
+    """
+    Attaches the cursor execution hook that records statements into the current query log.
+
+    Args:
+        engine: The engine to guard, `AsyncEngine.sync_engine` for async engines.
+    """
+    if not event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def current_query_log() -> QueryLog | None:
+    """
+    Returns the query log of the current context, for work that runs outside of it on its behalf.
+    """
+    return _current_log.get()
+
+
+@contextmanager
+def capture_queries(method: str = "", path: str = "") -> Iterator[QueryLog]:
+    """
+    Records the statements executed in the current context, including threadpool calls made from it.
+
+    Args:
+        method: The HTTP method of the request being served, for reporting.
+        path: The path of the request being served, for reporting.
+
+    Yields:
+        The query log being filled in.
+    """
+    log = QueryLog(method, path)
+    token = _current_log.set(log)
+    try:
+        yield log
+    finally:
+        _current_log.reset(token)
+
+
+@contextmanager
+def collect_request_logs() -> Iterator[list[QueryLog]]:
+    """
+    Collects the query log of every request completed by `QueryBudgetMiddleware` in the block.
+
+    Requests may be served on another thread, as with the test client, so logs are handed over
+    through a process wide list rather than the caller's context.
+
+    Yields:
+        The list the completed request logs are appended to.
+    """
+    logs: list[QueryLog] = []
+    _collectors.append(logs)
+    try:
+        yield logs
+    finally:
+        _collectors.remove(logs)
+
+
+def query_budget(max_queries: int) -> Callable[[F], F]:
+    """
+    Declares the maximum number of SQL statements a route may execute per request.
+
+    Args:
+        max_queries: The statement budget of the route.
+
+    Returns:
+        A decorator for the route's endpoint function.
+    """
+
+    def decorator(endpoint: F) -> F:
+        endpoint.__query_budget__ = max_queries  # type: ignore[attr-defined]
+        return endpoint
+
+    return decorator
+
+
+class QueryBudgetMiddleware:
+    """
+    Pure ASGI middleware counting and fingerprinting the SQL statements of each request.
+
+    Requests over their route's budget, or repeating a statement shape, are logged in `warn` mode
+    and raise `QueryBudgetExceeded` in `raise` mode. The statement count so far is also returned in
+    the `X-Query-Count` header, which is complete for all but streaming responses.
+    """
+
+    def __init__(self, app: Callable, mode: str = settings.QUERY_BUDGET_MODE) -> None:
+        self.app = app
+        self.mode = mode
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or self.mode == "off":
+            await self.app(scope, receive, send)
+            return
+
+        with capture_queries(scope["method"], scope["path"]) as log:
+
+            async def send_wrapper(message: dict) -> None:
+                if message["type"] == "http.response.start":
+                    MutableHeaders(scope=message).append("X-Query-Count", str(len(log)))
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+        for logs in _collectors:
+            logs.append(log)
+
+        route = scope.get("route")
+        budget = getattr(getattr(route, "endpoint", None), "__query_budget__", settings.QUERY_BUDGET_DEFAULT)
+        problems = log.violations(budget, settings.QUERY_REPEAT_THRESHOLD)
+        if problems:
+            message = f"{log.method} {log.path}: " + "; ".join(problems)
+            if self.mode == "raise":
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
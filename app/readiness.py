@@ -0,0 +1,88 @@
+import asyncio
+import logging
+from typing import List
+
+from fastapi.concurrency import run_in_threadpool  # type: ignore
+from sqlalchemy import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.configs import settings
+from app.database import async_engine, async_replica_engines, engine, replica_engines
+from app.migrations import current_version, head_version
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """
+    Whether this worker is ready to serve traffic: its pools are warm and the schema is up to date.
+    """
+
+    def __init__(self) -> None:
+        self.ready = False
+        self.schema_version: int | None = None
+        self.detail = "warming up"
+
+    def set_ready(self, schema_version: int) -> None:
+        self.ready = True
+        self.schema_version = schema_version
+        self.detail = "ready"
+
+    def set_not_ready(self, detail: str) -> None:
+        self.ready = False
+        self.detail = detail
+
+
+readiness = Readiness()
+
+
+def _warm_up_sync(engines: List[Engine], connections: int) -> int:
+    # Connections are all opened before any is returned, so the pools end up holding that many
+    opened = []
+    try:
+        for e in engines:
+            opened += [e.connect() for _ in range(connections)]
+        return current_version(opened[0])
+    finally:
+        for connection in opened:
+            connection.close()
+
+
+async def _warm_up_async(engines: List[AsyncEngine], connections: int) -> int:
+    results = await asyncio.gather(*(e.connect() for e in engines for _ in range(connections)), return_exceptions=True)
+    opened = [result for result in results if not isinstance(result, BaseException)]
+    try:
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return await opened[0].run_sync(current_version)
+    finally:
+        for connection in opened:
+            await connection.close()
+
+
+async def warm_up() -> None:
+    """
+    Fills the connection pools this worker uses and checks the schema version, until both succeed.
+
+    Retries every `DB_WARMUP_RETRY_SECONDS` while the database is unreachable or its schema is behind
+    the code, e.g. while another pod applies the migrations.
+    """
+    head = head_version()
+    connections = min(settings.DB_POOL_WARMUP, settings.DB_POOL_SIZE)
+    while True:
+        try:
+            if settings.DB_ASYNC:
+                version = await _warm_up_async([async_engine, *async_replica_engines], connections)
+            else:
+                version = await run_in_threadpool(_warm_up_sync, [engine, *replica_engines], connections)
+        except Exception as e:
+            logger.warning("Database warm-up failed: %s", e)
+            readiness.set_not_ready(f"database unavailable: {type(e).__name__}")
+        else:
+            if version >= head:
+                readiness.set_ready(version)
+                return
+            readiness.set_not_ready(f"schema at version {version}, expected {head}")
+
+        await asyncio.sleep(settings.DB_WARMUP_RETRY_SECONDS)
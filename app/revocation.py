@@ -0,0 +1,57 @@
+import asyncio
+import logging
+
+from fastapi.concurrency import run_in_threadpool  # type: ignore
+from sqlalchemy.orm import Session
+
+from app.api.cruds.token import get_revocations, get_revocations_fingerprint
+from app.api.utils.revocation import revocations
+from app.configs import settings
+from app.database import AsyncSessionLocal, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+def _sync(db: Session) -> bool:
+    # The fingerprint is read first, a revocation committed in between is picked up by the next sync
+    fingerprint = get_revocations_fingerprint(db)
+    if fingerprint == revocations.fingerprint:
+        return False
+
+    revocations.replace(get_revocations(db), fingerprint)
+    return True
+
+
+def _sync_with_new_session() -> bool:
+    with SessionLocal() as db:
+        return _sync(db)
+
+
+async def sync_revocations_once() -> bool:
+    """
+    Mirrors the `token_revocations` table into the revocation list of this worker.
+
+    Returns:
+        True if the table changed since the last sync and was loaded again.
+    """
+    if settings.DB_ASYNC:
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(_sync)
+
+    return await run_in_threadpool(_sync_with_new_session)
+
+
+async def sync_revocations() -> None:
+    """
+    Keeps the revocation list of this worker in sync with the revocations of every worker.
+
+    Checks the table every `TOKEN_REVOCATION_SYNC_SECONDS` with a single cheap query, and loads it
+    again only when it changed, so a revocation reaches every worker within that delay.
+    """
+    while True:
+        try:
+            await sync_revocations_once()
+        except Exception as e:
+            logger.warning("Token revocation sync failed: %s", e)
+
+        await asyncio.sleep(settings.TOKEN_REVOCATION_SYNC_SECONDS)
@@ -0,0 +1,96 @@
+import os
+import tempfile
+
+# Settings are read at import time, so the test configuration has to be in place before any app import.
+# Point DATABASE_URL at a Postgres database to run the suite against it instead of SQLite.
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+# `assert_queries` and the route budgets rely on the query budget middleware, whatever the environment says
+os.environ["QUERY_BUDGET_MODE"] = "raise"
+os.environ.setdefault("CACHE_BACKEND", "memory")
+os.environ.setdefault("LOGIN_RATE_PER_MINUTE", "0")
+
+from contextlib import contextmanager
+from typing import Callable, ContextManager, Iterator
+
+import pytest
+from fastapi.testclient import TestClient  # type: ignore
+
+from app.api.cruds import user as user_crud
+from app.api.schemas.user import UserCreate
+from app.api.utils import cache
+from app.api.utils.cache import MemoryBackend, principal_cache
+from app.api.utils.security import get_password_hash
+from app.database import SessionLocal, engine
+from app.init_data import reset_database
+from app.main import app
+from app.migrations import migrate
+from app.query_budget import QueryLog, collect_request_logs
+from app.tests.utils import SUPERUSER, USER, login
+
+
+@pytest.fixture(scope="session")
+def client() -> Iterator[TestClient]:
+    """
+    A test client on a freshly created database holding one superuser and one regular user.
+    """
+    reset_database()
+    migrate(engine)
+    with SessionLocal() as session:
+        for data, is_superuser in ((SUPERUSER, True), (USER, False)):
+            user_crud.create_user(
+                session, UserCreate(**data, is_superuser=is_superuser), get_password_hash(data["password"])
+            )
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+    reset_database()
+
+
+@pytest.fixture(scope="session")
+def superuser_headers(client: TestClient) -> dict:
+    return login(client, **SUPERUSER)
+
+
+@pytest.fixture(scope="session")
+def user_headers(client: TestClient) -> dict:
+    return login(client, **USER)
+
+
+@pytest.fixture
+def memory_cache(monkeypatch: pytest.MonkeyPatch) -> MemoryBackend:
+    """
+    Serves the entity caches from a fresh in-process backend, whatever `CACHE_BACKEND` is set to.
+    """
+    backend = MemoryBackend(maxsize=100)
+    monkeypatch.setattr(cache, "cache_backend", backend)
+    return backend
+
+
+@pytest.fixture
+def assert_queries() -> Callable[[int], ContextManager[list[QueryLog]]]:
+    """
+    Asserts the number of SQL statements the requests made in a block execute.
+
+    The principal and entity caches are cleared on entry, so counts include the current user lookup
+    whenever the claims of the token cannot be used.
+
+    Returns:
+        A context manager taking the expected statement count and yielding the request logs.
+    """
+
+    @contextmanager
+    def _assert_queries(expected: int) -> Iterator[list[QueryLog]]:
+        principal_cache.clear()
+        if isinstance(cache.cache_backend, MemoryBackend):
+            cache.cache_backend.clear()
+        with collect_request_logs() as logs:
+            yield logs
+
+        executed = [statement for log in logs for statement in log.statements]
+        assert len(executed) == expected, f"expected {expected} statements, got {len(executed)}:\n" + "\n".join(
+            executed
+        )
+
+    return _assert_queries
@@ -0,0 +1,19 @@
+import pytest
+
+
+@pytest.mark.parametrize("path", ["/api/v1/admin/cache-stats", "/api/v1/admin/pool-stats"])
+def test_admin_queries(client, superuser_headers, assert_queries, path):
+    with assert_queries(0):
+        response = client.get(path, headers=superuser_headers)
+    assert response.status_code == 200
+
+
+def test_admin_requires_superuser(client, user_headers):
+    assert client.get("/api/v1/admin/cache-stats", headers=user_headers).status_code == 400
+
+
+def test_metrics_queries(client, assert_queries):
+    with assert_queries(0):
+        response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "http_request_duration_seconds_bucket" in response.text
@@ -0,0 +1,106 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.admission import (
+    AdmissionControl,
+    AdmissionLimiter,
+    AdmissionMiddleware,
+    Overloaded,
+    TokenBucket,
+    route_class,
+)
+
+
+def test_route_class():
+    assert route_class("POST", "/api/v1/login/access-token") == "auth"
+    assert route_class("PUT", "/api/v1/items/1") == "write"
+    assert route_class("GET", "/api/v1/items/1") == "read"
+    assert route_class("GET", "/metrics") is None
+
+
+def test_limiter_queues_and_sheds():
+    async def scenario():
+        limiter = AdmissionLimiter(limit=1, queue_size=1, queue_timeout=0.05)
+        await limiter.acquire()
+
+        queued = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded, match="queue_full"):
+            await limiter.acquire()
+
+        # Releasing hands the slot over to the queued request
+        limiter.release()
+        await queued
+        assert (limiter.active, limiter.queued) == (1, 0)
+
+        with pytest.raises(Overloaded, match="timeout"):
+            await limiter.acquire()
+        assert limiter.queued == 0
+
+        limiter.release()
+        assert limiter.active == 0
+        return limiter.rejected
+
+    assert asyncio.run(scenario()) == {"queue_full": 1, "timeout": 1}
+
+
+def test_limiter_cancelled_after_hand_off():
+    async def scenario():
+        limiter = AdmissionLimiter(limit=1, queue_size=2, queue_timeout=1)
+        await limiter.acquire()
+
+        cancelled = asyncio.ensure_future(limiter.acquire())
+        queued = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+
+        # The request is cancelled after the slot is handed over, before it resumes
+        limiter.release()
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+
+        await queued
+        assert (limiter.active, limiter.queued) == (1, 0)
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_token_bucket(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("app.admission.time.monotonic", lambda: now[0])
+    bucket = TokenBucket(rate=1, burst=2)
+
+    assert bucket.take("a") == 0 and bucket.take("a") == 0
+    assert bucket.take("a") == pytest.approx(1)
+    assert bucket.take("b") == 0
+
+    now[0] += 1
+    assert bucket.take("a") == 0
+    assert bucket.rejected == 1
+
+
+def test_middleware_rejects():
+    async def app(scope, receive, send):
+        await asyncio.sleep(0.05)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    control = AdmissionControl()
+    control.limiters["read"] = AdmissionLimiter(limit=1, queue_size=0, queue_timeout=1)
+    control.login_bucket = TokenBucket(rate=0.1, burst=1)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=AdmissionMiddleware(app, control))  # type: ignore[arg-type]
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            reads = await asyncio.gather(client.get("/api/v1/items/"), client.get("/api/v1/items/"))
+            logins = [await client.post("/api/v1/login/access-token") for _ in range(2)]
+        return reads, logins
+
+    reads, logins = asyncio.run(scenario())
+    assert sorted(response.status_code for response in reads) == [200, 503]
+    assert [response.status_code for response in logins] == [200, 429]
+    assert logins[1].headers["Retry-After"] == "10"
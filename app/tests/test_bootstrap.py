@@ -0,0 +1,54 @@
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, inspect, text
+
+from app.check_import_time import check
+from app.database import Base
+from app.migrations import current_version, head_version, migrate
+from app.migrations.versions.v0001_baseline import metadata as baseline_metadata
+
+
+def _sqlite_engine():
+    return create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'migrations.db')}")
+
+
+def test_migrations_match_models():
+    engine = _sqlite_engine()
+    assert len(migrate(engine)) == head_version()
+    assert migrate(engine) == []
+
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        assert {column["name"] for column in inspector.get_columns(table.name)} == set(table.columns.keys())
+        indexes = {index.name for index in table.indexes if not index.dialect_options["postgresql"]["using"]}
+        assert {index["name"] for index in inspector.get_indexes(table.name)} == indexes
+
+
+def test_migrations_adopt_existing_tables():
+    engine = _sqlite_engine()
+    baseline_metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO users (id, email) VALUES (1, 'owner@example.com')"))
+        connection.execute(text("INSERT INTO items (title, description, owner_id) VALUES ('Blue Kettle', NULL, 1)"))
+
+    migrate(engine)
+    with engine.connect() as connection:
+        assert current_version(connection) == head_version()
+        assert connection.scalar(text("SELECT search_vector FROM items")) == "blue kettle"
+        assert connection.scalar(text("SELECT version FROM items")) == 1
+
+
+def test_health(client):
+    assert client.get("/health/live").json() == {"status": "ok"}
+
+    deadline = time.monotonic() + 5
+    while (response := client.get("/health/ready")).status_code != 200 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert response.json() == {"status": "ready", "schema_version": head_version()}
+
+
+def test_import_time():
+    # A loose budget, the check runs `make import-budget` against the real target
+    assert check("app.main", budget_ms=10_000, top=0)
@@ -0,0 +1,272 @@
+import asyncio
+import socketserver
+import threading
+import time
+from typing import Iterator
+
+import pytest
+from sqlalchemy.util.concurrency import await_only, greenlet_spawn
+
+from app.api.cruds.item import item_cache
+from app.api.models.user import Item
+from app.api.utils.cache import CacheError, EntityCache, MemoryBackend, RedisBackend
+from app.tests.test_items import _create_items
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    """
+    Serves the GET, MGET, SET [PX] [NX], DEL and AUTH commands of the Redis protocol from a dict.
+    """
+
+    def _read_command(self) -> list[bytes] | None:
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self) -> None:
+        data: dict[bytes, tuple[float, bytes]] = self.server.data  # type: ignore[attr-defined]
+        while (args := self._read_command()) is not None:
+            command = args[0].upper()
+            if command in (b"GET", b"MGET"):
+                if command == b"MGET":
+                    self.wfile.write(b"*%d\r\n" % (len(args) - 1))
+                for key in args[1:]:
+                    entry = data.get(key)
+                    if entry is None or entry[0] < time.monotonic():
+                        self.wfile.write(b"$-1\r\n")
+                    else:
+                        self.wfile.write(b"$%d\r\n%s\r\n" % (len(entry[1]), entry[1]))
+            elif command == b"SET":
+                options = [option.upper() for option in args[3:]]
+                expires = time.monotonic() + int(options[options.index(b"PX") + 1]) / 1000
+                entry = data.get(args[1])
+                if b"NX" in options and entry is not None and entry[0] >= time.monotonic():
+                    self.wfile.write(b"$-1\r\n")
+                else:
+                    data[args[1]] = (expires, args[2])
+                    self.wfile.write(b"+OK\r\n")
+            elif command == b"DEL":
+                self.wfile.write(b":%d\r\n" % sum(data.pop(key, None) is not None for key in args[1:]))
+            elif command == b"AUTH" and args[1] == b"secret":
+                self.wfile.write(b"+OK\r\n")
+            else:
+                self.wfile.write(b"-ERR unsupported\r\n")
+
+
+@pytest.fixture
+def redis_url() -> Iterator[str]:
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _RespHandler)
+    server.daemon_threads = True
+    server.data = {}  # type: ignore[attr-defined]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"redis://:secret@127.0.0.1:{server.server_address[1]}/0"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request, redis_url):
+    backend = MemoryBackend(maxsize=2) if request.param == "memory" else RedisBackend(redis_url, timeout=1)
+    yield backend
+    if isinstance(backend, RedisBackend):
+        backend.close()
+
+
+def test_backend_commands(backend):
+    assert backend.get("a") is None
+    backend.set("a", b"1", 60)
+    assert backend.get("a") == b"1"
+    assert backend.add("a", b"2", 60) is False
+    assert backend.add("b", b"2", 60) is True
+    assert backend.get_many("a", "c", "b") == [b"1", None, b"2"]
+    backend.delete("a", "b")
+    assert backend.get("a") is None and backend.get("b") is None
+
+
+def test_backend_expiry(backend):
+    backend.set("a", b"1", 0.01)
+    time.sleep(0.02)
+    assert backend.get("a") is None
+    assert backend.add("a", b"2", 60) is True
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(maxsize=2)
+    backend.set("a", b"1", 60)
+    backend.set("b", b"2", 60)
+    backend.get("a")
+    backend.set("c", b"3", 60)
+    assert backend.get("b") is None
+    assert backend.get("a") == b"1"
+
+
+def test_redis_backend_errors(redis_url):
+    backend = RedisBackend(redis_url.replace("secret", "wrong"), timeout=1)
+    with pytest.raises(CacheError):
+        backend.get("a")
+
+
+@pytest.fixture
+def entity_cache(memory_cache) -> EntityCache:
+    return EntityCache("test-item", Item)
+
+
+def test_entity_cache_read_through(entity_cache):
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return Item(id=1, title="title", description=None, owner_id=2, version=3)
+
+    first = entity_cache.get_or_load(1, loader)
+    cached = entity_cache.get_or_load(1, loader)
+    assert len(loads) == 1
+    assert (cached.id, cached.title, cached.owner_id, cached.version) == (first.id, "title", 2, 3)
+    assert entity_cache.stats()["hits"] == 1
+
+    entity_cache.invalidate(1)
+    entity_cache.get_or_load(1, loader)
+    assert len(loads) == 2
+
+
+def test_entity_cache_negative(entity_cache):
+    loads = []
+    assert entity_cache.get_or_load(1, lambda: loads.append(1)) is None
+    assert entity_cache.get_or_load(1, lambda: loads.append(1)) is None
+    assert len(loads) == 1
+
+
+def test_entity_cache_no_fill(entity_cache):
+    loads = []
+    entity_cache.get_or_load(1, lambda: loads.append(1), fill=False)
+    entity_cache.get_or_load(1, lambda: loads.append(1), fill=False)
+    assert len(loads) == 2
+
+
+def test_entity_cache_stale_refresh(entity_cache, memory_cache, monkeypatch):
+    monkeypatch.setattr("app.api.utils.cache.settings.CACHE_TTL_SECONDS", 0.01)
+    entity_cache.get_or_load(1, lambda: Item(id=1, title="old"))
+    time.sleep(0.02)
+
+    # The first reader of a stale entry takes the refresh lock and reloads it
+    assert entity_cache.get_or_load(1, lambda: Item(id=1, title="new")).title == "new"
+    time.sleep(0.02)
+
+    # While another reader holds the lock, readers of the stale entry get it without touching the database
+    assert memory_cache.add(f"{entity_cache.key(1)}:refresh", b"1", 60)
+    assert entity_cache.get_or_load(1, lambda: pytest.fail("reloaded under the refresh lock")).title == "new"
+    assert entity_cache.stats()["misses"] == 2
+    assert entity_cache.stats()["stale_hits"] == 1
+
+
+def test_entity_cache_stale_no_fill(entity_cache, memory_cache, monkeypatch):
+    monkeypatch.setattr("app.api.utils.cache.settings.CACHE_TTL_SECONDS", 0.01)
+    entity_cache.get_or_load(1, lambda: Item(id=1, title="old"))
+    time.sleep(0.02)
+
+    # A replica reader of a stale entry neither reloads it nor holds up the primary's refresh
+    assert entity_cache.get_or_load(1, lambda: pytest.fail("reloaded"), fill=False).title == "old"
+    assert memory_cache.get(f"{entity_cache.key(1)}:refresh") is None
+    assert entity_cache.get_or_load(1, lambda: Item(id=1, title="new")).title == "new"
+
+
+def test_entity_cache_single_flight(entity_cache):
+    loading, release = threading.Event(), threading.Event()
+
+    def slow_loader():
+        loading.set()
+        release.wait(1)
+        return Item(id=1, title="loaded")
+
+    first = threading.Thread(target=entity_cache.get_or_load, args=(1, slow_loader))
+    first.start()
+    loading.wait(1)
+
+    # A concurrent reader of the missing entry waits for the first reader's fill
+    threading.Timer(0.05, release.set).start()
+    assert entity_cache.get_or_load(1, lambda: pytest.fail("loaded twice")).title == "loaded"
+    first.join()
+    assert entity_cache.stats()["shared_loads"] == 1
+
+
+def test_entity_cache_single_flight_async(entity_cache):
+    # Crud functions run on the event loop in async mode, so waiting must not block it
+    async def scenario():
+        release = asyncio.Event()
+
+        def slow_loader():
+            await_only(release.wait())
+            return Item(id=1, title="loaded")
+
+        first = asyncio.ensure_future(greenlet_spawn(entity_cache.get_or_load, 1, slow_loader))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(greenlet_spawn(entity_cache.get_or_load, 1, lambda: pytest.fail("loaded twice")))
+        await asyncio.sleep(0.01)
+        release.set()
+        return [item.title for item in await asyncio.gather(first, second)]
+
+    assert asyncio.run(scenario()) == ["loaded", "loaded"]
+
+
+def test_entity_cache_failed_load_releases_lock(entity_cache):
+    def failing_loader():
+        raise RuntimeError("database down")
+
+    with pytest.raises(RuntimeError):
+        entity_cache.get_or_load(1, failing_loader)
+
+    started = time.monotonic()
+    assert entity_cache.get_or_load(1, lambda: Item(id=1, title="loaded")).title == "loaded"
+    assert time.monotonic() - started < 0.5
+
+
+def test_entity_cache_fill_after_invalidate(entity_cache, memory_cache):
+    def racing_loader():
+        # The row is written and invalidated while this load is in flight
+        entity_cache.invalidate(1)
+        return Item(id=1, title="before")
+
+    assert entity_cache.get_or_load(1, racing_loader).title == "before"
+    assert entity_cache.get_or_load(1, lambda: Item(id=1, title="after")).title == "after"
+
+    # A version lost to eviction only costs a reload
+    memory_cache.delete(f"{entity_cache.key(1)}:version")
+    assert entity_cache.get_or_load(1, lambda: Item(id=1, title="reloaded")).title == "reloaded"
+
+
+def test_read_item_cached(client, user_headers, memory_cache, assert_queries):
+    item = _create_items(client, user_headers, 1)[0]
+    with assert_queries(1):
+        client.get(f"/api/v1/items/{item['id']}", headers=user_headers)
+        response = client.get(f"/api/v1/items/{item['id']}", headers=user_headers)
+    assert response.json()["title"] == item["title"]
+
+
+def test_update_item_invalidates(client, user_headers):
+    item = _create_items(client, user_headers, 1)[0]
+    client.get(f"/api/v1/items/{item['id']}", headers=user_headers)
+    response = client.put(
+        f"/api/v1/items/{item['id']}", json={"title": "updated", "description": None}, headers=user_headers
+    )
+    assert response.status_code == 200
+    assert client.get(f"/api/v1/items/{item['id']}", headers=user_headers).json()["title"] == "updated"
+
+
+def test_delete_item_invalidates(client, user_headers):
+    item = _create_items(client, user_headers, 1)[0]
+    client.get(f"/api/v1/items/{item['id']}", headers=user_headers)
+    assert client.delete(f"/api/v1/items/{item['id']}", headers=user_headers).status_code == 200
+    assert client.get(f"/api/v1/items/{item['id']}", headers=user_headers).status_code == 404
+
+
+def test_missing_item_cached(client, user_headers, memory_cache, assert_queries):
+    misses = item_cache.misses
+    with assert_queries(1):
+        client.get("/api/v1/items/999999", headers=user_headers)
+        assert client.get("/api/v1/items/999999", headers=user_headers).status_code == 404
+    assert item_cache.misses == misses + 1
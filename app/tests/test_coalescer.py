@@ -0,0 +1,70 @@
+import asyncio
+
+from sqlalchemy import text
+
+from app.coalescer import WriteCoalescer, item_create_coalescer
+from app.configs import settings
+from app.query_budget import capture_queries
+
+
+def test_batches_concurrent_writes():
+    batches = []
+
+    def write(db, entries):
+        batches.append(list(entries))
+        return [entry * 10 for entry in entries]
+
+    async def scenario():
+        coalescer = WriteCoalescer("test", write, window=0.05, max_batch=3)
+        return coalescer, await asyncio.gather(*(coalescer.submit(n) for n in range(5)))
+
+    coalescer, results = asyncio.run(scenario())
+    assert results == [0, 10, 20, 30, 40]
+    # The first batch is written once full, the second when its window ends
+    assert batches == [[0, 1, 2], [3, 4]]
+    assert coalescer.batch_sizes.count == 2 and coalescer.batch_sizes.sum == 5
+
+
+def test_failed_batch_retries_each_write():
+    def write(db, entries):
+        if "bad" in entries:
+            raise ValueError("bad entry")
+        return entries
+
+    async def scenario():
+        coalescer = WriteCoalescer("test", write, window=0.01, max_batch=10)
+        results = await asyncio.gather(*(coalescer.submit(e) for e in ("a", "bad", "b")), return_exceptions=True)
+        return coalescer, results
+
+    coalescer, results = asyncio.run(scenario())
+    assert results[0] == "a" and results[2] == "b"
+    assert isinstance(results[1], ValueError)
+    assert coalescer.failed_batches == 1
+
+
+def test_batch_statements_charged_to_each_request():
+    def write(db, entries):
+        db.execute(text("SELECT 1"))
+        return entries
+
+    async def request(coalescer, entry):
+        with capture_queries() as log:
+            await coalescer.submit(entry)
+        return log
+
+    async def scenario():
+        coalescer = WriteCoalescer("test", write, window=0.01, max_batch=10)
+        return await asyncio.gather(request(coalescer, "a"), request(coalescer, "b"))
+
+    assert [len(log) for log in asyncio.run(scenario())] == [1, 1]
+
+
+def test_create_item_coalesced(client, user_headers, monkeypatch):
+    monkeypatch.setattr(settings, "ITEM_CREATE_COALESCING", True)
+    batches = item_create_coalescer.batch_sizes.count
+
+    response = client.post("/api/v1/items/", json={"title": "coalesced", "description": "item"}, headers=user_headers)
+    assert response.status_code == 201
+    assert response.json() == {"title": "coalesced", "description": "item"}
+    assert item_create_coalescer.batch_sizes.count == batches + 1
+    assert 'write_coalescer_batch_size_count{coalescer="create_item"}' in client.get(settings.METRICS_PATH).text
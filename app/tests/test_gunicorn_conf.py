@@ -0,0 +1,29 @@
+from app import gunicorn_conf
+
+
+def test_cgroup_v2_limit(tmp_path):
+    (tmp_path / "cpu.max").write_text("150000 100000\n")
+    assert gunicorn_conf.cgroup_cpu_limit(str(tmp_path)) == 1.5
+
+    (tmp_path / "cpu.max").write_text("max 100000\n")
+    assert gunicorn_conf.cgroup_cpu_limit(str(tmp_path)) is None
+
+
+def test_cgroup_v1_limit(tmp_path):
+    (tmp_path / "cpu").mkdir()
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("200000\n")
+    (tmp_path / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+    assert gunicorn_conf.cgroup_cpu_limit(str(tmp_path)) == 2
+
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("-1\n")
+    assert gunicorn_conf.cgroup_cpu_limit(str(tmp_path)) is None
+
+
+def test_worker_count(tmp_path, monkeypatch):
+    (tmp_path / "cpu.max").write_text("50000 100000\n")
+    assert gunicorn_conf.available_cpus(str(tmp_path)) == 0.5
+    assert gunicorn_conf.worker_count(0.5) == 1
+    assert gunicorn_conf.worker_count(2.5) == 3
+
+    monkeypatch.setattr(gunicorn_conf.settings, "SERVER_WORKERS", 4)
+    assert gunicorn_conf.worker_count(2.5) == 4
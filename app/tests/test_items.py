@@ -0,0 +1,288 @@
+import csv
+import io
+import json
+
+import pytest
+
+from app.configs import settings
+from app.database import engine
+from app.tests.utils import login
+
+
+def _create_items(client, headers, count: int) -> list[dict]:
+    items = [{"title": f"item {i}", "description": "description"} for i in range(count)]
+    response = client.post("/api/v1/items/bulk", json={"items": items}, headers=headers)
+    assert response.status_code == 201, response.text
+    return response.json()["items"]
+
+
+def _version(client, id: int, headers) -> int:
+    return int(client.get(f"/api/v1/items/{id}", headers=headers).headers["ETag"].strip('"'))
+
+
+def test_read_items_queries(client, user_headers, assert_queries):
+    _create_items(client, user_headers, 5)
+    with assert_queries(2):
+        response = client.get("/api/v1/items/", headers=user_headers)
+    assert response.status_code == 200
+    assert len(response.json()) >= 5
+
+
+def test_read_items_by_ids_queries(client, user_headers, assert_queries):
+    ids = [item["id"] for item in _create_items(client, user_headers, 5)]
+    with assert_queries(1):
+        response = client.get("/api/v1/items/batch", params={"ids": ids}, headers=user_headers)
+    assert response.status_code == 200
+    assert len(response.json()) == len(ids)
+
+
+def test_export_items_queries(client, user_headers, assert_queries):
+    _create_items(client, user_headers, 5)
+    with assert_queries(1):
+        response = client.get("/api/v1/items/export", headers=user_headers)
+    assert response.status_code == 200
+
+
+def test_read_items_pages(client, user_headers):
+    # Created in one statement, the rows share their creation time and are told apart by ID alone
+    _create_items(client, user_headers, 12)
+    export = sorted(
+        map(json.loads, client.get("/api/v1/items/export", headers=user_headers).text.splitlines()),
+        key=lambda row: row["id"],
+    )
+    expected = [{"title": row["title"], "description": row["description"]} for row in export]
+
+    items, url, params = [], "/api/v1/items/", {"limit": 5}
+    while url:
+        response = client.get(url, params=params, headers=user_headers)
+        assert response.status_code == 200
+        items += response.json()
+        url, params = response.links.get("next", {}).get("url"), None
+        assert (url is None) == ("X-Next-Cursor" not in response.headers)
+
+    # Every row once, in ID order, across pages
+    assert items == expected
+
+
+def test_read_items_page_size_capped(client, user_headers):
+    response = client.get("/api/v1/items/", params={"limit": settings.MAX_PAGE_SIZE + 1}, headers=user_headers)
+    assert response.status_code == 422
+
+
+def test_export_items_csv(client, user_headers):
+    me = client.get("/api/v1/login/test-access-token", headers=user_headers).json()
+    item = _create_items(client, user_headers, 1)[0]
+    response = client.put(
+        f"/api/v1/items/{item['id']}",
+        json={"title": 'crate, "oak"', "description": "line one\nline two"},
+        headers=user_headers,
+    )
+    assert response.status_code == 200
+
+    response = client.get("/api/v1/items/export", params={"format": "csv"}, headers=user_headers)
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/csv")
+
+    assert response.text.startswith("id,title,description,owner_id\r\n")
+    # Commas, quotes and newlines are quoted, with quotes doubled
+    assert f'{item["id"]},"crate, ""oak""","line one\nline two",{me["id"]}\r\n' in response.text
+    records = list(csv.reader(io.StringIO(response.text, newline="")))
+    assert [str(item["id"]), 'crate, "oak"', "line one\nline two", str(me["id"])] in records[1:]
+
+
+def test_read_item_queries(client, user_headers, assert_queries):
+    item = _create_items(client, user_headers, 1)[0]
+    with assert_queries(1):
+        response = client.get(f"/api/v1/items/{item['id']}", headers=user_headers)
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("coalescing", [False, True])
+def test_create_item_queries(client, user_headers, assert_queries, monkeypatch, coalescing):
+    monkeypatch.setattr(settings, "ITEM_CREATE_COALESCING", coalescing)
+    # The INSERT of the item and the update of the owner's item count, also when written in a batch
+    with assert_queries(2):
+        response = client.post("/api/v1/items/", json={"title": "item", "description": None}, headers=user_headers)
+    assert response.status_code == 201
+
+
+def test_create_items_queries(client, user_headers, assert_queries):
+    with assert_queries(2):
+        _create_items(client, user_headers, 50)
+
+
+def test_update_items_queries(client, user_headers, superuser_headers, assert_queries):
+    items = _create_items(client, user_headers, 5)
+    foreign = _create_items(client, superuser_headers, 1)[0]
+    versions = {item["id"]: _version(client, item["id"], user_headers) for item in items}
+    foreign_version = _version(client, foreign["id"], superuser_headers)
+
+    entries = [{"id": item["id"], "title": f"updated {item['id']}", "description": None} for item in items]
+    entries.append({"id": foreign["id"], "title": "stolen", "description": None})
+    # The one UPDATE ... RETURNING, keyed on the item IDs
+    with assert_queries(1):
+        response = client.patch("/api/v1/items/bulk", json={"items": entries}, headers=user_headers)
+    assert response.status_code == 200
+    assert response.json()["missing_ids"] == [foreign["id"]]
+    assert sorted((item["id"], item["title"]) for item in response.json()["items"]) == [
+        (item["id"], f"updated {item['id']}") for item in items
+    ]
+
+    # Each updated item moves up one version, the foreign item is left alone
+    for item in items:
+        response = client.get(f"/api/v1/items/{item['id']}", headers=user_headers)
+        assert response.json() == {"title": f"updated {item['id']}", "description": None}
+        assert _version(client, item["id"], user_headers) == versions[item["id"]] + 1
+    response = client.get(f"/api/v1/items/{foreign['id']}", headers=superuser_headers)
+    assert response.json() == {"title": foreign["title"], "description": foreign["description"]}
+    assert _version(client, foreign["id"], superuser_headers) == foreign_version
+
+
+def test_delete_items_queries(client, user_headers, assert_queries):
+    ids = [item["id"] for item in _create_items(client, user_headers, 5)]
+    with assert_queries(2):
+        response = client.post("/api/v1/items/bulk-delete", json={"ids": ids}, headers=user_headers)
+    assert response.status_code == 200
+    assert sorted(response.json()["deleted_ids"]) == sorted(ids)
+
+
+def test_update_item_queries(client, user_headers, assert_queries):
+    item = _create_items(client, user_headers, 1)[0]
+    with assert_queries(1):
+        response = client.put(
+            f"/api/v1/items/{item['id']}", json={"title": "updated", "description": None}, headers=user_headers
+        )
+    assert response.status_code == 200
+
+
+def test_update_foreign_item_queries(client, user_headers, superuser_headers, assert_queries):
+    item = _create_items(client, superuser_headers, 1)[0]
+    with assert_queries(2):
+        response = client.put(
+            f"/api/v1/items/{item['id']}", json={"title": "updated", "description": None}, headers=user_headers
+        )
+    assert response.status_code == 403
+
+
+def test_delete_item_queries(client, user_headers, assert_queries):
+    item = _create_items(client, user_headers, 1)[0]
+    with assert_queries(2):
+        response = client.delete(f"/api/v1/items/{item['id']}", headers=user_headers)
+    assert response.status_code == 200
+
+
+def test_read_item_not_modified(client, user_headers, assert_queries):
+    item = _create_items(client, user_headers, 1)[0]
+    response = client.get(f"/api/v1/items/{item['id']}", headers=user_headers)
+    etag, last_modified = response.headers["ETag"], response.headers["Last-Modified"]
+
+    with assert_queries(1):
+        response = client.get(f"/api/v1/items/{item['id']}", headers={**user_headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    response = client.get(f"/api/v1/items/{item['id']}", headers={**user_headers, "If-Modified-Since": last_modified})
+    assert response.status_code == 304
+
+
+def test_update_item_if_match(client, user_headers):
+    item = _create_items(client, user_headers, 1)[0]
+    etag = client.get(f"/api/v1/items/{item['id']}", headers=user_headers).headers["ETag"]
+    body = {"title": "updated", "description": None}
+
+    response = client.put(f"/api/v1/items/{item['id']}", json=body, headers={**user_headers, "If-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    response = client.put(f"/api/v1/items/{item['id']}", json=body, headers={**user_headers, "If-Match": etag})
+    assert response.status_code == 412
+
+    response = client.get(f"/api/v1/items/{item['id']}", headers={**user_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_search_items(client, user_headers, superuser_headers, assert_queries):
+    items = [
+        {"title": "Blue kettle", "description": "Boils water fast"},
+        {"title": "Red kettle", "description": None},
+        {"title": "Teapot", "description": "Pairs with a blue kettle"},
+    ]
+    response = client.post("/api/v1/items/bulk", json={"items": items}, headers=user_headers)
+    ids = [item["id"] for item in response.json()["items"]]
+    client.post("/api/v1/items/", json={"title": "Blue kettle", "description": None}, headers=superuser_headers)
+
+    with assert_queries(1):
+        response = client.get("/api/v1/items/search", params={"q": "blue kettle"}, headers=user_headers)
+    assert response.status_code == 200
+    assert {item["id"] for item in response.json()} == {ids[0], ids[2]}
+
+    # The search vector follows updates
+    client.put(f"/api/v1/items/{ids[1]}", json={"title": "Red kettle", "description": "blue"}, headers=user_headers)
+    response = client.get("/api/v1/items/search", params={"q": "blue kettle", "limit": 2}, headers=user_headers)
+    assert len(response.json()) == 2
+    response = client.get("/api/v1/items/search", params={"q": "blue kettle"}, headers=superuser_headers)
+    assert len(response.json()) == 4
+
+
+def test_search_items_no_match(client, user_headers):
+    response = client.get("/api/v1/items/search", params={"q": "no-such-word"}, headers=user_headers)
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_item_counts(client, superuser_headers):
+    response = client.post(
+        "/api/v1/users/", json={"email": "counts@example.com", "password": "p"}, headers=superuser_headers
+    )
+    owner_id = response.json()["id"]
+    headers = login(client, "counts@example.com", "p")
+
+    ids = [item["id"] for item in _create_items(client, headers, 3)]
+    client.post("/api/v1/items/", json={"title": "item", "description": None}, headers=headers)
+    client.delete(f"/api/v1/items/{ids[0]}", headers=headers)
+    client.post("/api/v1/items/bulk-delete", json={"ids": ids[1:2]}, headers=headers)
+
+    response = client.get("/api/v1/items/", params={"limit": 1}, headers=headers)
+    assert response.headers["X-Total-Count"] == "2"
+    assert "X-Total-Count-Estimated" not in response.headers
+    assert client.get("/api/v1/items/stats", headers=headers).json() == [{"owner_id": owner_id, "count": 2}]
+
+    stats = client.get("/api/v1/items/stats", params={"limit": 500}, headers=superuser_headers).json()
+    assert {"owner_id": owner_id, "count": 2} in stats
+    response = client.get("/api/v1/items/", params={"limit": 1}, headers=superuser_headers)
+    if engine.dialect.name != "postgresql":
+        assert response.headers["X-Total-Count"] == str(sum(stat["count"] for stat in stats))
+
+    response = client.get("/api/v1/items/stats", params={"limit": 1}, headers=superuser_headers)
+    assert len(response.json()) == 1 and "X-Next-Cursor" in response.headers
+
+
+def test_read_items_fields(client, user_headers, assert_queries):
+    item = _create_items(client, user_headers, 1)[0]
+    with assert_queries(2) as logs:
+        response = client.get("/api/v1/items/", params={"fields": "title"}, headers=user_headers)
+    assert response.status_code == 200
+    assert all(list(entry) == ["title"] for entry in response.json())
+    assert "items.description" not in logs[0].statements[0]
+
+    response = client.get(f"/api/v1/items/{item['id']}", params={"fields": "description"}, headers=user_headers)
+    assert response.json() == {"description": "description"}
+    assert "ETag" in response.headers
+
+    response = client.get("/api/v1/items/", params={"fields": "title,owner_id"}, headers=user_headers)
+    assert response.status_code == 400
+
+
+def test_partial_representation_etag(client, user_headers):
+    item = _create_items(client, user_headers, 1)[0]
+    url = f"/api/v1/items/{item['id']}"
+    full_etag = client.get(url, headers=user_headers).headers["ETag"]
+    partial_etag = client.get(url, params={"fields": "title"}, headers=user_headers).headers["ETag"]
+    assert partial_etag != full_etag
+
+    # A copy of another representation of the same version is not current
+    response = client.get(url, params={"fields": "title"}, headers={**user_headers, "If-None-Match": full_etag})
+    assert response.status_code == 200
+    response = client.get(url, params={"fields": "title"}, headers={**user_headers, "If-None-Match": partial_etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == partial_etag
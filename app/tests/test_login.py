@@ -0,0 +1,130 @@
+from datetime import timedelta
+
+from jose import jwt  # type: ignore
+
+from app.api.schemas.token import TokenPayload
+from app.api.utils import security
+from app.api.utils.revocation import revocations
+from app.configs import settings
+from app.revocation import sync_revocations_once
+from app.tests.utils import USER
+
+
+def test_access_token_queries(client, assert_queries):
+    with assert_queries(1):
+        response = client.post(
+            "/api/v1/login/access-token", data={"username": USER["email"], "password": USER["password"]}
+        )
+    assert response.status_code == 200
+
+
+def test_test_access_token_queries(client, user_headers, assert_queries):
+    # The request is authenticated from the claims of the token, only the user is read
+    with assert_queries(1):
+        response = client.get("/api/v1/login/test-access-token", headers=user_headers)
+    assert response.status_code == 200
+    assert response.json()["email"] == USER["email"]
+
+
+def _tokens(client, superuser_headers, email: str) -> dict:
+    response = client.post("/api/v1/users/", json={"email": email, "password": "password"}, headers=superuser_headers)
+    assert response.status_code == 200, response.text
+    response = client.post("/api/v1/login/access-token", data={"username": email, "password": "password"})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _bearer(tokens: dict) -> dict:
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+
+def test_refresh_token_rotation(client, superuser_headers):
+    tokens = _tokens(client, superuser_headers, "refresh@example.com")
+    assert tokens["expires_in"] == settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+    # Each token type is only accepted where it belongs
+    response = client.post("/api/v1/login/refresh-token", json={"refresh_token": tokens["access_token"]})
+    assert response.status_code == 403
+    response = client.get(
+        "/api/v1/login/test-access-token", headers={"Authorization": f"Bearer {tokens['refresh_token']}"}
+    )
+    assert response.status_code == 403
+
+    response = client.post("/api/v1/login/refresh-token", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    rotated = response.json()
+    assert client.get("/api/v1/login/test-access-token", headers=_bearer(rotated)).status_code == 200
+
+    # Replaying the rotated refresh token revokes every token of the user
+    response = client.post("/api/v1/login/refresh-token", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 403
+    assert client.get("/api/v1/login/test-access-token", headers=_bearer(rotated)).status_code == 403
+    response = client.post("/api/v1/login/refresh-token", json={"refresh_token": rotated["refresh_token"]})
+    assert response.status_code == 403
+
+
+def test_logout(client, superuser_headers):
+    tokens = _tokens(client, superuser_headers, "logout@example.com")
+    other = client.post(
+        "/api/v1/login/access-token", data={"username": "logout@example.com", "password": "password"}
+    ).json()
+
+    response = client.post(
+        "/api/v1/login/logout", json={"refresh_token": tokens["refresh_token"]}, headers=_bearer(tokens)
+    )
+    assert response.status_code == 200
+    assert client.get("/api/v1/login/test-access-token", headers=_bearer(tokens)).status_code == 403
+    # Other sessions of the user are left alone
+    assert client.get("/api/v1/login/test-access-token", headers=_bearer(other)).status_code == 200
+
+    assert client.post("/api/v1/login/logout-all", headers=_bearer(other)).status_code == 200
+    assert client.get("/api/v1/login/test-access-token", headers=_bearer(other)).status_code == 403
+
+    # New logins get the new generation
+    fresh = client.post(
+        "/api/v1/login/access-token", data={"username": "logout@example.com", "password": "password"}
+    ).json()
+    assert client.get("/api/v1/login/test-access-token", headers=_bearer(fresh)).status_code == 200
+
+    response = client.post("/api/v1/login/refresh-token", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 403
+
+
+def test_revocations_sync_from_the_database(client, superuser_headers):
+    tokens = _tokens(client, superuser_headers, "sync@example.com")
+    assert client.post("/api/v1/login/logout", headers=_bearer(tokens)).status_code == 200
+
+    # A worker that did not see the logout picks it up from the table
+    revocations.clear()
+    assert client.get("/api/v1/login/test-access-token", headers=_bearer(tokens)).status_code == 200
+    assert client.portal.call(sync_revocations_once)
+    assert not client.portal.call(sync_revocations_once)
+    assert client.get("/api/v1/login/test-access-token", headers=_bearer(tokens)).status_code == 403
+
+
+def test_stale_claims_fall_back_to_the_database(client, superuser_headers, assert_queries):
+    tokens = _tokens(client, superuser_headers, "claims@example.com")
+    client.post("/api/v1/items/", json={"title": "item", "description": None}, headers=_bearer(tokens))
+    with assert_queries(2):
+        assert client.get("/api/v1/items/", headers=_bearer(tokens)).status_code == 200
+
+    response = client.patch("/api/v1/users/me", json={"email": "claims2@example.com"}, headers=_bearer(tokens))
+    assert response.status_code == 200
+
+    # The token still authenticates, but the user is loaded again
+    with assert_queries(3):
+        assert client.get("/api/v1/items/", headers=_bearer(tokens)).status_code == 200
+
+    response = client.post("/api/v1/login/refresh-token", json={"refresh_token": tokens["refresh_token"]})
+    assert TokenPayload(**jwt.get_unverified_claims(response.json()["access_token"])).email == "claims2@example.com"
+    with assert_queries(2):
+        assert client.get("/api/v1/items/", headers=_bearer(response.json())).status_code == 200
+
+
+def test_tokens_without_claims(client, user_headers, assert_queries):
+    user_id = client.get("/api/v1/login/test-access-token", headers=user_headers).json()["id"]
+    token = security.create_access_token(user_id, timedelta(minutes=1))
+    client.post("/api/v1/items/", json={"title": "item", "description": None}, headers=user_headers)
+    with assert_queries(3):
+        response = client.get("/api/v1/items/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
@@ -0,0 +1,28 @@
+import pytest
+
+from app.api.routers.item import read_items
+from app.query_budget import QueryBudgetExceeded, QueryLog, fingerprint
+
+
+def test_fingerprint_ignores_parameters():
+    assert fingerprint("SELECT * FROM items WHERE id = 1") == fingerprint("SELECT *  FROM items\nWHERE id = 42")
+    assert fingerprint("SELECT * FROM items WHERE id IN (?, ?, ?)") == "SELECT * FROM items WHERE id IN (?)"
+    assert fingerprint("INSERT INTO t (a) VALUES (%(a_m0)s), (%(a_m1)s)") == "INSERT INTO t (a) VALUES (?)"
+
+
+def test_violations():
+    log = QueryLog()
+    for i in range(3):
+        log.record(f"SELECT * FROM items WHERE owner_id = {i}")
+
+    assert log.violations(budget=3, repeat_threshold=4) == []
+    assert len(log.violations(budget=2, repeat_threshold=4)) == 1
+    assert "repeated 3 times" in log.violations(budget=3, repeat_threshold=3)[0]
+
+
+def test_route_budget_enforced(client, user_headers, monkeypatch):
+    assert read_items.__query_budget__ == 4
+
+    monkeypatch.setattr(read_items, "__query_budget__", 0)
+    with pytest.raises(QueryBudgetExceeded, match="exceed the budget of 0"):
+        client.get("/api/v1/items/", headers=user_headers)
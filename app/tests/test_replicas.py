@@ -0,0 +1,65 @@
+import os
+import tempfile
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import create_engine
+
+from app import database
+from app.api.cruds.item import get_item_by_id, item_cache
+from app.api.utils.cache import principal_cache
+from app.api.utils.security import create_access_token
+from app.database import PRIMARY_UNTIL_COOKIE, Base
+
+
+@pytest.fixture
+def replica(client, monkeypatch):
+    """
+    Routes reads to an empty stand-in replica, which never catches up with the primary.
+    """
+    if database.settings.DB_ASYNC:
+        pytest.skip("the stand-in replica is sync only")
+
+    replica = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'replica.db')}")
+    Base.metadata.create_all(bind=replica)
+    monkeypatch.setattr(database, "replica_engines", [replica])
+    client.cookies.clear()
+    yield replica
+    client.cookies.clear()
+    replica.dispose()
+
+
+def test_reads_go_to_replica(client, user_headers, replica, memory_cache):
+    response = client.post(
+        "/api/v1/items/bulk", json={"items": [{"title": "t", "description": None}]}, headers=user_headers
+    )
+    assert response.status_code == 201
+    item_id = response.json()["items"][0]["id"]
+
+    # The write pins the client to the primary, which has the item
+    assert PRIMARY_UNTIL_COOKIE in response.cookies
+    assert client.get(f"/api/v1/items/{item_id}", headers=user_headers).status_code == 200
+
+    # Once the stickiness window is over, reads go to the replica, which does not
+    client.cookies.clear()
+    item_cache.invalidate(item_id)
+    assert client.get(f"/api/v1/items/{item_id}", headers=user_headers).status_code == 404
+
+    # The replica's "not found" is not cached, a primary read fills the cache for everyone again
+    with database.SessionLocal() as session:
+        assert get_item_by_id(session, item_id) is not None
+    assert client.get(f"/api/v1/items/{item_id}", headers=user_headers).status_code == 200
+
+
+def test_primary_reads_share_the_session(client, user_headers, memory_cache):
+    if database.settings.DB_ASYNC:
+        pytest.skip("counts the sync pool")
+
+    # The current user lookup and the read share one connection, see `get_read_db`. A token without
+    # claims makes the lookup load the user.
+    user_id = client.get("/api/v1/login/test-access-token", headers=user_headers).json()["id"]
+    token = create_access_token(user_id, timedelta(minutes=1))
+    principal_cache.clear()
+    checkouts = database.pool_stats(database.engine)["checkouts"]
+    client.get("/api/v1/items/", headers={"Authorization": f"Bearer {token}"})
+    assert database.pool_stats(database.engine)["checkouts"] - checkouts == 1
@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+from typing import List
+
+from fastapi import FastAPI, Response  # type: ignore
+from fastapi.responses import JSONResponse  # type: ignore
+from fastapi.testclient import TestClient  # type: ignore
+from pydantic import BaseModel
+
+from app.api.utils.serialization import FastJSONResponse, render_response
+from app.configs import settings
+
+
+class Event(BaseModel):
+    id: int
+    note: str | None
+    at: datetime
+
+
+EVENTS = [
+    Event(id=1, note=None, at=datetime(2024, 5, 1, 12, 30, 15, 250000, tzinfo=timezone.utc)),
+    Event(id=2, note='naïve, "quoted"', at=datetime(2024, 5, 2)),
+]
+
+
+def _get(client, monkeypatch, fast: bool, url: str, **kwargs):
+    monkeypatch.setattr(settings, "FAST_SERIALIZATION", fast)
+    response = client.get(url, **kwargs)
+    assert response.status_code == 200
+    return response.content, response.headers["Content-Type"]
+
+
+def test_render_response_matches_default(monkeypatch):
+    app = FastAPI()
+
+    @app.get("/default", response_model=List[Event])
+    def default():
+        return EVENTS
+
+    @app.get("/fast", response_model=List[Event])
+    def fast(response: Response):
+        return render_response(List[Event], EVENTS, response)
+
+    client = TestClient(app)
+    assert _get(client, monkeypatch, True, "/fast") == _get(client, monkeypatch, False, "/default")
+
+
+def test_fast_json_response_matches_default():
+    content = {"id": 1, "note": None, "title": 'naïve, "quoted"', "tags": ["a", "b"]}
+    fast, default = FastJSONResponse(content), JSONResponse(content)
+    assert fast.body == default.body
+    assert fast.headers["Content-Type"] == default.headers["Content-Type"]
+
+
+def test_fast_serialization_routes(client, user_headers, monkeypatch):
+    # One item without a description, so the listing holds a None field
+    client.post("/api/v1/items/", json={"title": "fast", "description": None}, headers=user_headers)
+    assert _get(client, monkeypatch, True, "/api/v1/items/", headers=user_headers) == _get(
+        client, monkeypatch, False, "/api/v1/items/", headers=user_headers
+    )
+
+    me = client.get("/api/v1/login/test-access-token", headers=user_headers).json()
+    url, params = f"/api/v1/users/{me['id']}", {"fields": "id,username,email,is_active"}
+    assert _get(client, monkeypatch, True, url, params=params, headers=user_headers) == _get(
+        client, monkeypatch, False, url, params=params, headers=user_headers
+    )
@@ -0,0 +1,125 @@
+from app.configs import settings
+from app.tests.utils import login
+
+
+def _create_user(client, superuser_headers, email: str) -> dict:
+    response = client.post("/api/v1/users/", json={"email": email, "password": "password"}, headers=superuser_headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_read_users_queries(client, superuser_headers, assert_queries):
+    with assert_queries(1) as logs:
+        response = client.get("/api/v1/users/", headers=superuser_headers)
+    assert response.status_code == 200
+    # Columns no response exposes are not loaded
+    assert "hash_password" not in logs[0].statements[0]
+
+
+def test_read_users_pages(client, superuser_headers):
+    for i in range(3):
+        _create_user(client, superuser_headers, f"page{i}@example.com")
+    everyone = client.get("/api/v1/users/", params={"limit": settings.MAX_PAGE_SIZE}, headers=superuser_headers)
+    expected = [user["id"] for user in everyone.json()]
+    assert "X-Next-Cursor" not in everyone.headers
+
+    ids, params = [], {"limit": 2}
+    while True:
+        response = client.get("/api/v1/users/", params=params, headers=superuser_headers)
+        assert response.status_code == 200
+        ids += [user["id"] for user in response.json()]
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params = {"limit": 2, "cursor": response.headers["X-Next-Cursor"]}
+
+    assert ids == sorted(expected) and len(ids) > 2
+
+
+def test_read_users_page_size_capped(client, superuser_headers):
+    response = client.get("/api/v1/users/", params={"limit": settings.MAX_PAGE_SIZE + 1}, headers=superuser_headers)
+    assert response.status_code == 422
+
+
+def test_read_users_fields(client, superuser_headers, user_headers):
+    response = client.get("/api/v1/users/", params={"fields": "email,id"}, headers=superuser_headers)
+    assert response.status_code == 200
+    assert all(list(user) == ["email", "id"] for user in response.json())
+
+    me = client.get("/api/v1/login/test-access-token", headers=user_headers).json()
+    response = client.get(f"/api/v1/users/{me['id']}", params={"fields": "username"}, headers=user_headers)
+    assert response.json() == {"username": me["username"]}
+
+
+def test_create_user_queries(client, superuser_headers, assert_queries):
+    with assert_queries(1):
+        _create_user(client, superuser_headers, "created@example.com")
+
+
+def test_update_user_me_queries(client, user_headers, assert_queries):
+    with assert_queries(1):
+        response = client.patch("/api/v1/users/me", json={"username": "me"}, headers=user_headers)
+    assert response.status_code == 200
+    assert response.json()["username"] == "me"
+
+
+def test_read_users_by_ids_queries(client, superuser_headers, assert_queries):
+    ids = [_create_user(client, superuser_headers, f"batch{i}@example.com")["id"] for i in range(5)]
+    with assert_queries(1):
+        response = client.get("/api/v1/users/batch", params={"ids": ids}, headers=superuser_headers)
+    assert response.status_code == 200
+    assert len(response.json()) == len(ids)
+
+
+def test_read_user_queries(client, user_headers, assert_queries):
+    user = client.get("/api/v1/login/test-access-token", headers=user_headers).json()
+    with assert_queries(1):
+        response = client.get(f"/api/v1/users/{user['id']}", headers=user_headers)
+    assert response.status_code == 200
+
+
+def test_update_user_queries(client, superuser_headers, assert_queries):
+    user = _create_user(client, superuser_headers, "update@example.com")
+    # The user is looked up before hashing, then the update revokes the tokens of the user: expired
+    # revocations are pruned and one is recorded
+    with assert_queries(4):
+        response = client.patch(
+            f"/api/v1/users/{user['id']}", json={"password": "new-password"}, headers=superuser_headers
+        )
+    assert response.status_code == 200
+
+
+def test_update_missing_user_skips_hash(client, superuser_headers, monkeypatch):
+    async def hash_password(password):
+        raise AssertionError("the password of a missing user was hashed")
+
+    monkeypatch.setattr("app.api.routers.user.get_password_hash_async", hash_password)
+    response = client.patch("/api/v1/users/999999", json={"password": "new-password"}, headers=superuser_headers)
+    assert response.status_code == 404
+
+
+def test_delete_user_queries(client, superuser_headers, assert_queries):
+    user = _create_user(client, superuser_headers, "delete@example.com")
+    headers = login(client, "delete@example.com", "password")
+    with assert_queries(4):
+        response = client.delete(f"/api/v1/users/{user['id']}", headers=headers)
+    assert response.status_code == 200
+
+
+def test_read_user_not_modified(client, user_headers, assert_queries):
+    user = client.get("/api/v1/login/test-access-token", headers=user_headers).json()
+    etag = client.get(f"/api/v1/users/{user['id']}", headers=user_headers).headers["ETag"]
+
+    with assert_queries(1):
+        response = client.get(f"/api/v1/users/{user['id']}", headers={**user_headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_update_user_me_if_match(client, user_headers):
+    user = client.get("/api/v1/login/test-access-token", headers=user_headers).json()
+    etag = client.get(f"/api/v1/users/{user['id']}", headers=user_headers).headers["ETag"]
+
+    response = client.patch("/api/v1/users/me", json={"username": "a"}, headers={**user_headers, "If-Match": etag})
+    assert response.status_code == 200
+
+    response = client.patch("/api/v1/users/me", json={"username": "b"}, headers={**user_headers, "If-Match": etag})
+    assert response.status_code == 412
@@ -0,0 +1,13 @@
+from fastapi.testclient import TestClient  # type: ignore
+
+SUPERUSER = {"email": "admin@example.com", "password": "admin-password"}
+USER = {"email": "user@example.com", "password": "user-password"}
+
+
+def login(client: TestClient, email: str, password: str) -> dict:
+    """
+    Logs a user in and returns the authorization headers for their token.
+    """
+    response = client.post("/api/v1/login/access-token", data={"username": email, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
@@ -0,0 +1,18 @@
+from uvicorn.workers import UvicornWorker as BaseUvicornWorker  # type: ignore
+
+from app.configs import settings
+
+
+class UvicornWorker(BaseUvicornWorker):
+    """
+    The uvicorn worker of the production server, on uvloop and the httptools parser.
+
+    Gunicorn passes its `backlog`, `keepalive`, `max_requests` and `forwarded_allow_ips` settings through.
+    Beyond `SERVER_LIMIT_CONCURRENCY` concurrent connections and requests, the worker answers 503 at once.
+    """
+
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+        "limit_concurrency": settings.SERVER_LIMIT_CONCURRENCY,
+    }